@@ -1,22 +1,47 @@
 """Group Revit built-in categories logically and output the data in json
 
-The built-in categories are provided in text files under DATA_DIR
+The built-in categories are read from the BuiltInCategory.cs schemas under
+SCHEMAS_DIR, or from text files under DATA_DIR for versions without a schema
 
 Usage:
     python3 ./cgroups.py              group and output categories
     python3 ./cgroups.py  <catname>   group and output <catname> category only
+    python3 ./cgroups.py  --suggest   also suggest groups for excluded categories
 """
 # pylint: disable=bad-continuation
 import sys
 import os
 import os.path as op
+import time
+import copy
+import hashlib
 
-from typing import Set, List, TypeVar
+from typing import TYPE_CHECKING, Dict, Set, List, Tuple, TypeVar
 import json
 import re
 
+# numpy is only needed (and imported) for --suggest
+if TYPE_CHECKING:
+    import numpy as np
+
 
 DATA_DIR = "./bic_data"
+SCHEMAS_DIR = "../src/RhinoInside.Revit.External/DB/Schemas"
+SCHEMA_FILE = "BuiltInCategory.cs"
+SCHEMA_CACHE_FILE = op.join(DATA_DIR, ".schema_cache.json")
+SCHEMA_DEFINITION_FINDER = re.compile(
+    r'new Definition\(\s*"(?P<name>[^"]*)",\s*CT\.(?P<category_type>\w+),'
+    r"\s*(?P<is_tag>true|false),"
+    r"\s*/\*[^*]*\*/\s*BIC\.(?P<parent>\w+),"
+    r"\s*/\*[^*]*\*/\s*BIC\.(?P<bic>\w+),"
+    r"\s*(?P<flags>(?:(?:true|false),\s*){5})"
+    r"\(CD\)\s*(?P<discipline>\d+)\s*\)"
+)
+SUGGESTIONS_FILE = "suggestions.json"
+BIC_PREFIX = "OST_"
+BIC_TOKEN_FINDER = re.compile(r"[A-Z]+(?=[A-Z][a-z]|\d|_|$)|[A-Z]?[a-z]+|\d+")
+SUGGEST = "--suggest" in sys.argv[1:]
+CATNAME = next((x for x in sys.argv[1:] if not x.startswith("--")), None)
 
 CGROUP_T = TypeVar("CGROUP")  # pylint: disable=invalid-name
 
@@ -41,6 +66,36 @@ class CGROUP:
         self.hidden: bool = hidden
 
 
+class BicDefinition:
+    """Represents a built-in category definition in BuiltInCategory.cs"""
+
+    def __init__(
+        self,
+        bic: str,
+        name: str,
+        category_type: str,
+        parent: str,
+        is_tag: bool,
+        can_add_subcategory: bool,
+        allows_bound_parameters: bool,
+        has_material_quantities: bool,
+        is_cuttable: bool,
+        is_visible_in_ui: bool,
+        discipline: int,
+    ):
+        self.bic: str = bic
+        self.name: str = name
+        self.category_type: str = category_type
+        self.parent: str = parent
+        self.is_tag: bool = is_tag
+        self.can_add_subcategory: bool = can_add_subcategory
+        self.allows_bound_parameters: bool = allows_bound_parameters
+        self.has_material_quantities: bool = has_material_quantities
+        self.is_cuttable: bool = is_cuttable
+        self.is_visible_in_ui: bool = is_visible_in_ui
+        self.discipline: int = discipline
+
+
 class CategoryComp:
     """Represents data for a category selector component"""
 
@@ -63,7 +118,7 @@ class CategoryCompCollection:
             "version": version,
             "total": len(bics),
             "included": len(used_bics),
-            "excluded": list(bics.difference(used_bics)),
+            "excluded": sorted(bics.difference(used_bics)),
         }
         self.components = components
 
@@ -130,7 +185,7 @@ CGROUPS = [
         name="Modeling",
         exclusives=[],
         includes=[r"OST_Generic.*",],
-        excludes=["OST_GenericLines",],
+        excludes=[],
         cgroups=[
             CGROUP(
                 name="Mass",
@@ -140,7 +195,6 @@ CGROUPS = [
                     r"OST_.+Cutter",
                     r"OST_.+Splitter",
                     r"OST_.+All",
-                    r"OST_.+Outlines",
                 ],
                 cgroups=[],
             ),
@@ -148,48 +202,35 @@ CGROUPS = [
                 name="Ceilings",
                 exclusives=[],
                 includes=[r"OST_Ceiling.*"],
-                excludes=[
-                    r"OST_.+Cut.*",
-                    r"OST_.+Projection.*",
-                    r"OST_.+Default.*",
-                ],
+                excludes=[r"OST_.+Cut.*", r"OST_.+Default.*",],
                 cgroups=[],
             ),
             CGROUP(
                 name="Columns",
                 exclusives=[],
                 includes=[r"OST_Column.*"],
-                excludes=[r"OST_.+LocalCoordSys"],
+                excludes=[],
                 cgroups=[],
             ),
             CGROUP(
                 name="Curtain Systems",
                 exclusives=[],
                 includes=[r"OST_Curta.*"],
-                excludes=[
-                    r"OST_.+FaceManager.*",
-                    r"OST_CurtainGrids.+",
-                    r"OST_Curtain.+Cut",
-                ],
+                excludes=[r"OST_.+FaceManager.*", r"OST_CurtainGrids.+",],
                 cgroups=[],
             ),
             CGROUP(
                 name="Floors",
                 exclusives=[],
                 includes=[r"OST_Floor.*"],
-                excludes=[
-                    r"OST_.+LocalCoordSys",
-                    r"OST_.+Cut.*",
-                    r"OST_.+Projection.*",
-                    r"OST_.+Default.*",
-                ],
+                excludes=[r"OST_.+Cut.*", r"OST_.+Default.*",],
                 cgroups=[],
             ),
             CGROUP(
                 name="Doors",
                 exclusives=[],
                 includes=[r"OST_Door.*"],
-                excludes=[r"OST_.+Cut.*", r"OST_.+Projection.*",],
+                excludes=[r"OST_.+Projection.*",],
                 cgroups=[],
             ),
             CGROUP(
@@ -203,7 +244,7 @@ CGROUPS = [
                 name="Windows",
                 exclusives=[],
                 includes=[r"OST_Window.*"],
-                excludes=[r"OST_.+Cut.*", r"OST_.+Projection.*",],
+                excludes=[r"OST_.+Projection.*",],
                 cgroups=[],
             ),
             CGROUP(
@@ -231,41 +272,47 @@ CGROUPS = [
                 name="Openings",
                 exclusives=[r"OST_.+Opening", r"OST_Arc.*", r"OST_Shaft.*",],
                 includes=[],
-                excludes=[r"OST_.+Cut.*", r"OST_.+Projection.*",],
+                excludes=[r"OST_.+Projection.*",],
                 cgroups=[],
             ),
             CGROUP(
                 name="Railing",
-                exclusives=[],
-                includes=[r"OST_Railing.*"],
-                excludes=[r"OST_.+Cut.*", r"OST_.+Projection.*",],
+                exclusives=[r"OST_StairsRailing$"],
+                includes=[
+                    r"OST_Railing.*",
+                    "OST_RailingRailPathLines",
+                    "OST_RailingRailPathExtensionLines",
+                ],
+                excludes=[r"OST_.+Cut.*"],
                 cgroups=[],
             ),
             CGROUP(
                 name="Stairs",
                 exclusives=[],
-                includes=[r"OST_Stair.*", r"OST_.+Stairs"],
-                excludes=[r"OST_.+Cut.*", r"OST_.+Projection.*",],
+                includes=[
+                    r"OST_Stair.*",
+                    r"OST_.+Stairs",
+                    "OST_StairsSketchBoundaryLines",
+                    "OST_StairsSketchLandingCenterLines",
+                    "OST_StairsSketchPathLines",
+                    "OST_StairsSketchRiserLines",
+                    "OST_StairsSketchRunLines",
+                ],
+                excludes=[r"OST_.+Cut.*",],
                 cgroups=[],
             ),
             CGROUP(
                 name="Ramps",
                 exclusives=[],
                 includes=[r"OST_Ramp.*"],
-                excludes=[r"OST_.+Cut.*", r"OST_.+Projection.*",],
+                excludes=[r"OST_.+Cut.*",],
                 cgroups=[],
             ),
             CGROUP(
                 name="Walls",
                 exclusives=[],
                 includes=[r"OST_Wall.*", r"OST_Reveals", r"OST_Stacked.*"],
-                excludes=[
-                    r"OST_.+LocalCoordSys",
-                    r"OST_.+RefPlanes",
-                    r"OST_.+Default",
-                    r"OST_.+Cut.*",
-                    r"OST_.+Projection.*",
-                ],
+                excludes=[r"OST_.+Default", r"OST_.+Cut.*",],
                 cgroups=[],
             ),
             CGROUP(
@@ -274,16 +321,12 @@ CGROUPS = [
                 includes=[
                     r"OST_Roof.*",
                     r"OST_Fascia.*",
-                    r"OST_Purlin.*",
+                    "OST_Purlin",
                     r"OST_Gutter.*",
-                    r"OST_Cornices.*",
+                    "OST_Cornices",
                     r"OST_Dormer.*",
                 ],
-                excludes=[
-                    r"OST_.+Opening.*",
-                    r"OST_.+Cut.*",
-                    r"OST_.+Projection.*",
-                ],
+                excludes=[r"OST_.+Cut.*",],
                 cgroups=[],
             ),
             CGROUP(
@@ -293,14 +336,16 @@ CGROUPS = [
                     r"OST_Area.*",
                     r"OST_Zone.*",
                     r"OST_MEPSpace.*",
-                    r"OST_Zoning.*",
+                    "OST_ZoningEnvelope",
                     r"OST_Room.*",
+                    "OST_AreaSchemeLines",
+                    "OST_MEPSpaceSeparationLines",
+                    "OST_RoomSeparationLines",
                 ],
                 excludes=[
                     r"OST_.+Fill",
                     r"OST_.+Visibility",
                     r"OST_AreaRein.*",
-                    r"OST_AreaReport.*",
                 ],
                 cgroups=[],
             ),
@@ -313,6 +358,8 @@ CGROUPS = [
                     r"OST_Truss.*",
                     r"OST_Joist.*",
                     r"OST_FabricArea.*",
+                    "OST_FabricAreaSketchEnvelopeLines",
+                    "OST_FabricAreaSketchSheetsLines",
                     r"OST_Rebar.*",
                     r"OST_Girder.*",
                     r"OST_Edge.*",
@@ -332,7 +379,6 @@ CGROUPS = [
                     r"OST_Beam.*",
                 ],
                 excludes=[
-                    r"OST_.+LocalCoordSys",
                     r"OST_.+Other",
                     r"OST_.+LocationLine",
                     r"OST_.+PlanReps",
@@ -424,7 +470,7 @@ CGROUPS = [
                     r"OST_Sun.*",
                     r"OST_RenderRegions",
                 ],
-                excludes=[r"OST_.+ViewParamGroup",],
+                excludes=[],
                 cgroups=[],
             ),
             CGROUP(
@@ -555,6 +601,13 @@ CGROUPS = [
 # =============================================================================
 
 
+def compile_patterns(patterns: List[str]):
+    """Combine patterns into one, matching where any of them matches"""
+    if not patterns:
+        return None
+    return re.compile("|".join(f"(?:{x})" for x in patterns))
+
+
 def expand_exclusives(
     cgroup: CGROUP, used_bics: Set[str], remaining_bics: Set[str]
 ):
@@ -563,19 +616,24 @@ def expand_exclusives(
     excludes = set()
 
     local_bics = remaining_bics.copy()
-    for bic in local_bics:
-        for excluspat in cgroup.exclusives:
-            if re.match(excluspat, bic):
+    exclusives_finder = compile_patterns(cgroup.exclusives)
+    if exclusives_finder:
+        for bic in local_bics:
+            if exclusives_finder.match(bic):
                 if bic in used_bics:
+                    excluspat = next(
+                        x for x in cgroup.exclusives if re.match(x, bic)
+                    )
                     raise Exception(
                         f'Exclusive conflict in "{cgroup.name}" @ "{excluspat}"'
                     )
                 exclusives.add(bic)
 
     filtered_exclusives = exclusives.copy()
-    for exclusitem in exclusives:
-        for excpat in cgroup.excludes:
-            if re.match(excpat, exclusitem):
+    excludes_finder = compile_patterns(cgroup.excludes)
+    if excludes_finder:
+        for exclusitem in exclusives:
+            if excludes_finder.match(exclusitem):
                 excludes.add(exclusitem)
     filtered_exclusives.difference_update(excludes)
     used_bics.update(filtered_exclusives)
@@ -598,15 +656,17 @@ def expand_includes(
     excludes = set()
 
     local_bics = remaining_bics.copy()
-    for bic in local_bics:
-        for incpat in cgroup.includes:
-            if re.match(incpat, bic):
+    includes_finder = compile_patterns(cgroup.includes)
+    if includes_finder:
+        for bic in local_bics:
+            if includes_finder.match(bic):
                 includes.add(bic)
 
     filtered_includes = includes.copy()
-    for incitem in includes:
-        for excpat in cgroup.excludes:
-            if re.match(excpat, incitem):
+    excludes_finder = compile_patterns(cgroup.excludes)
+    if excludes_finder:
+        for incitem in includes:
+            if excludes_finder.match(incitem):
                 excludes.add(incitem)
     filtered_includes.difference_update(excludes)
     used_bics.update(filtered_includes)
@@ -619,6 +679,55 @@ def expand_includes(
     cgroup.includes = filtered_includes
 
 
+def index_children(
+    bic_parents: Dict[str, str], builtin_category_names: Set[str]
+) -> Dict[str, List[str]]:
+    """Map builtin category names to their subcategory names"""
+    children: Dict[str, List[str]] = {}
+    for bic, parent in bic_parents.items():
+        if bic in builtin_category_names and parent in builtin_category_names:
+            children.setdefault(parent, []).append(bic)
+    return children
+
+
+def named_includes(cgroup: CGROUP) -> Set[str]:
+    """Include filters of cgroup tree that are category names, not patterns"""
+    named = {x for x in cgroup.includes if re.fullmatch(r"OST_\w+", x)}
+    for sub_cgroup in cgroup.cgroups:
+        named.update(named_includes(sub_cgroup))
+    return named
+
+
+def inherit_subcategories(
+    cgroup: CGROUP, children: Dict[str, List[str]], used_bics: Set[str]
+):
+    """Add subcategories of expanded categories to the same cgroup
+
+    Subcategories claimed by exclusive filters keep their cgroup, and the
+    ones matching the exclude filters are dropped with their subcategories
+    """
+    excludes_finder = compile_patterns(cgroup.excludes)
+    pending = [
+        y
+        for x in sorted(cgroup.exclusives | cgroup.includes)
+        for y in children.get(x, [])
+    ]
+    inherited = set()
+    while pending:
+        bic = pending.pop()
+        if bic in used_bics:
+            continue
+        if excludes_finder and excludes_finder.match(bic):
+            continue
+        inherited.add(bic)
+        used_bics.add(bic)
+        pending.extend(children.get(bic, []))
+    cgroup.includes.update(inherited)
+
+    for sub_cgroup in cgroup.cgroups:
+        inherit_subcategories(sub_cgroup, children, used_bics)
+
+
 def filter_cgroup(cgroup: CGROUP, name: str):
     """Find a cgroup in tree by name"""
     if cgroup.name == name:
@@ -650,27 +759,45 @@ def create_ccomp(cgroup: CGROUP) -> CategoryComp:
 
 
 def create_ccomp_collection(
-    version: str, builtin_category_names: List[str]
+    version: str,
+    builtin_category_names: List[str],
+    bic_parents: Dict[str, str] = None,
 ) -> CategoryCompCollection:
-    """Create component collection from list of builtin category names"""
+    """Create component collection from list of builtin category names
+
+    If parents of the categories are known, include filters only apply to
+    top-level categories and subcategories go with their parent. Include
+    filters naming a subcategory exactly still claim it
+    """
     remaining_bics = builtin_category_names.copy()
     used_bics: Set[str] = set()
-    for cgroup in CGROUPS:
+    # expanding replaces the patterns with category names, so each
+    # version needs its own copy of the tree
+    cgroups = copy.deepcopy(CGROUPS)
+    for cgroup in cgroups:
         expand_exclusives(cgroup, used_bics, remaining_bics)
 
-    for cgroup in CGROUPS:
+    children = index_children(bic_parents or {}, builtin_category_names)
+    subcategories = {y for x in children.values() for y in x}
+    remaining_bics.difference_update(
+        subcategories.difference(*[named_includes(x) for x in cgroups])
+    )
+    for cgroup in cgroups:
         expand_includes(cgroup, used_bics, remaining_bics)
 
+    for cgroup in cgroups:
+        inherit_subcategories(cgroup, children, used_bics)
+
     all_comps: List[CategoryComp] = []
 
-    if len(sys.argv) > 1:
+    if CATNAME:
         matching_cgroup = None
-        for cgroup in CGROUPS:
-            matching_cgroup = filter_cgroup(cgroup, name=sys.argv[1])
+        for cgroup in cgroups:
+            matching_cgroup = filter_cgroup(cgroup, name=CATNAME)
             if matching_cgroup:
                 all_comps.append(create_ccomp(matching_cgroup))
     else:
-        for cgroup in CGROUPS:
+        for cgroup in cgroups:
             if not cgroup.hidden:
                 all_comps.append(create_ccomp(cgroup))
 
@@ -690,6 +817,71 @@ def load_bics(data_file: str):
     return bics_data
 
 
+def parse_schema(schema_text: str) -> List[BicDefinition]:
+    """Parse the built-in category definitions of BuiltInCategory.cs"""
+    definitions = []
+    for line in schema_text.splitlines():
+        if "new Definition(" not in line:
+            continue
+        match = SCHEMA_DEFINITION_FINDER.search(line)
+        if not match:
+            raise Exception(f"Unknown definition format: {line.strip()}")
+        flags = [x.strip() == "true" for x in match["flags"].split(",")[:5]]
+        definitions.append(
+            BicDefinition(
+                match["bic"],
+                match["name"],
+                match["category_type"],
+                match["parent"],
+                match["is_tag"] == "true",
+                *flags,
+                int(match["discipline"]),
+            )
+        )
+    return definitions
+
+
+def load_schemas(
+    schemas_dir: str, cache_file: str
+) -> Dict[str, List[BicDefinition]]:
+    """Load built-in category definitions of all versions under schemas dir
+
+    Parsed definitions are cached by schema content hash, so only changed
+    schemas are parsed again
+    """
+    cache = {}
+    if op.isfile(cache_file):
+        with open(cache_file, "r") as cachefile:
+            cache = json.load(cachefile)
+
+    schemas = {}
+    parsed = 0
+    for version in sorted(os.listdir(schemas_dir)):
+        schema_file = op.join(schemas_dir, version, SCHEMA_FILE)
+        if not op.isfile(schema_file):
+            continue
+        with open(schema_file, "rb") as schemafile:
+            schema_bytes = schemafile.read()
+        digest = hashlib.sha256(schema_bytes).hexdigest()
+        cached = cache.get(version)
+        if not cached or cached["sha256"] != digest:
+            cached = cache[version] = {
+                "sha256": digest,
+                "definitions": [
+                    x.__dict__
+                    for x in parse_schema(schema_bytes.decode("utf-8-sig"))
+                ],
+            }
+            parsed += 1
+        schemas[version] = [BicDefinition(**x) for x in cached["definitions"]]
+
+    if parsed:
+        with open(cache_file, "w") as cachefile:
+            json.dump(cache, cachefile)
+    print(f"{len(schemas)} schemas loaded, {parsed} parsed")
+    return schemas
+
+
 def dump_bics(data_file: str, ccomps_col: CategoryCompCollection):
     """Dump component collection data into file"""
     with open(data_file, "w") as datafile:
@@ -698,12 +890,191 @@ def dump_bics(data_file: str, ccomps_col: CategoryCompCollection):
         )
 
 
+def split_bic_name(bic: str) -> List[str]:
+    """Split builtin category name into its CamelCase and _ separated words"""
+    if bic.startswith(BIC_PREFIX):
+        bic = bic[len(BIC_PREFIX) :]
+    return BIC_TOKEN_FINDER.findall(bic)
+
+
+def collect_labels(ccomp: CategoryComp) -> Dict[str, Tuple[str, str]]:
+    """Map builtin category names to their (group, subgroup) in component"""
+    labels = {}
+    for subgroup, categories in ccomp.categories.items():
+        if isinstance(categories, dict):
+            for bic in categories["_"]:
+                labels[bic] = (ccomp.name, subgroup)
+        else:
+            for bic in categories:
+                labels[bic] = (ccomp.name, "_")
+    return labels
+
+
+def token_matrix(
+    token_lists: List[List[str]], vocabulary: Dict[str, int]
+) -> Tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+    """Build L2 normalized sparse token-frequency matrix of given token lists
+
+    The matrix is returned as (rows, cols, values) arrays of its nonzero
+    entries, so memory grows with the tokens of the lists and not with the
+    vocabulary. scipy is not a dependency of this script, so the products
+    are done with numpy on these arrays
+    """
+    import numpy as np  # pylint: disable=import-outside-toplevel
+
+    rows = []
+    cols = []
+    for row, tokens in enumerate(token_lists):
+        for token in tokens:
+            if token in vocabulary:
+                rows.append(row)
+                cols.append(vocabulary[token])
+    # count repeated (row, col) pairs into one entry
+    cells, counts = np.unique(
+        np.array(rows, dtype=np.int64) * len(vocabulary)
+        + np.array(cols, dtype=np.int64),
+        return_counts=True,
+    )
+    rows, cols = np.divmod(cells, max(len(vocabulary), 1))
+    values = counts.astype(np.float32)
+    norms = np.sqrt(
+        np.bincount(rows, weights=values * values, minlength=len(token_lists))
+    )
+    return rows, cols, values / norms[rows]
+
+
+def suggest_regex(
+    bic: str, label_index: int, names: "np.ndarray", labels: "np.ndarray"
+) -> str:
+    """Shortest prefix or suffix pattern only matching categories of label"""
+    import numpy as np  # pylint: disable=import-outside-toplevel
+
+    words = split_bic_name(bic)
+    stem = bic[len(BIC_PREFIX) :] if bic.startswith(BIC_PREFIX) else bic
+    for count in range(1, len(words)):
+        # try the shorter of the leading and trailing words first
+        prefix = stem[: stem.index(words[count - 1]) + len(words[count - 1])]
+        suffix = stem[stem.rindex(words[-count]) :]
+        for matches, pattern in (
+            (
+                np.char.startswith(names, BIC_PREFIX + prefix),
+                f"{BIC_PREFIX}{prefix}.*",
+            ),
+            (np.char.endswith(names, suffix), f"{BIC_PREFIX}.+{suffix}"),
+        ):
+            if matches.any() and (labels[matches] == label_index).all():
+                return pattern
+    return bic
+
+
+def suggest_cgroups(
+    labeled_bics: Dict[str, Tuple[str, str]], excluded_bics: Set[str]
+) -> Dict[str, dict]:
+    """Suggest group and subgroup of excluded categories by name similarity
+
+    Each (group, subgroup) is represented by the centroid of the
+    token-frequency vectors of its categories, and excluded categories are
+    scored against all centroids with a single matrix product (cosine
+    similarity)
+    """
+    import numpy as np  # pylint: disable=import-outside-toplevel
+
+    names = sorted(labeled_bics)
+    label_names = sorted(set(labeled_bics.values()))
+    label_lookup = {x: i for i, x in enumerate(label_names)}
+    labels = np.array([label_lookup[labeled_bics[x]] for x in names])
+
+    token_lists = [[t.lower() for t in split_bic_name(x)] for x in names]
+    vocabulary = {}
+    for tokens in token_lists:
+        for token in tokens:
+            vocabulary.setdefault(token, len(vocabulary))
+
+    queries = sorted(excluded_bics)
+    query_tokens = [[t.lower() for t in split_bic_name(x)] for x in queries]
+
+    # centroid of each label, as a dense (labels x vocabulary) matrix
+    rows, cols, values = token_matrix(token_lists, vocabulary)
+    centroids = np.zeros((len(label_names), len(vocabulary)), dtype=np.float32)
+    np.add.at(centroids, (labels[rows], cols), values)
+    centroids /= np.maximum(
+        np.linalg.norm(centroids, axis=1, keepdims=True), 1e-9
+    )
+
+    # sparse queries x dense centroids
+    rows, cols, values = token_matrix(query_tokens, vocabulary)
+    scores = np.zeros((len(queries), len(label_names)), dtype=np.float32)
+    np.add.at(scores, rows, values[:, None] * centroids[:, cols].T)
+    best = scores.argmax(axis=1)
+    confidence = scores[np.arange(len(queries)), best]
+
+    name_array = np.array(names)
+    suggestions = {}
+    for bic, label_index, score in zip(queries, best, confidence):
+        if score <= 0:
+            continue
+        group, subgroup = label_names[label_index]
+        suggestions[bic] = {
+            "group": group,
+            "subgroup": subgroup,
+            "confidence": round(float(score), 3),
+            "regex": suggest_regex(bic, label_index, name_array, labels),
+        }
+    return suggestions
+
+
+def dump_suggestions(data_file: str, suggestions: Dict[str, dict]):
+    """Dump group suggestions into file"""
+    with open(data_file, "w") as datafile:
+        json.dump(suggestions, datafile, indent=2)
+
+
+bic_names_per_version: Dict[str, Set[str]] = {}
+bic_parents_per_version: Dict[str, Dict[str, str]] = {}
 for entry in os.listdir(DATA_DIR):
     if entry.endswith(".txt"):
         bic_file = op.join(DATA_DIR, entry)
         dafa_filename = op.splitext(op.basename(bic_file))[0]
         bic_file_version = dafa_filename.split("_")[1]
-        bic_names = load_bics(bic_file)
-        ccomp_collection = create_ccomp_collection(bic_file_version, bic_names)
-        json_file = op.join(DATA_DIR, dafa_filename + ".json")
-        dump_bics(json_file, ccomp_collection)
+        bic_names_per_version[bic_file_version] = load_bics(bic_file)
+
+# schemas are the source of truth for the versions they cover
+if op.isdir(SCHEMAS_DIR):
+    for schema_version, bic_defs in load_schemas(
+        SCHEMAS_DIR, SCHEMA_CACHE_FILE
+    ).items():
+        bic_names_per_version[schema_version] = {
+            x.bic for x in bic_defs if x.bic != "INVALID"
+        }
+        bic_parents_per_version[schema_version] = {
+            x.bic: x.parent for x in bic_defs
+        }
+
+ccomp_collections: List[CategoryCompCollection] = []
+for bic_file_version, bic_names in sorted(bic_names_per_version.items()):
+    ccomp_collection = create_ccomp_collection(
+        bic_file_version,
+        bic_names,
+        bic_parents_per_version.get(bic_file_version),
+    )
+    json_file = op.join(DATA_DIR, f"bics_{bic_file_version}.json")
+    dump_bics(json_file, ccomp_collection)
+    ccomp_collections.append(ccomp_collection)
+
+if SUGGEST:
+    all_labels: Dict[str, Tuple[str, str]] = {}
+    all_excluded: Set[str] = set()
+    for ccomp_collection in ccomp_collections:
+        for category_comp in ccomp_collection.components:
+            all_labels.update(collect_labels(category_comp))
+        all_excluded.update(ccomp_collection.meta["excluded"])
+    all_excluded.difference_update(all_labels)
+
+    start = time.perf_counter()
+    bic_suggestions = suggest_cgroups(all_labels, all_excluded)
+    elapsed = time.perf_counter() - start
+    dump_suggestions(op.join(DATA_DIR, SUGGESTIONS_FILE), bic_suggestions)
+    print(
+        f"{len(bic_suggestions)}/{len(all_excluded)} excluded categories "
+        f"suggested in {elapsed * 1000:.1f}ms"
+    )
@@ -0,0 +1,84 @@
+"""Thin client sending dbgzip command lines to a resident dbgzip server
+
+Usage:
+    dbgclient [--socket=<socket_path> | --port=<port>] <dbgzip args>...
+
+Start the server with `dbgzip serve` (or `dbgzip serve --port=<port>`).
+Over http, the client sends the token the server wrote to
+.packages/dbgzip-<port>.token for the user running it.
+Only the standard library is imported so requests return in milliseconds.
+"""
+import sys
+import os
+import os.path as op
+import json
+import socket
+import http.client
+
+
+# cli configs =================================================================
+DEFAULT_SERVER_SOCKET = op.join(op.dirname(op.abspath(__file__)),
+                                '.packages', 'dbgzip.sock')
+DEFAULT_SERVER_TOKEN = op.join(op.dirname(op.abspath(__file__)),
+                               '.packages', 'dbgzip-{port}.token')
+SERVER_TOKEN_HEADER = 'X-Dbgzip-Token'
+# =============================================================================
+
+
+def send_socket(socket_path, request):
+    """Send request over unix socket"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path)
+        client.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        with client.makefile('rb') as response:
+            return json.loads(response.readline())
+
+
+def send_http(port, request):
+    """Send request to localhost http server"""
+    # token written by the server, readable by this user only
+    with open(DEFAULT_SERVER_TOKEN.format(port=port), 'r') as tf:
+        token = tf.read().strip()
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    try:
+        conn.request('POST', '/', body=json.dumps(request),
+                     headers={
+                         'Content-Type': 'application/json',
+                         SERVER_TOKEN_HEADER: token,
+                         })
+        response = conn.getresponse()
+        if response.status != 200:
+            raise OSError("dbgzip server refused request: {} {}".format(
+                response.status, response.reason))
+        return json.loads(response.read())
+    finally:
+        conn.close()
+
+
+def main(argv):
+    """Forward command line to server and print its output"""
+    socket_path, port = DEFAULT_SERVER_SOCKET, None
+    if argv and argv[0].startswith('--socket='):
+        socket_path = argv.pop(0).split('=', 1)[1]
+    elif argv and argv[0].startswith('--port='):
+        port = int(argv.pop(0).split('=', 1)[1])
+    if not argv:
+        sys.stderr.write(__doc__)
+        return 1
+    request = {'argv': argv, 'cwd': os.getcwd()}
+    try:
+        if port:
+            response = send_http(port, request)
+        else:
+            response = send_socket(socket_path, request)
+    except OSError as conn_ex:
+        sys.stderr.write("[ERROR] Can not reach dbgzip server: %s\n"
+                         % str(conn_ex))
+        return 1
+    sys.stdout.write(response['stdout'])
+    sys.stderr.write(response['stderr'])
+    return response['status']
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
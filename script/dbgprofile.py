@@ -0,0 +1,229 @@
+"""Per-stage wall time, cpu time and memory profiling for the debug scripts
+
+Stages are recorded with the `stage` context manager of the module-level
+`PROFILER`. It does nothing until `enable` is called, so instrumented code
+pays almost nothing when profiling is off.
+
+Results are written as a trace file in Trace Event Format (viewable in
+chrome://tracing or https://ui.perfetto.dev) and a json summary of
+per-stage percentiles.
+
+tracemalloc peaks are process-wide, so peaks are only recorded for stages
+on the main thread while no worker thread is inside a stage. Other stages
+have no peak (null in the trace and summary files).
+"""
+import os
+import os.path as op
+import json
+import time
+import threading
+import tracemalloc
+import cProfile
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+# cli configs =================================================================
+DEFAULT_TRACE_FILE = "trace.json"
+DEFAULT_SUMMARY_FILE = "stages.json"
+PERCENTILES = [50, 90, 99]
+STAGES_TABLE_HEADER = """
+Stage | Count | Wall P50 | Wall P90 | Wall P99 | Wall Max | CPU Total | Peak Max (KB)
+--- | --- | --- | --- | --- | --- | --- | ---
+"""
+# =============================================================================
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of sorted values"""
+    if not sorted_values:
+        return 0.0
+    rank = int(round(pct / 100.0 * (len(sorted_values) - 1)))
+    return sorted_values[rank]
+
+
+class StageProfiler:
+    """Records wall time, cpu time and peak allocations of named stages"""
+
+    def __init__(self):
+        self.enabled = False
+        self.cprofile_dir = None
+        self.records = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._origin = time.perf_counter()
+        self._dumps = defaultdict(int)
+        # stages entered on worker threads, and how many are still open
+        self._worker_stages = 0
+        self._open_worker_stages = 0
+
+    def enable(self, cprofile_dir=None):
+        """Start recording stages, dump cProfile stats if dir is given"""
+        self.enabled = True
+        self.cprofile_dir = cprofile_dir
+        if cprofile_dir and not op.isdir(cprofile_dir):
+            os.makedirs(cprofile_dir)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def reset(self):
+        """Stop recording stages and drop the recorded ones"""
+        self.enabled = False
+        self.cprofile_dir = None
+        with self._lock:
+            self.records = []
+            self._dumps.clear()
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    @contextmanager
+    def stage(self, name):
+        """Record given stage"""
+        if not self.enabled:
+            yield
+            return
+
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        on_main = threading.current_thread() is threading.main_thread()
+        mem, running_peak = tracemalloc.get_traced_memory()
+        frame = {"mem": mem, "peak": 0}
+        if on_main:
+            # resetting loses the running peak of the enclosing stage
+            if stack:
+                stack[-1]["peak"] = max(stack[-1]["peak"], running_peak)
+            tracemalloc.reset_peak()
+            with self._lock:
+                frame["workers"] = self._worker_stages
+        else:
+            with self._lock:
+                self._worker_stages += 1
+                self._open_worker_stages += 1
+        stack.append(frame)
+
+        profile = None
+        if self.cprofile_dir and len(stack) == 1:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # another profiler is active on some other thread
+                profile = None
+
+        start_wall = time.perf_counter()
+        start_cpu = time.thread_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - start_wall
+            cpu = time.thread_time() - start_cpu
+            if profile:
+                profile.disable()
+            # child stages reset the peak, so keep the highest seen
+            peak = max(tracemalloc.get_traced_memory()[1], frame["peak"])
+            stack.pop()
+            if stack:
+                stack[-1]["peak"] = max(stack[-1]["peak"], peak)
+            with self._lock:
+                if not on_main:
+                    self._open_worker_stages -= 1
+                    peak = None
+                elif (
+                    self._open_worker_stages or self._worker_stages != frame["workers"]
+                ):
+                    # allocations of worker threads are in the peak too
+                    peak = None
+                self.records.append(
+                    {
+                        "name": name,
+                        "start": start_wall - self._origin,
+                        "wall": wall,
+                        "cpu": cpu,
+                        "peak": None if peak is None else max(peak - frame["mem"], 0),
+                        "tid": threading.get_ident(),
+                        "depth": len(stack),
+                    }
+                )
+                if profile:
+                    self._dumps[name] += 1
+                    dump_index = self._dumps[name]
+            if profile:
+                profile.dump_stats(
+                    op.join(
+                        self.cprofile_dir,
+                        "{}-{:04d}.prof".format(name, dump_index),
+                    )
+                )
+
+    def summarize(self):
+        """Per-stage count, wall/cpu percentiles and peak allocations"""
+        by_stage = defaultdict(list)
+        for record in self.records:
+            by_stage[record["name"]].append(record)
+        summary = {}
+        for name, records in by_stage.items():
+            walls = sorted(x["wall"] for x in records)
+            cpus = sorted(x["cpu"] for x in records)
+            peaks = sorted(x["peak"] for x in records if x["peak"] is not None)
+            summary[name] = {
+                "count": len(records),
+                "wall": {"p%d" % p: percentile(walls, p) for p in PERCENTILES},
+                "wall_max": walls[-1],
+                "wall_total": sum(walls),
+                "cpu": {"p%d" % p: percentile(cpus, p) for p in PERCENTILES},
+                "cpu_total": sum(cpus),
+                "peak": (
+                    {"p%d" % p: percentile(peaks, p) for p in PERCENTILES}
+                    if peaks
+                    else None
+                ),
+                "peak_max": peaks[-1] if peaks else None,
+            }
+        return summary
+
+    def format_summary(self):
+        """Per-stage summary as a markdown table"""
+        table = STAGES_TABLE_HEADER
+        for name, stats in self.summarize().items():
+            table += "{} | {} | {:.4f} | {:.4f} | {:.4f} | {:.4f} | {:.4f} | {}\n".format(  # pylint: disable=line-too-long
+                name,
+                stats["count"],
+                stats["wall"]["p50"],
+                stats["wall"]["p90"],
+                stats["wall"]["p99"],
+                stats["wall_max"],
+                stats["cpu_total"],
+                (
+                    "-"
+                    if stats["peak_max"] is None
+                    else "{:.1f}".format(stats["peak_max"] / 1024.0)
+                ),
+            )
+        return table
+
+    def write(self, output_dir):
+        """Write trace and summary files into given directory"""
+        if not op.isdir(output_dir):
+            os.makedirs(output_dir)
+        pid = os.getpid()
+        events = [
+            {
+                "name": x["name"],
+                "cat": "stage",
+                "ph": "X",
+                "ts": x["start"] * 1e6,
+                "dur": x["wall"] * 1e6,
+                "pid": pid,
+                "tid": x["tid"],
+                "args": {"cpu": x["cpu"], "peak": x["peak"]},
+            }
+            for x in self.records
+        ]
+        with open(op.join(output_dir, DEFAULT_TRACE_FILE), "w") as tf:
+            json.dump({"traceEvents": events}, tf)
+        with open(op.join(output_dir, DEFAULT_SUMMARY_FILE), "w") as sf:
+            json.dump(self.summarize(), sf, indent=2)
+
+
+PROFILER = StageProfiler()
@@ -2,26 +2,57 @@
 """Open Rhino.Inside.Revit inside Revit for debugging
 
 Usage:
-    {} <revit_year> [<model_path>] [<ghdoc_path>] [--lang=<lang_code>] [--rps] [--dryrun]
+    {cliname} bisect <revit_year> <addin_manifest>... [--threshold=<secs>] [--timeout=<secs>] [--lang=<lang_code>]
+    {cliname} bench <revit_year> <model_path> <ghdoc_path>... [--reps=<count>] [--results=<results_file>] [--baseline=<results_file>] [--tolerance=<percent>] [--timeout=<secs>] [--lang=<lang_code>] [--profile=<profile_dir>] [--cprofile]
+    {cliname} multi <revit_year> <ghdoc_path> <model_file>... [--journal=<journal_file>] [--results=<results_file>] [--timeout=<secs>] [--lang=<lang_code>] [--dryrun]
+    {cliname} probe [--sample=<secs>]
+    {cliname} <revit_year> [<model_path>] [<ghdoc_path>] [--lang=<lang_code>] [--rps] [--dryrun] [--sample=<secs>] [--profile=<profile_dir>] [--cprofile]
 
 Options:
     -h, --help          Show this help
     --rps               Add RevitPythonShell addon
     --dryrun            Create runtime env but do not start Revit
+    --sample=<secs>     Sample Revit process resources at this interval
     <model_path>        Revit model to be opened
     <ghdoc_path>        Grasshopper document to be opened
     <lang_code>         Language code to Open Revit with
+    <addin_manifest>    Third-party .addin manifest (or directory of them)
+    <model_file>        Revit model, directory of models or text file listing models
+    --timeout=<secs>    Kill unattended Revit after this many seconds (per model) [default: 600]
+    --threshold=<secs>  Bisect: fail sessions taking longer than this
+    --reps=<count>      Bench: runs per Grasshopper document [default: 3]
+    --baseline=<results_file>   Bench: compare results against this file
+    --tolerance=<percent>       Bench: allowed slowdown over baseline [default: 10]
+    --results=<results_file>    Bench/Multi: results file
+    --journal=<journal_file>    Multi: parse this recorded journal instead of running Revit
+    --profile=<profile_dir>     Write per-stage timings and trace into directory
+    --cprofile                  Also dump cProfile stats per stage
 """
 import sys
 import os
 import os.path as op
 import re
+import json
+import time
+import shutil
+import csv
+import ctypes
+import ctypes.wintypes
+import abc
+import hashlib
+import threading
+import statistics
 import subprocess
+from collections import namedtuple
+from datetime import datetime
 
 # pipenv dependencies
 from docopt import docopt
 import rjm
 
+# local modules
+from dbgprofile import PROFILER
+
 # cli info
 __binname__ = op.splitext(op.basename(__file__))[0]  # grab script name
 __version__ = "1.0"
@@ -32,6 +63,21 @@ DEFAULT_JRN_ARTIFACT_PATTERN = r"^journal\.\d{4}"
 DEFAULT_ADDIN_MANIFEST_PATTERN = r".+\.addin$"
 DEFAULT_CACHE_DIR = ".debug"
 DEFAULT_REVIT_BIN_PATH = r"%PROGRAMFILES%\Autodesk\Revit {year}\Revit.exe"
+DEFAULT_REVIT_JRN_DIR = r"%LOCALAPPDATA%\Autodesk\Revit\Autodesk Revit {year}\Journals"  # pylint: disable=line-too-long
+DEFAULT_BISECT_DIR = "bisect"
+DEFAULT_BISECT_CACHE = "bisect.json"
+DEFAULT_BENCH_DIR = "bench"
+DEFAULT_BENCH_RESULTS = "bench.json"
+DEFAULT_MULTI_DIR = "multi"
+DEFAULT_MULTI_RESULTS = "multi.json"
+DEFAULT_MODEL_PATTERN = r".+\.rvt$"
+DEFAULT_SAMPLES_FILE = "resources.csv"
+DEFAULT_SAMPLES_SUMMARY = "resources.json"
+DEFAULT_GHDOC_PATTERN = r".+\.ghx?$"
+DEFAULT_JRN_TIMESTAMP_PATTERN = (
+    r"'[A-Z] (\d{2}-[A-Za-z]{3}-\d{4} \d{2}:\d{2}:\d{2}\.\d{3});"
+)
+DEFAULT_JRN_TIMESTAMP_FORMAT = "%d-%b-%Y %H:%M:%S.%f"
 DEFAULT_ADDON_MANIFEST = r"""<?xml version="1.0" encoding="utf-8"?>
 <RevitAddIns>
   <AddIn Type="Application">
@@ -59,6 +105,46 @@ RPS_ADDON_INFO = {
     "uuid": "3a7a1d24-51ed-462b-949f-1ddcca12008d",
     "vendor": "RIPS",
 }
+
+# journal contents showing Rhino.Inside.Revit did not load
+RIR_LOAD_FAILURE_MARKERS = [
+    "Rhino.Inside failed to load",
+    "ShowLoadError",
+]
+# journal contents showing Grasshopper command was reached
+RIR_READY_MARKER = "RhinoInside.Revit.UI.CommandGrasshopper"
+
+# journal milestones of a Rhino.Inside.Revit session
+JRN_MILESTONES = {
+    "rhino": "RhinoInside.Revit.UI.CommandRhinoInside",
+    "grasshopper": RIR_READY_MARKER,
+    "close": "ID_REVIT_FILE_CLOSE",
+    "exit": "ID_APP_EXIT",
+}
+# journal entries for running many models in one session
+JRN_MODEL_MARKER = "' multi-model journal: model {index} ({model_path})\n"
+# revit only asks to save changes of modified models, so no answer is
+# recorded for the dialog. a recorded answer would be read by the next entry
+# when the model is not modified, and desync the rest of the playback
+JRN_DOC_CLOSE_ENTRY = """Jrn.Command "Internal" , "Close the active project , ID_REVIT_FILE_CLOSE"
+"""
+JRN_MODEL_OPEN_PATTERN = r'"File Name"\s*,\s*"IDOK"\s*,\s*"(.+?)"'
+
+# session phases timed between journal milestones
+BENCH_PHASES = {
+    "launch": ("start", "rhino"),
+    "load": ("rhino", "grasshopper"),
+    "solve": ("grasshopper", "exit"),
+    "shutdown": ("exit", "end"),
+    "total": ("start", "end"),
+}
+# per-model phases timed between journal milestones of a multi-model session
+MULTI_PHASES = {
+    "open": ("start", "rhino"),
+    "load": ("rhino", "grasshopper"),
+    "solve": ("grasshopper", "close"),
+    "total": ("start", "end"),
+}
 # =============================================================================
 
 
@@ -68,13 +154,326 @@ class CLIArgs:
     def __init__(self, args):
         self.revit_year = args["<revit_year>"]
         self.model_path = args["<model_path>"]
-        self.ghdoc_path = args["<ghdoc_path>"]
+        self.ghdoc_path = args["<ghdoc_path>"][0] if args["<ghdoc_path>"] else None
         self.add_rps = args["--rps"]
         self.start_revit = not args["--dryrun"]
         # default language to english-US
         # otherwise revit will somehow remember the last langauge used
         # while in automation mode
         self.lang_code = args["--lang"] or "ENU"
+        self.sample_interval = float(args["--sample"]) if args["--sample"] else None
+        # bisect mode
+        self.bisect = args["bisect"]
+        self.addin_manifests = args["<addin_manifest>"]
+        self.threshold = float(args["--threshold"]) if args["--threshold"] else None
+        self.timeout = float(args["--timeout"])
+        # bench mode
+        self.bench = args["bench"]
+        self.ghdoc_paths = args["<ghdoc_path>"]
+        self.reps = int(args["--reps"])
+        self.results_file = args["--results"]
+        # multi mode
+        self.multi = args["multi"]
+        self.model_files = args["<model_file>"]
+        self.journal_file = args["--journal"]
+        self.baseline_file = args["--baseline"]
+        self.tolerance = float(args["--tolerance"]) / 100.0
+        # probe mode
+        self.probe = args["probe"]
+        # profiling
+        self.profile_dir = args["--profile"]
+        self.cprofile = args["--cprofile"]
+
+
+RevitSession = namedtuple(
+    "RevitSession", ["exit_code", "start", "elapsed", "samples"]
+)
+
+ProcessSample = namedtuple(
+    "ProcessSample", ["elapsed", "cpu", "rss", "threads", "handles"]
+)
+
+
+class ProcessProbe(abc.ABC):
+    """Reads resource usage of a running process"""
+
+    def __init__(self, pid):
+        self.pid = pid
+
+    @abc.abstractmethod
+    def read(self):
+        """Return (cpu seconds, rss bytes, threads, handles) or None if gone"""
+
+
+class ProcfsProbe(ProcessProbe):
+    """Reads resource usage of a process from Linux /proc"""
+
+    CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+    PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+    def read(self):
+        proc_dir = "/proc/{}".format(self.pid)
+        try:
+            with open(op.join(proc_dir, "stat"), "r") as sf:
+                stat = sf.read()
+            # command name might contain spaces, fields start after it
+            fields = stat[stat.rindex(")") + 2 :].split()
+            # zombie processes have exited already
+            if fields[0] == "Z":
+                return None
+            cpu = (int(fields[11]) + int(fields[12])) / self.CLOCK_TICKS
+            threads = int(fields[17])
+            rss = int(fields[21]) * self.PAGE_SIZE
+            handles = len(os.listdir(op.join(proc_dir, "fd")))
+            return cpu, rss, threads, handles
+        except (OSError, ValueError, IndexError):
+            return None
+
+
+class WindowsProbe(ProcessProbe):
+    """Reads resource usage of a process using Win32 APIs"""
+
+    PROCESS_QUERY_INFORMATION = 0x0400
+    PROCESS_VM_READ = 0x0010
+    STILL_ACTIVE = 259
+    TH32CS_SNAPPROCESS = 0x00000002
+
+    class FILETIME(ctypes.Structure):
+        """Win32 FILETIME"""
+
+        _fields_ = [("low", ctypes.c_uint32), ("high", ctypes.c_uint32)]
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        """Win32 PROCESS_MEMORY_COUNTERS"""
+
+        _fields_ = [
+            ("cb", ctypes.c_uint32),
+            ("PageFaultCount", ctypes.c_uint32),
+            ("PeakWorkingSetSize", ctypes.c_size_t),
+            ("WorkingSetSize", ctypes.c_size_t),
+            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+            ("PagefileUsage", ctypes.c_size_t),
+            ("PeakPagefileUsage", ctypes.c_size_t),
+        ]
+
+    class PROCESSENTRY32(ctypes.Structure):
+        """Win32 PROCESSENTRY32"""
+
+        _fields_ = [
+            ("dwSize", ctypes.c_uint32),
+            ("cntUsage", ctypes.c_uint32),
+            ("th32ProcessID", ctypes.c_uint32),
+            ("th32DefaultHeapID", ctypes.c_void_p),
+            ("th32ModuleID", ctypes.c_uint32),
+            ("cntThreads", ctypes.c_uint32),
+            ("th32ParentProcessID", ctypes.c_uint32),
+            ("pcPriClassBase", ctypes.c_long),
+            ("dwFlags", ctypes.c_uint32),
+            ("szExeFile", ctypes.c_char * 260),
+        ]
+
+    def __init__(self, pid):
+        super().__init__(pid)
+        self._kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        self._declare_functions()
+        self._handle = self._kernel32.OpenProcess(
+            self.PROCESS_QUERY_INFORMATION | self.PROCESS_VM_READ, False, pid
+        )
+
+    def _declare_functions(self):
+        # without declarations ctypes truncates HANDLE values to 32-bit int
+        wintypes = ctypes.wintypes
+        pointer = ctypes.c_void_p
+        for name, restype, argtypes in [
+            (
+                "OpenProcess",
+                wintypes.HANDLE,
+                [wintypes.DWORD, wintypes.BOOL, wintypes.DWORD],
+            ),
+            ("CloseHandle", wintypes.BOOL, [wintypes.HANDLE]),
+            (
+                "CreateToolhelp32Snapshot",
+                wintypes.HANDLE,
+                [wintypes.DWORD, wintypes.DWORD],
+            ),
+            ("Process32First", wintypes.BOOL, [wintypes.HANDLE, pointer]),
+            ("Process32Next", wintypes.BOOL, [wintypes.HANDLE, pointer]),
+            ("GetExitCodeProcess", wintypes.BOOL, [wintypes.HANDLE, pointer]),
+            (
+                "GetProcessTimes",
+                wintypes.BOOL,
+                [wintypes.HANDLE, pointer, pointer, pointer, pointer],
+            ),
+            (
+                "K32GetProcessMemoryInfo",
+                wintypes.BOOL,
+                [wintypes.HANDLE, pointer, wintypes.DWORD],
+            ),
+            ("GetProcessHandleCount", wintypes.BOOL, [wintypes.HANDLE, pointer]),
+        ]:
+            function = getattr(self._kernel32, name)
+            function.restype = restype
+            function.argtypes = argtypes
+
+    def __del__(self):
+        if getattr(self, "_handle", None):
+            self._kernel32.CloseHandle(self._handle)
+
+    def _thread_count(self):
+        snapshot = self._kernel32.CreateToolhelp32Snapshot(
+            self.TH32CS_SNAPPROCESS, 0
+        )
+        entry = self.PROCESSENTRY32()
+        entry.dwSize = ctypes.sizeof(entry)
+        try:
+            found = self._kernel32.Process32First(snapshot, ctypes.byref(entry))
+            while found:
+                if entry.th32ProcessID == self.pid:
+                    return entry.cntThreads
+                found = self._kernel32.Process32Next(snapshot, ctypes.byref(entry))
+        finally:
+            self._kernel32.CloseHandle(snapshot)
+        return 0
+
+    def read(self):
+        if not self._handle:
+            return None
+        exit_code = ctypes.c_uint32()
+        self._kernel32.GetExitCodeProcess(self._handle, ctypes.byref(exit_code))
+        if exit_code.value != self.STILL_ACTIVE:
+            return None
+        creation, exited, kernel, user = [self.FILETIME() for _ in range(4)]
+        self._kernel32.GetProcessTimes(
+            self._handle,
+            ctypes.byref(creation),
+            ctypes.byref(exited),
+            ctypes.byref(kernel),
+            ctypes.byref(user),
+        )
+        # FILETIME counts 100ns intervals
+        cpu = sum((x.high << 32 | x.low) for x in (kernel, user)) / 1e7
+        counters = self.PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        self._kernel32.K32GetProcessMemoryInfo(
+            self._handle, ctypes.byref(counters), counters.cb
+        )
+        handles = ctypes.c_uint32()
+        self._kernel32.GetProcessHandleCount(self._handle, ctypes.byref(handles))
+        return cpu, counters.WorkingSetSize, self._thread_count(), handles.value
+
+
+def make_process_probe(pid):
+    """Create a resource probe for given process on this platform"""
+    if sys.platform == "win32":
+        return WindowsProbe(pid)
+    if op.isdir("/proc"):
+        return ProcfsProbe(pid)
+    raise Exception("Process sampling is not supported on %s" % sys.platform)
+
+
+# stub process holding known resources for checking the process probe
+PROBE_STUB_SCRIPT = """
+import sys, threading, time
+block = bytearray(64 * 1024 * 1024)
+for i in range(0, len(block), 4096):
+    block[i] = 1
+worker = threading.Thread(target=time.sleep, args=(30,), daemon=True)
+worker.start()
+handle = open(sys.executable, "rb")
+end = time.process_time() + 0.5
+while time.process_time() < end:
+    pass
+time.sleep({lifetime})
+"""
+PROBE_STUB_LIFETIME = 2.0
+PROBE_STUB_MIN_RSS = 64 * 1024 * 1024
+
+
+def check_process_probe(interval):
+    """Sample a stub process and check the probe reads its resources
+
+    The stub allocates and touches 64MB, starts a second thread, opens a
+    file and burns 0.5s of cpu before sleeping, then exits
+    """
+    stub = subprocess.Popen(
+        [
+            sys.executable,
+            "-c",
+            PROBE_STUB_SCRIPT.format(lifetime=PROBE_STUB_LIFETIME),
+        ]
+    )
+    sampler = ProcessSampler(make_process_probe(stub.pid), interval)
+    sampler.start()
+    stub.wait()
+    # exited process must read as gone
+    time.sleep(interval)
+    gone = make_process_probe(stub.pid).read() is None
+    sampler.stop()
+
+    samples = sampler.samples
+    for sample in samples:
+        print(
+            "{:.2f}s cpu={:.2f}s rss={:.1f}MB threads={} handles={}".format(
+                sample.elapsed,
+                sample.cpu,
+                sample.rss / 1048576.0,
+                sample.threads,
+                sample.handles,
+            )
+        )
+    failures = []
+    if not samples:
+        failures.append("no samples")
+    else:
+        if max(x.cpu for x in samples) < 0.25:
+            failures.append("cpu time not measured")
+        if max(x.rss for x in samples) < PROBE_STUB_MIN_RSS:
+            failures.append("rss below allocated memory")
+        if max(x.threads for x in samples) < 2:
+            failures.append("worker thread not counted")
+        if max(x.handles for x in samples) < 1:
+            failures.append("open handles not counted")
+    if not gone:
+        failures.append("exited process still reported")
+    if failures:
+        raise Exception("Process probe check failed: " + ", ".join(failures))
+    print("process probe ok ({})".format(type(sampler.probe).__name__))
+
+
+class ProcessSampler:
+    """Samples resource usage of a process on a background thread"""
+
+    def __init__(self, probe, interval, start=None):
+        self.probe = probe
+        self.interval = interval
+        self.samples = []
+        self._start = start or time.time()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        """Start sampling on background thread"""
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling and wait for background thread"""
+        self._stop.set()
+        self._thread.join()
+
+    def sample(self):
+        """Take one sample, returns False once the process is gone"""
+        usage = self.probe.read()
+        if usage is None:
+            return False
+        self.samples.append(ProcessSample(time.time() - self._start, *usage))
+        return True
+
+    def _run(self):
+        while self.sample() and not self._stop.wait(self.interval):
+            pass
 
 
 def ensure_cache_dir():
@@ -110,33 +509,13 @@ def prepare_cache():
     return cache_dir
 
 
-def create_rir_journal(
-    journal_dir, model_path="", ghdoc_path="", journal_name=DEFAULT_JRN_NAME
-):
-    """Create a new Revit journal to lauch Revit and open Rhino.Inside.Revit
+def add_rir_commands(jm, ghdoc_path=""):
+    """Add Rhinoceros and Grasshopper commands to given journal maker
 
     Args:
-        journal_dir (str): directory path to create the journal file inside
-        model_path (str, optional): request to open this model in journal
+        jm (rjm.JournalMaker): journal maker to add the commands to
         ghdoc_path (str, optional): request to open this gh document
-        journal_name (str, optional): name of the journal file
     """
-    # start a clean journal
-    # note on `take_default_action=False`
-    # activating PerformAutomaticActionInErrorDialog causes an issue when
-    # closing a Revit in journal-mode with a modified open document,
-    # will cause Revit to automatically hit Yes to the "Do you want to save?"
-    # pop up and shows the Save file pop up. Thus, user can not close Revit
-    # unless they save the file which could take time depending on the size
-    jm = rjm.JournalMaker(permissive=True, take_default_action=False)
-
-    # open model
-    if model_path:
-        if op.isfile(model_path):
-            jm.open_model(model_path)
-        else:
-            raise Exception("Revit model does not exist: {}".format(model_path))
-
     # ask to open Rhinoceros tab
     jm.execute_command(
         tab_name="Add-Ins",
@@ -162,6 +541,82 @@ def create_rir_journal(
         command_data=cmd_data,
     )
 
+
+def create_rir_journal(
+    journal_dir,
+    model_path="",
+    ghdoc_path="",
+    journal_name=DEFAULT_JRN_NAME,
+    exit_revit=False,
+):
+    """Create a new Revit journal to lauch Revit and open Rhino.Inside.Revit
+
+    Args:
+        journal_dir (str): directory path to create the journal file inside
+        model_path (str, optional): request to open this model in journal
+        ghdoc_path (str, optional): request to open this gh document
+        journal_name (str, optional): name of the journal file
+        exit_revit (bool, optional): close Revit at the end of the journal
+    """
+    # start a clean journal
+    # note on `take_default_action=False`
+    # activating PerformAutomaticActionInErrorDialog causes an issue when
+    # closing a Revit in journal-mode with a modified open document,
+    # will cause Revit to automatically hit Yes to the "Do you want to save?"
+    # pop up and shows the Save file pop up. Thus, user can not close Revit
+    # unless they save the file which could take time depending on the size
+    jm = rjm.JournalMaker(permissive=True, take_default_action=False)
+
+    # open model
+    if model_path:
+        if op.isfile(model_path):
+            jm.open_model(model_path)
+        else:
+            raise Exception("Revit model does not exist: {}".format(model_path))
+
+    add_rir_commands(jm, ghdoc_path=ghdoc_path)
+
+    # close revit when running unattended
+    if exit_revit:
+        jm.exit()
+
+    # write journal to file
+    journal_filepath = op.join(journal_dir, journal_name)
+    jm.write_journal(journal_filepath)
+    return journal_filepath
+
+
+def create_rir_multi_journal(
+    journal_dir, model_paths, ghdoc_path="", journal_name=DEFAULT_JRN_NAME
+):
+    """Create a Revit journal that runs Rhino.Inside.Revit on many models
+
+    Each model is opened in turn, Rhinoceros and Grasshopper commands are
+    executed and the model is closed. Revit exits at the end. No answer is
+    recorded for the save changes dialog, so definitions must not modify
+    the models.
+
+    Args:
+        journal_dir (str): directory path to create the journal file inside
+        model_paths (list[str]): models to open one after the other
+        ghdoc_path (str, optional): request to open this gh document
+        journal_name (str, optional): name of the journal file
+    """
+    # see create_rir_journal on `take_default_action=False`
+    jm = rjm.JournalMaker(permissive=True, take_default_action=False)
+
+    for idx, model_path in enumerate(model_paths):
+        if not op.isfile(model_path):
+            raise Exception("Revit model does not exist: {}".format(model_path))
+        jm.add_custom_entry(
+            JRN_MODEL_MARKER.format(index=idx, model_path=model_path)
+        )
+        jm.open_model(model_path)
+        add_rir_commands(jm, ghdoc_path=ghdoc_path)
+        jm.add_custom_entry(JRN_DOC_CLOSE_ENTRY)
+
+    jm.exit()
+
     # write journal to file
     journal_filepath = op.join(journal_dir, journal_name)
     jm.write_journal(journal_filepath)
@@ -210,36 +665,732 @@ def find_revit_binary(revit_year):
     raise Exception("Can not find Revit {} binary at {}".format(revit_year, bin_path))
 
 
-def run_revit(cfg: CLIArgs, journal_file):
-    """Launch given revit version with given journal file"""
+def find_session_journal(revit_year, journal_dir, since):
+    """Find the journal Revit recorded for a session started at given time
+
+    Args:
+        revit_year (str): revit version number
+        journal_dir (str): directory of the journal used to launch Revit
+        since (float): session start time (seconds since epoch)
+    """
+    candidates = []
+    search_dirs = [
+        journal_dir,
+        op.expandvars(DEFAULT_REVIT_JRN_DIR.format(year=revit_year)),
+    ]
+    for search_dir in search_dirs:
+        if not op.isdir(search_dir):
+            continue
+        for entry in os.listdir(search_dir):
+            entry_path = op.join(search_dir, entry)
+            if re.match(DEFAULT_JRN_ARTIFACT_PATTERN, entry) and op.isfile(
+                entry_path
+            ):
+                mtime = op.getmtime(entry_path)
+                if mtime >= since:
+                    candidates.append((mtime, entry_path))
+    # latest recorded journal wins
+    if candidates:
+        return sorted(candidates)[-1][1]
+
+
+def read_session_journal(revit_year, journal_dir, since):
+    """Read the journal Revit recorded for a session started at given time"""
+    session_journal = find_session_journal(revit_year, journal_dir, since)
+    if session_journal:
+        with open(session_journal, "r", errors="ignore") as jf:
+            return jf.read()
+    return ""
+
+
+def parse_journal_milestones(journal_text, milestones=None):
+    """Find the time of journal milestones relative to the journal start
+
+    Each milestone takes the last timestamp recorded before its marker.
+    `start` and `end` are the first and last timestamps in the journal.
+
+    Returns:
+        dict: milestone name to seconds since start
+    """
+    milestones = milestones or JRN_MILESTONES
+    found = {}
+    start = current = None
+    for jline in journal_text.split("\n"):
+        match = re.search(DEFAULT_JRN_TIMESTAMP_PATTERN, jline)
+        if match:
+            current = datetime.strptime(
+                match.groups()[0], DEFAULT_JRN_TIMESTAMP_FORMAT
+            )
+            if start is None:
+                start = current
+            continue
+        if current is None:
+            continue
+        for name, marker in milestones.items():
+            if name not in found and marker in jline:
+                found[name] = (current - start).total_seconds()
+    if start is not None:
+        found["start"] = 0.0
+        found["end"] = (current - start).total_seconds()
+    return found
+
+
+def phase_timings(milestones, phases):
+    """Compute phase durations from journal milestones"""
+    timings = {}
+    for phase, (from_ms, to_ms) in phases.items():
+        if from_ms in milestones and to_ms in milestones:
+            timings[phase] = milestones[to_ms] - milestones[from_ms]
+    return timings
+
+
+def split_multi_model_journal(journal_text, model_paths):
+    """Split a recorded multi-model session journal into per-model sections
+
+    Sections start at the journal entry opening each model and carry the
+    last timestamp recorded before it. Models are opened in the given
+    order, so a model listed twice gets a section for each time it is
+    opened.
+
+    Returns:
+        list: section of the journal for each model, None if not reached
+    """
+    sections = [None] * len(model_paths)
+    current = None
+    last_stamp = ""
+    lines = []
+    for jline in journal_text.split("\n"):
+        if re.search(DEFAULT_JRN_TIMESTAMP_PATTERN, jline):
+            last_stamp = jline
+        match = re.search(JRN_MODEL_OPEN_PATTERN, jline)
+        if match:
+            # next model opened with this exact path (case-insensitive
+            # as windows paths are)
+            opened = next(
+                (
+                    idx
+                    for idx in range(
+                        0 if current is None else current + 1, len(model_paths)
+                    )
+                    if model_paths[idx].lower() == match.group(1).lower()
+                ),
+                None,
+            )
+            if opened is not None:
+                if current is not None:
+                    sections[current] = "\n".join(lines)
+                current = opened
+                lines = [last_stamp]
+        if current is not None:
+            lines.append(jline)
+    if current is not None:
+        sections[current] = "\n".join(lines)
+    return sections
+
+
+def parse_multi_model_journal(journal_text, model_paths):
+    """Extract per-model results and timings from a multi-model journal"""
+    sections = split_multi_model_journal(journal_text, model_paths)
+    results = []
+    for model_path, section in zip(model_paths, sections):
+        if section is None:
+            results.append({"model": model_path, "reason": "not reached"})
+            continue
+        milestones = parse_journal_milestones(section)
+        result = {
+            "model": model_path,
+            "reason": judge_session(section, exit_code=0, elapsed=0),
+        }
+        result.update(phase_timings(milestones, MULTI_PHASES))
+        results.append(result)
+    return results
+
+
+def launch_revit(
+    revit_year, journal_file, lang_code=None, timeout=None, sample_interval=None
+):
+    """Launch given revit version with given journal file and wait for exit
+
+    Args:
+        revit_year (str): revit version number
+        journal_file (str): journal file to launch Revit with
+        lang_code (str, optional): language code to open Revit with
+        timeout (float, optional): kill Revit after this many seconds
+        sample_interval (float, optional): sample process resources
+            at this interval (seconds)
+
+    Returns:
+        RevitSession: exit code (None if killed on timeout), start time,
+            elapsed wall time and resource samples
+    """
     # find revit binary
-    revit_path = find_revit_binary(cfg.revit_year)
+    revit_path = find_revit_binary(revit_year)
     journal_file = op.abspath(journal_file)
     # launch Revit and wait
-    if cfg.lang_code:
-        opts = (revit_path, journal_file, "/language", cfg.lang_code)
+    if lang_code:
+        opts = (revit_path, journal_file, "/language", lang_code)
     else:
         opts = (revit_path, journal_file)
     print("running: %s" % " ".join(list(opts)))
-    subprocess.run(list(opts))
+    start = time.time()
+    proc = subprocess.Popen(list(opts))
+    return wait_process(proc, start, timeout, sample_interval)
+
+
+def wait_process(proc, start, timeout=None, sample_interval=None):
+    """Wait for given process to exit while sampling its resources"""
+    sampler = None
+    if sample_interval:
+        sampler = ProcessSampler(
+            make_process_probe(proc.pid), sample_interval, start=start
+        )
+        sampler.start()
+    try:
+        exit_code = proc.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+        exit_code = None
+    finally:
+        if sampler:
+            sampler.stop()
+    return RevitSession(
+        exit_code, start, time.time() - start, sampler.samples if sampler else []
+    )
+
+
+def align_milestones(journal_text, session_start):
+    """Convert journal milestones to seconds since given session start"""
+    match = re.search(DEFAULT_JRN_TIMESTAMP_PATTERN, journal_text)
+    if not match:
+        return {}
+    # journal timestamps are in local time
+    journal_start = datetime.strptime(
+        match.groups()[0], DEFAULT_JRN_TIMESTAMP_FORMAT
+    ).timestamp()
+    return {
+        name: journal_start + offset - session_start
+        for name, offset in parse_journal_milestones(journal_text).items()
+    }
+
+
+def write_samples(samples, milestones, output_dir):
+    """Write resource samples as a time series plus a summary
+
+    Samples are tagged with the last journal milestone reached.
+    """
+    ordered_milestones = sorted(milestones.items(), key=lambda x: x[1])
+    samples_file = op.join(output_dir, DEFAULT_SAMPLES_FILE)
+    with open(samples_file, "w", newline="") as sf:
+        writer = csv.writer(sf)
+        writer.writerow(list(ProcessSample._fields) + ["milestone"])
+        for sample in samples:
+            reached = [x for x, t in ordered_milestones if t <= sample.elapsed]
+            writer.writerow(
+                list(sample) + [reached[-1] if reached else ""]
+            )
+
+    summary = {
+        "samples": len(samples),
+        "milestones": milestones,
+        "peak_rss": max((x.rss for x in samples), default=0),
+        "peak_threads": max((x.threads for x in samples), default=0),
+        "peak_handles": max((x.handles for x in samples), default=0),
+        "cpu_seconds": samples[-1].cpu if samples else 0,
+    }
+    if "grasshopper" in milestones:
+        before_ready = [
+            x for x in samples if x.elapsed <= milestones["grasshopper"]
+        ]
+        summary["cpu_seconds_to_grasshopper"] = (
+            before_ready[-1].cpu if before_ready else 0
+        )
+    summary_file = op.join(output_dir, DEFAULT_SAMPLES_SUMMARY)
+    with open(summary_file, "w") as sf:
+        json.dump(summary, sf, indent=2)
+    return summary
+
+
+def run_revit(cfg: CLIArgs, journal_file):
+    """Launch given revit version with given journal file"""
+    session = launch_revit(
+        cfg.revit_year,
+        journal_file,
+        lang_code=cfg.lang_code,
+        sample_interval=cfg.sample_interval,
+    )
+    if cfg.sample_interval:
+        journal_dir = op.dirname(journal_file)
+        journal_text = read_session_journal(
+            cfg.revit_year, journal_dir, session.start
+        )
+        summary = write_samples(
+            session.samples,
+            align_milestones(journal_text, session.start),
+            journal_dir,
+        )
+        print(
+            "peak rss: {:.1f} MB | cpu: {:.1f}s".format(
+                summary["peak_rss"] / 1048576.0, summary["cpu_seconds"]
+            )
+        )
+
+
+def read_manifest_files(manifest_paths):
+    """Collect .addin manifest files from given files or directories"""
+    manifests = {}
+    for mpath in manifest_paths:
+        if op.isdir(mpath):
+            entries = [op.join(mpath, x) for x in os.listdir(mpath)]
+        else:
+            entries = [mpath]
+        for entry in entries:
+            if op.isfile(entry) and re.match(
+                DEFAULT_ADDIN_MANIFEST_PATTERN, entry, flags=re.IGNORECASE
+            ):
+                with open(entry, "rb") as mf:
+                    contents = mf.read()
+                # rhino.inside is always added by this script
+                if RIR_ADDON_INFO["uuid"].encode() in contents.upper():
+                    continue
+                manifests[op.basename(entry)] = contents
+    if not manifests:
+        raise Exception("No .addin manifests found in given paths")
+    # revit loads manifests in name order
+    return [(x, manifests[x]) for x in sorted(manifests, key=str.lower)]
+
+
+def subset_hash(manifests, *settings):
+    """Make a stable key for given list of (name, contents) manifests
+
+    Settings changing the outcome of a session (e.g. revit year) are part
+    of the key, so results of other settings are not reused
+    """
+    digest = hashlib.sha1()
+    for setting in settings:
+        digest.update(str(setting).encode())
+        digest.update(b"\0")
+    for name, contents in sorted(manifests):
+        digest.update(name.lower().encode())
+        digest.update(hashlib.sha1(contents).digest())
+    return digest.hexdigest()
+
+
+def judge_session(journal_text, exit_code, elapsed, threshold=None):
+    """Judge a Revit session and return the reason of failure if any"""
+    if exit_code is None:
+        return "timed out"
+    if not journal_text:
+        return "no session journal"
+    for marker in RIR_LOAD_FAILURE_MARKERS:
+        if marker in journal_text:
+            return "load error"
+    if RIR_READY_MARKER not in journal_text:
+        return "grasshopper not reached"
+    return judge_elapsed(elapsed, threshold)
+
+
+def judge_elapsed(elapsed, threshold=None):
+    """Judge session time and return the reason of failure if any"""
+    if threshold and elapsed > threshold:
+        return "slow ({:.1f}s)".format(elapsed)
+    return ""
+
+
+def run_bisect_step(cfg: CLIArgs, cache_dir, manifests, cache):
+    """Run Revit with given subset of manifests and judge the session
+
+    Results are cached by subset hash so interrupted runs can be resumed.
+    Cached sessions are judged again with the current threshold
+    """
+    key = subset_hash(manifests, cfg.revit_year, cfg.lang_code, cfg.timeout)
+    if key in cache:
+        result = cache[key]
+        reason = result["failure"] or judge_elapsed(
+            result["elapsed"], cfg.threshold
+        )
+        print(
+            "cached: {} add-ins -> {}".format(len(manifests), reason or "ok")
+        )
+        return not reason
+
+    # a fresh addins directory for this subset
+    # revit loads manifests next to the launch journal
+    step_dir = op.join(cache_dir, DEFAULT_BISECT_DIR, key)
+    if op.isdir(step_dir):
+        shutil.rmtree(step_dir)
+    os.makedirs(step_dir)
+    for name, contents in manifests:
+        with open(op.join(step_dir, name), "wb") as mf:
+            mf.write(contents)
+    add_addons(cfg.revit_year, step_dir, add_rps=False)
+    journal_file = create_rir_journal(step_dir, exit_revit=True)
+
+    session = launch_revit(
+        cfg.revit_year, journal_file, lang_code=cfg.lang_code, timeout=cfg.timeout
+    )
+    journal_text = read_session_journal(cfg.revit_year, step_dir, session.start)
+    # failures other than slow sessions do not depend on the threshold
+    failure = judge_session(journal_text, session.exit_code, session.elapsed)
+    reason = failure or judge_elapsed(session.elapsed, cfg.threshold)
+    print("tested: {} add-ins -> {}".format(len(manifests), reason or "ok"))
+
+    cache[key] = {
+        "manifests": [x[0] for x in manifests],
+        "exit_code": session.exit_code,
+        "elapsed": session.elapsed,
+        "failure": failure,
+    }
+    save_bisect_cache(cache_dir, cache)
+    return not reason
+
+
+def load_bisect_cache(cache_dir):
+    """Load bisect results from previous runs"""
+    cache_file = op.join(cache_dir, DEFAULT_BISECT_CACHE)
+    if op.isfile(cache_file):
+        with open(cache_file, "r") as cf:
+            return json.load(cf)
+    return {}
+
+
+def save_bisect_cache(cache_dir, cache):
+    """Save bisect results so far"""
+    cache_file = op.join(cache_dir, DEFAULT_BISECT_CACHE)
+    with open(cache_file, "w") as cf:
+        json.dump(cache, cf, indent=2)
+
+
+def bisect_addins(manifests, is_good):
+    """Find the add-in that makes a session fail using a binary search
+
+    Searches for the shortest failing prefix of the manifests in load order,
+    so add-ins that only fail in combination with earlier ones are found too.
+
+    Args:
+        manifests (list): (name, contents) manifests in load order
+        is_good (callable): returns True if given subset passes
+
+    Returns:
+        int: index of the culprit or -1 if everything passes
+    """
+    if is_good(manifests):
+        return -1
+    # invariant: manifests[:low] passes, manifests[:high] fails
+    low, high = 0, len(manifests)
+    while high - low > 1:
+        mid = (low + high) // 2
+        if is_good(manifests[:mid]):
+            low = mid
+        else:
+            high = mid
+    return high - 1
+
+
+def run_bisect(cfg: CLIArgs):
+    """Bisect given add-in manifests to find the one breaking Rhino.Inside"""
+    cache_dir = ensure_cache_dir()
+    cache = load_bisect_cache(cache_dir)
+    manifests = read_manifest_files(cfg.addin_manifests)
+
+    def is_good(subset):
+        return run_bisect_step(cfg, cache_dir, subset, cache)
+
+    # rhino.inside must load on its own for the search to make sense
+    if not is_good([]):
+        raise Exception("Rhino.Inside fails without any other add-ins")
+
+    culprit = bisect_addins(manifests, is_good)
+    if culprit == -1:
+        print("all {} add-ins pass".format(len(manifests)))
+    else:
+        name = manifests[culprit][0]
+        if culprit and is_good([manifests[culprit]]):
+            print("culprit: {} (only with preceding add-ins)".format(name))
+        else:
+            print("culprit: {}".format(name))
+
+
+def find_ghdoc_files(ghdoc_paths):
+    """Collect Grasshopper documents from given files or directories
+
+    Returns:
+        list: (key, path) of documents, see ghdoc_key
+    """
+    ghdocs = []
+    for ghpath in ghdoc_paths:
+        if op.isdir(ghpath):
+            ghdocs.extend(
+                (ghdoc_key(x, ghdoc_root=ghpath), op.join(ghpath, x))
+                for x in sorted(os.listdir(ghpath))
+                if re.match(DEFAULT_GHDOC_PATTERN, x, flags=re.IGNORECASE)
+            )
+        elif op.isfile(ghpath):
+            ghdocs.append((ghdoc_key(op.basename(ghpath)), ghpath))
+        else:
+            raise Exception("GH document does not exist: {}".format(ghpath))
+    keys = [x[0] for x in ghdocs]
+    for key in keys:
+        if keys.count(key) > 1:
+            raise Exception("GH documents with the same name: {}".format(key))
+    return ghdocs
+
+
+def ghdoc_key(ghdoc_name, ghdoc_root=None):
+    """Key of gh document in bench results
+
+    Documents in a given directory are keyed by the directory name and their
+    name, and given documents by their name, so keys do not change with the
+    working directory and results of different machines can be compared
+    """
+    if ghdoc_root:
+        return "{}/{}".format(op.basename(op.normpath(ghdoc_root)), ghdoc_name)
+    return ghdoc_name
+
+
+def run_bench_session(cfg: CLIArgs, cache_dir, ghdoc, rep):
+    """Run Revit once on given (key, path) gh document and time the phases"""
+    key, ghdoc_path = ghdoc
+    session_name = "{}-{}".format(
+        re.sub(r"[^\w.-]+", "_", op.splitext(key)[0]), rep
+    )
+    session_dir = op.join(cache_dir, DEFAULT_BENCH_DIR, session_name)
+    if op.isdir(session_dir):
+        shutil.rmtree(session_dir)
+    os.makedirs(session_dir)
+    with PROFILER.stage("manifest"):
+        add_addons(cfg.revit_year, session_dir, add_rps=False)
+    with PROFILER.stage("journal"):
+        journal_file = create_rir_journal(
+            session_dir,
+            model_path=cfg.model_path,
+            ghdoc_path=op.abspath(ghdoc_path),
+            exit_revit=True,
+        )
+
+    with PROFILER.stage("launch"):
+        session = launch_revit(
+            cfg.revit_year, journal_file, lang_code=cfg.lang_code, timeout=cfg.timeout
+        )
+    milestones = parse_journal_milestones(
+        read_session_journal(cfg.revit_year, session_dir, session.start)
+    )
+    timings = phase_timings(milestones, BENCH_PHASES)
+    if session.exit_code is None or "grasshopper" not in milestones:
+        timings["failed"] = True
+    return timings
+
+
+def summarize_runs(runs):
+    """Median of each phase over successful runs"""
+    summary = {}
+    good_runs = [x for x in runs if not x.get("failed")]
+    for phase in BENCH_PHASES:
+        values = [x[phase] for x in good_runs if phase in x]
+        if values:
+            summary[phase] = statistics.median(values)
+    return summary
+
+
+def compare_bench_results(results, baseline, tolerance):
+    """Compare median timings against baseline
+
+    Returns:
+        list: (definition, phase, baseline, current) regressions
+    """
+    regressions = []
+    for name, defresult in results["definitions"].items():
+        base = baseline.get("definitions", {}).get(name)
+        if not base:
+            continue
+        for phase, value in defresult["median"].items():
+            base_value = base["median"].get(phase)
+            if base_value and value > base_value * (1.0 + tolerance):
+                regressions.append((name, phase, base_value, value))
+    return regressions
+
+
+def run_bench(cfg: CLIArgs):
+    """Benchmark given gh documents against a model using generated journals"""
+    cache_dir = ensure_cache_dir()
+    ghdocs = find_ghdoc_files(cfg.ghdoc_paths)
+    if not ghdocs:
+        raise Exception("No Grasshopper documents found in given paths")
+
+    results = {
+        "revit_year": cfg.revit_year,
+        "model": op.basename(cfg.model_path),
+        "reps": cfg.reps,
+        "definitions": {},
+    }
+    for ghdoc in ghdocs:
+        runs = [
+            run_bench_session(cfg, cache_dir, ghdoc, rep)
+            for rep in range(cfg.reps)
+        ]
+        results["definitions"][ghdoc[0]] = {
+            "runs": runs,
+            "median": summarize_runs(runs),
+        }
+
+    with open(cfg.results_file or DEFAULT_BENCH_RESULTS, "w") as rf:
+        json.dump(results, rf, indent=2)
+
+    # report
+    print("definition | " + " | ".join(BENCH_PHASES) + " | failed")
+    for name, defresult in results["definitions"].items():
+        print(
+            "{} | {} | {}".format(
+                name,
+                " | ".join(
+                    "{:.2f}".format(defresult["median"][x])
+                    if x in defresult["median"]
+                    else "-"
+                    for x in BENCH_PHASES
+                ),
+                sum(1 for x in defresult["runs"] if x.get("failed")),
+            )
+        )
+
+    if cfg.baseline_file:
+        with open(cfg.baseline_file, "r") as bf:
+            baseline = json.load(bf)
+        regressions = compare_bench_results(results, baseline, cfg.tolerance)
+        for name, phase, base_value, value in regressions:
+            print(
+                "regression: {} {} {:.2f}s -> {:.2f}s".format(
+                    name, phase, base_value, value
+                )
+            )
+        if regressions:
+            raise Exception("{} timings regressed".format(len(regressions)))
+
+
+def find_model_files(model_files):
+    """Collect Revit models from files, directories or text lists of models"""
+    models = []
+    for mpath in model_files:
+        if op.isdir(mpath):
+            models.extend(
+                sorted(
+                    op.join(mpath, x)
+                    for x in os.listdir(mpath)
+                    if re.match(DEFAULT_MODEL_PATTERN, x, flags=re.IGNORECASE)
+                )
+            )
+        elif re.match(DEFAULT_MODEL_PATTERN, mpath, flags=re.IGNORECASE):
+            models.append(mpath)
+        elif op.isfile(mpath):
+            with open(mpath, "r") as lf:
+                models.extend(x.strip() for x in lf if x.strip())
+        else:
+            raise Exception("Revit model does not exist: {}".format(mpath))
+    # journal records absolute paths
+    return [op.abspath(x) for x in models]
+
+
+def run_multi(cfg: CLIArgs):
+    """Run a gh document on many models in a single Revit session"""
+    cache_dir = ensure_cache_dir()
+    model_paths = find_model_files(cfg.model_files)
+    if not model_paths:
+        raise Exception("No Revit models found in given paths")
+
+    if cfg.journal_file:
+        # parse a previously recorded session
+        with open(cfg.journal_file, "r", errors="ignore") as jf:
+            journal_text = jf.read()
+    else:
+        session_dir = op.join(cache_dir, DEFAULT_MULTI_DIR)
+        if op.isdir(session_dir):
+            shutil.rmtree(session_dir)
+        os.makedirs(session_dir)
+        add_addons(cfg.revit_year, session_dir, add_rps=False)
+        journal_file = create_rir_multi_journal(
+            session_dir, model_paths, ghdoc_path=op.abspath(cfg.ghdoc_path)
+        )
+        if not cfg.start_revit:
+            print("journal: {}".format(journal_file))
+            return
+        session = launch_revit(
+            cfg.revit_year,
+            journal_file,
+            lang_code=cfg.lang_code,
+            timeout=cfg.timeout * len(model_paths),
+        )
+        journal_text = read_session_journal(
+            cfg.revit_year, session_dir, session.start
+        )
+
+    results = parse_multi_model_journal(journal_text, model_paths)
+    with open(cfg.results_file or DEFAULT_MULTI_RESULTS, "w") as rf:
+        json.dump(results, rf, indent=2)
+
+    # report
+    print("model | " + " | ".join(MULTI_PHASES) + " | result")
+    for result in results:
+        print(
+            "{} | {} | {}".format(
+                op.basename(result["model"]),
+                " | ".join(
+                    "{:.2f}".format(result[x]) if x in result else "-"
+                    for x in MULTI_PHASES
+                ),
+                result["reason"] or "ok",
+            )
+        )
 
 
 def run_command(cfg: CLIArgs):
     """Orchestrate execution using command line options"""
+    if not cfg.profile_dir:
+        dispatch_command(cfg)
+        return
+
+    # profile stages of this run
+    PROFILER.enable(
+        cprofile_dir=op.join(cfg.profile_dir, "cprofile") if cfg.cprofile else None
+    )
+    try:
+        dispatch_command(cfg)
+    finally:
+        PROFILER.write(cfg.profile_dir)
+        print(PROFILER.format_summary())
+
+
+def dispatch_command(cfg: CLIArgs):
+    """Run the command selected by command line options"""
+    if cfg.bisect:
+        run_bisect(cfg)
+        return
+    if cfg.bench:
+        run_bench(cfg)
+        return
+    if cfg.multi:
+        run_multi(cfg)
+        return
+    if cfg.probe:
+        check_process_probe(cfg.sample_interval or 0.2)
+        return
+
     # prepare cache -------------------
-    cache_dir = prepare_cache()
+    with PROFILER.stage("prepare"):
+        cache_dir = prepare_cache()
 
     # prepare env ---------------------
     # make journal
-    journal_file = create_rir_journal(
-        cache_dir, model_path=cfg.model_path, ghdoc_path=cfg.ghdoc_path
-    )
+    with PROFILER.stage("journal"):
+        journal_file = create_rir_journal(
+            cache_dir, model_path=cfg.model_path, ghdoc_path=cfg.ghdoc_path
+        )
     # create addon manifests
-    add_addons(cfg.revit_year, cache_dir, add_rps=cfg.add_rps)
+    with PROFILER.stage("manifest"):
+        add_addons(cfg.revit_year, cache_dir, add_rps=cfg.add_rps)
 
     # run revit -----------------------
     if cfg.start_revit:
-        run_revit(cfg, journal_file)
+        with PROFILER.stage("launch"):
+            run_revit(cfg, journal_file)
 
 
 if __name__ == "__main__":
@@ -250,7 +1401,7 @@ if __name__ == "__main__":
             cfg=CLIArgs(
                 # process args
                 docopt(
-                    __doc__.format(__binname__),
+                    __doc__.format(cliname=__binname__),
                     version="{} {}".format(__binname__, __version__),
                 )
             )
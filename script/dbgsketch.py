@@ -0,0 +1,210 @@
+"""Fixed-memory mergeable sketches for approximate counts across packages
+
+`FrequencySketch` combines a HyperLogLog for distinct values, a count-min
+sketch for per-value counts and a short list of heavy hitters. Memory does
+not grow with the number of distinct values, and sketches built by separate
+workers or runs over different packages merge into the sketch of all of them.
+
+Values are hashed with blake2b so sketches built in other processes (or
+saved by earlier runs) hash values the same way.
+"""
+import math
+import hashlib
+import pickle
+from array import array
+
+
+# cli configs =================================================================
+HLL_PRECISION = 14
+CMS_WIDTH = 1 << 14
+CMS_DEPTH = 4
+HEAVY_HITTERS = 100
+# =============================================================================
+
+
+def hash64(value):
+    """Stable 64-bit hash of given value"""
+    return int.from_bytes(
+        hashlib.blake2b(str(value).encode("utf-8"), digest_size=8).digest(),
+        "little",
+    )
+
+
+class HyperLogLog:
+    """Distinct value estimator with 2**precision byte registers"""
+
+    def __init__(self, precision=HLL_PRECISION):
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, value):
+        """Add value"""
+        hashed = hash64(value)
+        index = hashed >> (64 - self.precision)
+        rest = hashed & ((1 << (64 - self.precision)) - 1)
+        # position of the leftmost 1 bit in the rest of the hash
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        """Merge sketch of other values into this one"""
+        if other.precision != self.precision:
+            raise ValueError("Can not merge sketches of different precision")
+        self.registers = bytearray(
+            max(x, y) for x, y in zip(self.registers, other.registers)
+        )
+
+    def count(self):
+        """Estimated number of distinct values"""
+        size = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / size)
+        estimate = alpha * size * size / sum(2.0**-x for x in self.registers)
+        zeros = self.registers.count(0)
+        # small cardinalities are estimated better by linear counting
+        if estimate <= 2.5 * size and zeros:
+            estimate = size * math.log(size / float(zeros))
+        return int(round(estimate))
+
+
+class CountMinSketch:
+    """Per-value count estimator, never undercounting"""
+
+    def __init__(self, width=CMS_WIDTH, depth=CMS_DEPTH):
+        self.width = width
+        self.depth = depth
+        self.table = array("Q", bytes(8 * width * depth))
+        self.total = 0
+
+    def _cells(self, value):
+        hashed = hash64(value)
+        low, high = hashed & 0xFFFFFFFF, hashed >> 32
+        for row in range(self.depth):
+            yield row * self.width + (low + row * high) % self.width
+
+    def add(self, value, count=1):
+        """Add count of value, returns its new estimated count"""
+        self.total += count
+        estimate = None
+        for cell in self._cells(value):
+            self.table[cell] += count
+            estimate = self.table[cell] if estimate is None \
+                else min(estimate, self.table[cell])
+        return estimate
+
+    def estimate(self, value):
+        """Estimated count of value"""
+        return min(self.table[x] for x in self._cells(value))
+
+    def merge(self, other):
+        """Merge sketch of other values into this one"""
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError("Can not merge sketches of different sizes")
+        for cell, count in enumerate(other.table):
+            if count:
+                self.table[cell] += count
+        self.total += other.total
+
+
+class FrequencySketch:
+    """Distinct values, per-value counts and most frequent values"""
+
+    def __init__(self, heavy_hitters=HEAVY_HITTERS):
+        self.distinct = HyperLogLog()
+        self.counts = CountMinSketch()
+        self.heavy_hitters = heavy_hitters
+        # value -> estimated count, for the most frequent values only
+        self.top = {}
+
+    def add(self, value, count=1):
+        """Add count of value"""
+        self.distinct.add(value)
+        estimate = self.counts.add(value, count)
+        self._offer(value, estimate)
+
+    def _offer(self, value, estimate):
+        if value in self.top or len(self.top) < self.heavy_hitters:
+            self.top[value] = estimate
+            return
+        smallest = min(self.top, key=self.top.get)
+        if estimate > self.top[smallest]:
+            del self.top[smallest]
+            self.top[value] = estimate
+
+    def merge(self, other):
+        """Merge sketch of other values into this one"""
+        self.distinct.merge(other.distinct)
+        self.counts.merge(other.counts)
+        # candidates of both are re-ranked by their merged counts
+        candidates = set(self.top).union(other.top)
+        self.top = {}
+        for value in candidates:
+            self._offer(value, self.counts.estimate(value))
+
+    def most_common(self, count=None):
+        """Most frequent values with their estimated counts"""
+        return sorted(self.top.items(), key=lambda x: x[1], reverse=True)[
+            :count
+        ]
+
+
+class SketchLog(list):
+    """Values added for named sketches, to be added to a sketch set later
+
+    Values of a unit of work (e.g. a package) are collected first, so they
+    can be dropped if it fails part way. Merging a fresh SketchSet instead
+    would scan whole sketch tables for a handful of values.
+    """
+
+    def add(self, name, value, count=1):
+        """Add count of value to named sketch"""
+        self.append((name, value, count))
+
+
+class SketchSet(dict):
+    """Named frequency sketches, and ids of the packages counted into them
+
+    Sketches can not tell values counted before, so callers skip packages
+    already in `packages` to keep re-runs from counting them twice. The
+    sketches take fixed memory, `packages` grows by one id per package.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.packages = set()
+
+    def add(self, name, value, count=1):
+        """Add count of value to named sketch"""
+        if name not in self:
+            self[name] = FrequencySketch()
+        self[name].add(value, count)
+
+    def update_from(self, log):
+        """Add values collected in given sketch log"""
+        for name, value, count in log:
+            self.add(name, value, count)
+        return self
+
+    def merge(self, other):
+        """Merge named sketches of other set into this one"""
+        for name, sketch in other.items():
+            if name in self:
+                self[name].merge(sketch)
+            else:
+                self[name] = sketch
+        self.packages.update(other.packages)
+        return self
+
+    def save(self, sketch_file):
+        """Write sketches to file"""
+        with open(sketch_file, "wb") as sf:
+            pickle.dump({"sketches": dict(self), "packages": self.packages}, sf)
+
+    @staticmethod
+    def load(sketch_file):
+        """Read sketches from file"""
+        with open(sketch_file, "rb") as sf:
+            data = pickle.load(sf)
+        sketches = SketchSet(data["sketches"])
+        sketches.packages = set(data["packages"])
+        return sketches
@@ -2,8 +2,22 @@
 """Analyzes the debug ZIP packages submitteed by customers
 
 Usage:
-    {cliname} <sb_ticket> [--token=<api_token>]
-    {cliname} <zip_file> [--ticket=<ticket_url>]
+    {cliname} startup <package>... [--json] [--approx] [--workers=<n>] [--sketch=<sketch_file>] [--profile=<profile_dir>] [--cprofile]
+    {cliname} addins <package>... [--json] [--approx] [--workers=<n>] [--sketch=<sketch_file>] [--profile=<profile_dir>] [--cprofile]
+    {cliname} paths <package>... [--json] [--approx] [--workers=<n>] [--sketch=<sketch_file>] [--profile=<profile_dir>] [--cprofile]
+    {cliname} ingest <package>...
+    {cliname} index <package>...
+    {cliname} search <query> [--regex] [--ignore-case]
+    {cliname} health [<package>...] [--bucket=<hours>] [--json] [--profile=<profile_dir>] [--cprofile]
+    {cliname} journal <package>... [--command=<text>] [--context=<lines>] [--profile=<profile_dir>] [--cprofile]
+    {cliname} timeline <package>... [--minutes=<mins>] [--utc-offset=<hours>] [--profile=<profile_dir>] [--cprofile]
+    {cliname} tickets <ticket_url>... [--token=<api_token>] [--output=<output_dir>] [--limits=<limits>] [--profile=<profile_dir>] [--cprofile]
+    {cliname} watch <inbox_dir> [--output=<output_dir>] [--interval=<secs>] [--settle=<secs>] [--once] [--profile=<profile_dir>] [--cprofile]
+    {cliname} rebuild <package_name>... [--output=<output_dir>]
+    {cliname} serve [--socket=<socket_path>] [--port=<port>]
+    {cliname} sync <sb_url> [--token=<api_token>] [--output=<output_dir>] [--since=<timestamp>]
+    {cliname} <sb_ticket> [--token=<api_token>] [--profile=<profile_dir>] [--cprofile]
+    {cliname} <zip_file> [--ticket=<ticket_url>] [--follow] [--profile=<profile_dir>] [--cprofile]
 
 Options:
     -h, --help                          Show this help
@@ -11,6 +25,34 @@ Options:
     --token=<api_token>                 API token to access SupportBee
     <zip_file>                          Debug package zip file path
     --ticket=<ticket_url>               SupportBee ticket url for reporting
+    --follow                            Process package while it is still being written
+    <package>                           Debug package zip file or directory of packages
+    --json                              Print structured records as json
+    --approx                            Fixed-memory approximate counts for large backlogs
+    --workers=<n>                       Worker processes building approximate counts [default: 4]
+    --sketch=<sketch_file>              Merge approximate counts into this file across runs
+    <package_name>                      Debug package file name in blob store
+    --output=<output_dir>               Directory to write packages or reports into [default: .]
+    <query>                             Text (or regular expression) to search for
+    --regex                             Query is a regular expression
+    --ignore-case                       Case insensitive search
+    --command=<text>                    Only show journal commands containing text
+    --context=<lines>                   Journal lines to show after each command [default: 0]
+    --bucket=<hours>                    Hours per release health period [default: 6]
+    --minutes=<mins>                    Only show events this many minutes before the crash
+    --utc-offset=<hours>                Local time of the package in hours from UTC, applied to crash dump times [default: 0]
+    <ticket_url>                        SupportBee ticket urls to process
+    <sb_url>                            SupportBee company url e.g. https://mcneel.supportbee.com
+    --since=<timestamp>                 Sync tickets active since this time on first sync (ISO 8601)
+    --limits=<limits>                   Workers per stage: fetch,download,parse,render,write [default: 4,4,2,1,1]
+    <inbox_dir>                         Directory receiving new debug packages
+    --interval=<secs>                   Inbox polling interval [default: 5]
+    --settle=<secs>                     Time a new file must stay unchanged [default: 10]
+    --once                              Process ready packages and exit
+    --socket=<socket_path>              Unix socket to serve on [default: .packages/dbgzip.sock]
+    --port=<port>                       Serve over HTTP on this localhost port instead
+    --profile=<profile_dir>             Write per-stage timings and trace into directory
+    --cprofile                          Also dump cProfile stats per stage
 
 SupportBee API token can also be set in SB_TOKEN environment variable.
 """
@@ -18,17 +60,45 @@ import io
 import sys
 import os
 import os.path as op
+import ntpath
 import shutil
+import hashlib
+import hmac
+import secrets
+import tempfile
+import zlib
+import mmap
+import heapq
+import asyncio
+import time
+import select
+import struct
+import ctypes
+import ctypes.util
+import threading
+import socketserver
+import http.server
+from contextlib import redirect_stdout, redirect_stderr, nullcontext
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from array import array
 import zipfile
 import csv
 import json
 import re
-from collections import namedtuple
+import statistics
+from datetime import datetime, timedelta, timezone
+import operator
+import xml.etree.ElementTree as ET
+from collections import namedtuple, defaultdict, OrderedDict, deque
 
 # pipenv dependencies
 from docopt import docopt
 import requests
 
+# local modules
+from dbgprofile import PROFILER
+from dbgsketch import SketchSet, SketchLog
+
 
 # cli info
 __binname__ = op.splitext(op.basename(__file__))[0] # grab script name
@@ -37,32 +107,292 @@ __version__ = '1.0'
 
 # cli configs =================================================================
 DEFAULT_CACHE_DIR = '.packages'
+DEFAULT_STORE_DIR = 'store'
+BLOB_CHUNK_SIZE = 1024 * 1024
+DEFAULT_INDEX_DIR = 'search'
+MAX_INDEX_SEGMENTS = 8
+SEARCH_INDEX_FORMAT = 2
+MAX_CACHED_POSTINGS = 4096
+SEARCH_TEXT_CACHE_SIZE = 64 * 1024 * 1024
+MAX_SEARCH_RESULTS = 200
+DEFAULT_WATCH_STATE = 'watch.json'
+PIPELINE_STAGES = ['fetch', 'download', 'parse', 'render', 'write']
+PIPELINE_QUEUE_SIZE = 8
+DEFAULT_WATCH_METRICS = 'watch-metrics.json'
+DEFAULT_SYNC_STATE = 'sync.json'
+MAX_CACHED_REPORTS = 64
+DEFAULT_SYNC_LEDGER = 'sync-ledger.jsonl'
+SB_PAGE_SIZE = 100
+DEFAULT_HEALTH_STATE = 'health.json'
+DEFAULT_JOURNALS_DIR = 'journals'
+JOURNAL_CHECKPOINT_LINES = 1024
+MAX_JOURNALS_CACHE_SIZE = 2 * 1024 * 1024 * 1024
+HEALTH_SPIKE_FACTOR = 2.0
+HEALTH_SPIKE_MIN = 3
 MAX_JRN_LINES = 100
+MAX_TIMELINE_TEXT = 200
+MAX_STARTUP_ENTRIES = 20
+MAX_PATH_ENTRIES = 50
+CONSOLE_REPEAT_GAP = 8
+CONSOLE_REPEAT_WINDOW = 256
+XML_CHUNK_SIZE = 16384
+DEFAULT_CONFLICTS_FILE = 'conflicts.json'
+STREAM_CHUNK_SIZE = 65536
+STREAM_POLL_INTERVAL = 0.5
+STREAM_IDLE_TIMEOUT = 30
+PREFETCH_MAX_BYTES = 256 * 1024 * 1024
+PREFETCH_WORKERS = 4
+DEFAULT_SERVER_TOKEN = 'dbgzip-{port}.token'
+SERVER_TOKEN_HEADER = 'X-Dbgzip-Token'
+SERVER_HOSTS = ['127.0.0.1', 'localhost']
 # =============================================================================
 
+# variable parts of console log lines, masked in order to find repeats
+CONSOLE_TOKEN_MASKS = [
+    # e.g. 2022-5-3 10:15:02.123 or 10:15:02
+    (r'\d{4}-\d{1,2}-\d{1,2}(?:[ T]\d{1,2}:\d{2}(?::\d{2}(?:\.\d+)?)?)?'
+     r'|\b\d{1,2}:\d{2}:\d{2}(?:\.\d+)?', '<time>'),
+    (r'\{?\b[0-9a-fA-F]{8}-(?:[0-9a-fA-F]{4}-){3}[0-9a-fA-F]{12}\b\}?',
+     '<guid>'),
+    # e.g. C:\Program Files\Rhino 7\Plug-ins\Foo.rhp or \\server\share
+    (r'(?:\b[A-Za-z]:|\\\\)\\[^\s"\'<>|*?]*', '<path>'),
+    (r'\b0x[0-9a-fA-F]+\b', '<hex>'),
+    (r'\b\d+(?:[.,]\d+)*\b', '<num>'),
+]
+
+# timestamps of the timeline sources
+# e.g. 'C 03-May-2022 10:00:00.000;   0:< idle
+JOURNAL_TIMESTAMP = \
+    r"^'\w (\d{1,2}-\w{3}-\d{4} \d{1,2}:\d{2}:\d{2}(?:\.\d+)?);\s*(?:\d+:<\s*)?(.*)"
+JOURNAL_IDLE_TEXT = ['', 'idle']
+# e.g. 2022-05-03 10:00:01, 2022-5-3 or 10:00:01.123
+LOG_DATE = r'\b(\d{4})-(\d{1,2})-(\d{1,2})\b'
+LOG_TIME = r'\b(\d{1,2}):(\d{2}):(\d{2})(?:\.(\d{1,6}))?\b'
+MINIDUMP_SIGNATURE = b'MDMP'
+
 # replacement strings
 WIN_EOL = b'\r\n'
 EOL = b'\n'
 
 ADSK_ADDON = "Autodesk"
 MCNEEL_ADDON = "Robert McNeel"
+ADDIN_APPLICATION_TYPES = ['Application', 'DBApplication']
+ADDIN_ISSUES_TABLE_HEADER = """
+Issue | AddInId | Name | Manifest | Assembly
+--- | --- | --- | --- | ---
+"""
+ADDIN_STATS_TABLE_HEADER = """
+AddInId | Name | Packages | Not Loaded | Shadowed | Duplicated
+--- | --- | --- | --- | --- | ---
+"""
+PATH_FINDINGS_TABLE_HEADER = """
+Position | Directory | Vendor | Reason
+--- | --- | --- | ---
+"""
+PATH_STATS_TABLE_HEADER = """
+Directory | Vendor | Packages
+--- | --- | ---
+"""
 ADDONS_TABLE_HEADER = """
 Company Name | Product Name | Product Version | Type Name | Assembly Name | Assembly Location
 --- | --- | --- | --- | --- | ---
 """
+STARTUP_TABLE_HEADER = """
+Kind | Name | Seconds
+--- | --- | ---
+"""
+APPROX_TABLE_HEADER = """
+Value | Count (at most)
+--- | ---
+"""
+APPROX_SKETCH_LABELS = {
+    'machines': 'Machines',
+    'plugins': 'Loaded Rhino plug-ins',
+    'failures': 'Rhino plug-in load failures',
+    'addins': 'Add-ins',
+    'issues': 'Add-in issues',
+    'path_entries': 'PATH entries',
+    'directories': 'PATH directories shadowing Rhino',
+}
+HEALTH_TABLE_HEADER = """
+Period | Rhino.Inside | Rhino | Revit | Load Errors | Runtime Errors | Runtime % | Share %
+--- | --- | --- | --- | --- | --- | --- | ---
+"""
+STARTUP_STATS_TABLE_HEADER = """
+Plug-in | Loads | Failures | Min | Median | P90 | Max
+--- | --- | --- | --- | --- | --- | ---
+"""
 
 
 ReportInfo = namedtuple('ReportInfo', ['host_info', 'journal_file'])
 
-ConflictedAddon = namedtuple('ConflictedAddon', ['name', 'version'])
+HostInfo = namedtuple(
+    'HostInfo', ['rir', 'rhino', 'revit', 'revit_build', 'language']
+    )
+
+ConflictRule = namedtuple(
+    'ConflictRule',
+    ['company', 'product', 'version', 'revit', 'rir', 'severity', 'note']
+    )
+
+# logged is the original time of events moved to keep their source sorted
+TimelineEvent = namedtuple(
+    'TimelineEvent', ['time', 'source', 'text', 'logged'], defaults=[None]
+    )
+
+StartupRecord = \
+    namedtuple('StartupRecord', ['kind', 'name', 'duration', 'message'])
+
+LogPattern = namedtuple('LogPattern', ['kind', 'pattern'])
+
+PathSignature = namedtuple('PathSignature', ['vendor', 'pattern', 'dlls'])
+
+PathFinding = namedtuple(
+    'PathFinding', ['package', 'position', 'directory', 'vendor', 'reason']
+    )
+
+AddinManifestEntry = namedtuple(
+    'AddinManifestEntry',
+    ['package', 'source', 'manifest', 'addin_type', 'addin_id', 'name',
+     'assembly', 'full_class_name']
+    )
 
 
 # known third-party conflicts =================================================
-KNOWN_CONFLICTS = [
-    ConflictedAddon(name="pyRevit", version="*"),
-    ConflictedAddon(name="AVAIL", version="*"),
-    ConflictedAddon(name="Conveyor", version="*"),
-    ConflictedAddon(name="Speckle", version="*"),
+# rules are read from DEFAULT_CONFLICTS_FILE next to this script
+CONFLICT_SEVERITIES = {
+    'info': 'ℹ️',
+    'warning': '⚠️',
+    'error': '⛔',
+}
+VERSION_OPERATORS = {
+    '>=': operator.ge,
+    '<=': operator.le,
+    '>': operator.gt,
+    '<': operator.lt,
+    '!=': operator.ne,
+    '==': operator.eq,
+    '=': operator.eq,
+}
+REVIT_ADDON = ("Autodesk", "Revit")
+RIR_ADDON = (MCNEEL_ADDON, "Rhino.Inside")
+# =============================================================================
+
+
+# PATH directories known to ship their own Rhino dependencies ================
+# Rhino System directory of the loaded Rhino version is where its dlls live.
+# entries of known vendors listed before it can shadow Rhino's own copy
+RHINO_PATH_VENDOR = "Rhino"
+KNOWN_SHADOWING_DLLS = [
+    "openNURBS.dll",
+    "opennurbs_public.dll",
+    "RhinoCommon.dll",
+    "rhcommon_c.dll",
+    "Eto.dll",
+    "Eto.Wpf.dll",
+    "Grasshopper.dll",
+]
+PATH_SIGNATURES = [
+    PathSignature(
+        vendor=RHINO_PATH_VENDOR,
+        pattern=r".*\\Rhino \d+\\System\\?$",
+        dlls=KNOWN_SHADOWING_DLLS,
+        ),
+    PathSignature(
+        vendor="Rhino (legacy)",
+        pattern=r".*\\(?:Rhinoceros \d|Rhino \d+ WIP|Rhino \d+)\\"
+                r"(?:System|Plug-ins)\\?.*",
+        dlls=KNOWN_SHADOWING_DLLS,
+        ),
+    PathSignature(
+        vendor="Grasshopper",
+        pattern=r".*\\Grasshopper(?:\\Libraries)?\\?$",
+        dlls=["Grasshopper.dll", "RhinoCommon.dll"],
+        ),
+    PathSignature(
+        vendor="Vectorworks",
+        pattern=r".*\\Vectorworks.*",
+        dlls=["openNURBS.dll"],
+        ),
+    PathSignature(
+        vendor="KeyShot",
+        pattern=r".*\\KeyShot.*\\bin\\?$",
+        dlls=["openNURBS.dll"],
+        ),
+    PathSignature(
+        vendor="Alias",
+        pattern=r".*\\Autodesk\\Alias.*",
+        dlls=["openNURBS.dll"],
+        ),
+    PathSignature(
+        vendor="SketchUp",
+        pattern=r".*\\SketchUp.*",
+        dlls=["openNURBS.dll"],
+        ),
+    PathSignature(
+        vendor="SpaceClaim",
+        pattern=r".*\\SpaceClaim.*",
+        dlls=["openNURBS.dll", "Eto.dll"],
+        ),
+    PathSignature(
+        vendor="Solidworks",
+        pattern=r".*\\SOLIDWORKS.*",
+        dlls=["openNURBS.dll"],
+        ),
+    PathSignature(
+        vendor="Eto",
+        pattern=r".*\\Eto(?:\.Forms)?\\?.*",
+        dlls=["Eto.dll", "Eto.Wpf.dll"],
+        ),
+]
+# =============================================================================
+
+
+# rhino startup log (Console/Startup.txt) line patterns =======================
+# the log is the rhino command window history captured while rhino loads
+# (RhinoApp.CapturedCommandWindowStrings in Rhinoceros.cs), so it also holds
+# any text plug-ins print. only plug-in loader messages are read as failures
+# first matching pattern wins. named groups:
+#   name: plug-in or phase name
+#   duration, unit: time taken
+#   message: failure details
+DURATION_UNITS = {
+    'ms': 0.001,
+    'msec': 0.001,
+    'milliseconds': 0.001,
+    's': 1.0,
+    'sec': 1.0,
+    'secs': 1.0,
+    'seconds': 1.0,
+}
+_DURATION = r'(?P<duration>\d+(?:\.\d+)?)\s*(?P<unit>{})\b'.format(
+    '|'.join(sorted(DURATION_UNITS, key=len, reverse=True))
+    )
+STARTUP_LOG_PATTERNS = [
+    # e.g. Unable to load C:\...\Foo.rhp plug-in: initialization failed.
+    #      Failed to load plug-in "Foo"
+    LogPattern(
+        kind='failure',
+        pattern=r'^(?:unable|failed) to load (?:plug-?in )?"?(?P<name>.+?)"?'
+                r'(?: plug-?in)?(?:[:.]\s+(?P<message>.*)|\.?$)'
+        ),
+    # e.g. Plug-in "Grasshopper" loaded in 0.25 seconds
+    LogPattern(
+        kind='plugin',
+        pattern=r'(?:plug-?in\s+)?"?(?P<name>[^"]+?)"?\s+(?:plug-?in\s+)?'
+                r'loaded in ' + _DURATION
+        ),
+    # e.g. Loading Grasshopper... 1.2 sec / Initializing Eto took 20 ms
+    LogPattern(
+        kind='phase',
+        pattern=r'(?P<name>(?:loading|initializing|starting|reading|'
+                r'creating)\b.*?)[\s.:]*(?:took|in|-)?\s*' + _DURATION + '.*$'
+        ),
+    # e.g. Loading plug-ins...
+    LogPattern(
+        kind='phase',
+        pattern=r'(?P<name>(?:loading|initializing|starting)\b.*?)\.{3}\s*$'
+        ),
 ]
 # =============================================================================
 
@@ -73,6 +403,48 @@ class CLIArgs:
         self.sb_ticket = args['<sb_ticket>'] or args['--ticket']
         self.sb_token = args['--token']
         self.zip_file = args['<zip_file>']
+        self.follow = args['--follow']
+        self.packages = args['<package>']
+        self.startup = args['startup']
+        self.addins = args['addins']
+        self.paths = args['paths']
+        self.ingest = args['ingest']
+        self.rebuild = args['rebuild']
+        self.package_names = args['<package_name>']
+        self.output_dir = args['--output']
+        self.index = args['index']
+        self.search = args['search']
+        self.query = args['<query>']
+        self.regex = args['--regex']
+        self.ignore_case = args['--ignore-case']
+        self.health = args['health']
+        self.bucket = int(args['--bucket'])
+        self.journal = args['journal']
+        self.command = args['--command']
+        self.context = int(args['--context'])
+        self.timeline = args['timeline']
+        self.minutes = float(args['--minutes']) if args['--minutes'] else None
+        self.utc_offset = float(args['--utc-offset'])
+        self.tickets = args['tickets']
+        self.sync = args['sync']
+        self.serve = args['serve']
+        self.socket_path = args['--socket']
+        self.port = int(args['--port']) if args['--port'] else None
+        self.sb_url = args['<sb_url>']
+        self.since = args['--since']
+        self.ticket_urls = args['<ticket_url>']
+        self.limits = [int(x) for x in args['--limits'].split(',')]
+        self.watch = args['watch']
+        self.inbox_dir = args['<inbox_dir>']
+        self.interval = float(args['--interval'])
+        self.settle = float(args['--settle'])
+        self.once = args['--once']
+        self.json = args['--json']
+        self.approx = args['--approx']
+        self.workers = int(args['--workers'])
+        self.sketch_file = args['--sketch']
+        self.profile_dir = args['--profile']
+        self.cprofile = args['--cprofile']
 
 
 class DebugFileParts:
@@ -83,23 +455,32 @@ class DebugFileParts:
     ReportAddinSection = "## Addins"
     ReportConsoleSection = "## Console"
     ReportAttachmentSection = "## Attachments"
+    ReportLogSection = "## Log"
+    ReportEnvironmentSection = "### Environment Variables"
     RIRJournalRibbonEvent = "Jrn.RibbonEvent \"Execute external command:CustomCtrl_%CustomCtrl_%Add-Ins%Rhinoceros%CommandRhinoInside:RhinoInside.Revit.UI.CommandRhinoInside\"" #pylint: disable=line-too-long
     ConsoleLog = "Console/Startup.txt"
     AppsCSV = "Addins/{name}.csv"
+    SystemAddinsDir = "Addins/System"
+    InstalledAddinsDir = "Addins/Installed"
     AttachmentsDir = "Attachments"
 
 
 class DebugFile:
     """Wrap debug file to access properties and contents"""
-    def __init__(self, file_path):
+    def __init__(self, file_path, opener=zipfile.ZipFile):
         self.path = file_path
+        self._opener = opener
         self._dfile = None
+        self._prefetcher = None
 
     def __enter__(self):
-        self._dfile = zipfile.ZipFile(self.path, 'r')
+        with PROFILER.stage('open_zip'):
+            self._dfile = self._opener(self.path, 'r')
         return self
 
     def __exit__(self, exception, exception_value, traceback):
+        if self._prefetcher:
+            self._prefetcher.close()
         self._dfile.close()
 
     @staticmethod
@@ -112,25 +493,52 @@ class DebugFile:
         """Debug file creation timestamp"""
         return DebugFile.extract_timestamp(self.path)
 
+    def _iter_names(self):
+        """Member names, streamed if the archive supports it"""
+        if hasattr(self._dfile, 'iter_names'):
+            return self._dfile.iter_names()
+        return iter(self._dfile.namelist())
+
     @property
     def root(self):
         """Debug file root folder"""
-        first_file = self._dfile.namelist()[0]
+        first_file = next(self._iter_names())
         return op.dirname(first_file)
 
     @property
     def has_dump(self):
         """Check if package contains a crash dump attachment"""
-        for entry in self._dfile.namelist():
+        for entry in self._iter_names():
             if entry.endswith('.dmp'):
                 return True
 
+    def prefetch(self, filenames, max_bytes=PREFETCH_MAX_BYTES,
+                 workers=PREFETCH_WORKERS):
+        """Inflate given files concurrently ahead of reading them"""
+        if self._dfile:
+            if self._prefetcher:
+                self._prefetcher.close()
+            self._prefetcher = MemberPrefetcher(
+                self._dfile,
+                [op.join(self.root, x) for x in filenames],
+                max_bytes=max_bytes,
+                workers=workers
+                )
+
+    def _open_member(self, member):
+        """Open archive member, using its prefetched contents if any"""
+        if self._prefetcher:
+            contents = self._prefetcher.take(member)
+            if contents is not None:
+                return io.BytesIO(contents)
+        return self._dfile.open(member, 'r')
+
     def read_txt(self, filename, encoding='utf-8'):
         """Read contents of given file"""
         if self._dfile:
             try:
                 # read, cleanup EOL and correct encoding
-                with self._dfile.open(op.join(self.root, filename), 'r') as tf:
+                with self._open_member(op.join(self.root, filename)) as tf:
                     contents = \
                         tf.read()\
                             .replace(WIN_EOL, EOL)\
@@ -140,12 +548,34 @@ class DebugFile:
                 sys.stderr.write("[WARN] %s\n" % str(rtxt_ex))
         return ""
 
+    def list_files(self, dirname):
+        """List files under given directory, relative to package root"""
+        files = []
+        if self._dfile:
+            prefix = op.join(self.root, dirname).rstrip('/') + '/'
+            for entry in self._dfile.namelist():
+                if entry.startswith(prefix) and not entry.endswith('/'):
+                    files.append(entry[len(self.root) + 1:])
+        return files
+
+    def open(self, filename):
+        """Open given file for streaming binary reads"""
+        if self._dfile:
+            return self._open_member(op.join(self.root, filename))
+        raise Exception("ZIP file is not open")
+
+    def getinfo(self, filename):
+        """Info of given file"""
+        if self._dfile:
+            return self._dfile.getinfo(op.join(self.root, filename))
+        raise Exception("ZIP file is not open")
+
     def read_csv(self, filename, headers=True):
         """Read contents of given csv file"""
         if self._dfile:
             try:
                 # read, remove header if expected
-                with self._dfile.open(op.join(self.root, filename), 'r') as tf:
+                with self._open_member(op.join(self.root, filename)) as tf:
                     csv_reader = csv.reader(io.TextIOWrapper(tf))
                     if headers:
                         return list(csv_reader)[1:]
@@ -158,7 +588,7 @@ class DebugFile:
         """Extract given file to given destination"""
         if self._dfile:
             # copy file (taken from zipfile's extract)
-            source = self._dfile.open(op.join(self.root, filename))
+            source = self._open_member(op.join(self.root, filename))
             target = open(to_file, "wb")
             with source, target:
                 shutil.copyfileobj(source, target)
@@ -166,6 +596,1286 @@ class DebugFile:
             raise Exception("ZIP file is not open")
 
 
+class BlobStore:
+    """Content-addressed store of debug package members
+
+    Each unique member is stored once, compressed, under its sha256. Each
+    package keeps a manifest of its members so it can be rebuilt or read
+    without the original zip file.
+    """
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        self.blobs_dir = op.join(store_dir, 'blobs')
+        self.packages_dir = op.join(store_dir, 'packages')
+        for sdir in [self.blobs_dir, self.packages_dir]:
+            if not op.isdir(sdir):
+                os.makedirs(sdir)
+
+    def blob_path(self, digest):
+        """Path of blob with given digest"""
+        return op.join(self.blobs_dir, digest[:2], digest)
+
+    def manifest_path(self, package_name):
+        """Path of stored package manifest"""
+        return op.join(self.packages_dir, op.basename(package_name) + '.json')
+
+    def has_package(self, package_name):
+        """Check if package is stored"""
+        return op.isfile(self.manifest_path(package_name))
+
+    def put_blob(self, stream):
+        """Store contents of given stream, returns (digest, size, is_new)"""
+        digest = hashlib.sha256()
+        compressor = zlib.compressobj()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=self.blobs_dir)
+        try:
+            with os.fdopen(fd, 'wb') as tf:
+                for chunk in iter(lambda: stream.read(BLOB_CHUNK_SIZE), b''):
+                    digest.update(chunk)
+                    size += len(chunk)
+                    tf.write(compressor.compress(chunk))
+                tf.write(compressor.flush())
+            blob_path = self.blob_path(digest.hexdigest())
+            if op.isfile(blob_path):
+                os.remove(temp_path)
+                return digest.hexdigest(), size, False
+            if not op.isdir(op.dirname(blob_path)):
+                os.makedirs(op.dirname(blob_path), exist_ok=True)
+            os.replace(temp_path, blob_path)
+            return digest.hexdigest(), size, True
+        except Exception:
+            if op.isfile(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def read_blob(self, digest):
+        """Read contents of blob with given digest"""
+        with open(self.blob_path(digest), 'rb') as bf:
+            return zlib.decompress(bf.read())
+
+    def ingest(self, zip_file):
+        """Split given package into blobs and store its manifest
+
+        Returns (member count, new blob count, new blob bytes)
+        """
+        members = []
+        new_blobs = new_bytes = 0
+        with zipfile.ZipFile(zip_file, 'r') as zf:
+            for info in zf.infolist():
+                if info.is_dir():
+                    continue
+                with zf.open(info, 'r') as mstream:
+                    digest, size, is_new = self.put_blob(mstream)
+                if is_new:
+                    new_blobs += 1
+                    new_bytes += size
+                members.append({
+                    'name': info.filename,
+                    'sha256': digest,
+                    'size': size,
+                    'date_time': list(info.date_time),
+                    'compress_type': info.compress_type,
+                    })
+        with open(self.manifest_path(zip_file), 'w') as mf:
+            json.dump({'members': members}, mf, indent=1)
+        return len(members), new_blobs, new_bytes
+
+    def read_manifest(self, package_name):
+        """Read stored package manifest"""
+        if not self.has_package(package_name):
+            raise Exception("Package is not stored: %s" % package_name)
+        with open(self.manifest_path(package_name), 'r') as mf:
+            return json.load(mf)
+
+    def rebuild(self, package_name, output_dir):
+        """Rebuild original package zip file from stored blobs"""
+        manifest = self.read_manifest(package_name)
+        zip_file = op.join(output_dir, op.basename(package_name))
+        with zipfile.ZipFile(zip_file, 'w') as zf:
+            for member in manifest['members']:
+                info = zipfile.ZipInfo(
+                    member['name'], date_time=tuple(member['date_time'])
+                    )
+                info.compress_type = member['compress_type']
+                zf.writestr(info, self.read_blob(member['sha256']))
+        return zip_file
+
+    def open_archive(self, package_name, mode='r'):
+        """Open stored package with a zipfile.ZipFile compatible reader"""
+        if mode != 'r':
+            raise Exception("Stored packages are read-only")
+        return StoredArchive(self, self.read_manifest(package_name))
+
+
+class MemberPrefetcher:
+    """Inflates archive members on a thread pool within a byte budget
+
+    Members are submitted in the given order while the inflated bytes not yet
+    taken by the reader fit in the budget. Members the reader asks for before
+    they are submitted are left for the reader to read directly.
+    """
+    def __init__(self, archive, members, max_bytes, workers):
+        self._archive = archive
+        self._max_bytes = max_bytes
+        self._used = 0
+        self._closed = False
+        self._taken = set()
+        self._futures = {}
+        self._cond = threading.Condition()
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._feeder = threading.Thread(
+            target=self._feed, args=(members,), daemon=True
+            )
+        self._feeder.start()
+
+    def _member_size(self, member):
+        try:
+            return self._archive.getinfo(member).file_size
+        except Exception:
+            return 0
+
+    def _feed(self, members):
+        for member in members:
+            size = self._member_size(member)
+            with self._cond:
+                # always allow one member, even if larger than the budget
+                while not self._closed and member not in self._taken \
+                        and self._used and self._used + size > self._max_bytes:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                if member in self._taken:
+                    continue
+                self._used += size
+                self._futures[member] = \
+                    (self._pool.submit(self._inflate, member), size)
+
+    def _inflate(self, member):
+        with self._archive.open(member, 'r') as mstream:
+            return mstream.read()
+
+    def take(self, member):
+        """Inflated member contents, None if it was not prefetched"""
+        with self._cond:
+            self._taken.add(member)
+            future, size = self._futures.pop(member, (None, 0))
+        if future is None:
+            return None
+        try:
+            return future.result()
+        except Exception:
+            # let the reader hit and report the same error
+            return None
+        finally:
+            with self._cond:
+                self._used -= size
+                self._cond.notify_all()
+
+    def close(self):
+        """Stop prefetching and release prefetched contents"""
+        with self._cond:
+            self._closed = True
+            self._futures.clear()
+            self._cond.notify_all()
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        self._feeder.join()
+
+
+StreamedMember = namedtuple(
+    'StreamedMember',
+    ['name', 'method', 'crc', 'data_offset', 'compress_size', 'file_size']
+    )
+
+
+class StreamingArchive:
+    """Read-only zipfile.ZipFile look-alike reading local file headers
+
+    Members are discovered front to back, so it does not need the central
+    directory at the end of the file. Complete members of truncated packages
+    can be read, and with follow enabled, members of a package that is still
+    being written are available as soon as their bytes arrive.
+    """
+    LocalHeader = struct.Struct('<4sHHHHHIIIHH')
+    LocalHeaderSignature = b'PK\x03\x04'
+    EndSignatures = [b'PK\x01\x02', b'PK\x05\x06', b'PK\x06\x06']
+    DescriptorSignature = b'PK\x07\x08'
+    FlagDescriptor = 0x08
+    FlagUTF8 = 0x800
+    Zip64Extra = 0x0001
+
+    def __init__(self, file_path, mode='r', follow=False,
+                 idle_timeout=STREAM_IDLE_TIMEOUT):
+        if mode != 'r':
+            raise Exception("Streamed packages are read-only")
+        self.follow = follow
+        self.idle_timeout = idle_timeout
+        self.truncated = False
+        self._file = open(file_path, 'rb')
+        self._offset = 0
+        self._members = {}
+        self._ended = False
+        # members may be opened from prefetch threads
+        self._read_lock = threading.Lock()
+        self._scan_lock = threading.RLock()
+
+    def _read_at(self, offset, size, partial=False):
+        """Read size bytes at offset, waiting for them if following
+
+        Partial reads return whatever is available, if anything.
+        Returns None if the bytes never arrive
+        """
+        waited = 0.0
+        while True:
+            with self._read_lock:
+                self._file.seek(offset)
+                data = self._file.read(size)
+            if len(data) == size or (partial and data):
+                return data
+            if not self.follow or waited >= self.idle_timeout:
+                return None
+            time.sleep(STREAM_POLL_INTERVAL)
+            waited += STREAM_POLL_INTERVAL
+
+    def _find_data_end(self, offset):
+        """Inflate member data with unknown size to find where it ends"""
+        inflater = zlib.decompressobj(-zlib.MAX_WBITS)
+        position = offset
+        while not inflater.eof:
+            chunk = self._read_at(position, STREAM_CHUNK_SIZE, partial=True)
+            if chunk is None:
+                return None
+            inflater.decompress(chunk)
+            position += len(chunk)
+        return position - len(inflater.unused_data)
+
+    def _scan_next(self):
+        """Read next local file header, returns False at end of archive"""
+        with self._scan_lock:
+            return self._scan_member()
+
+    def _scan_member(self):
+        if self._ended:
+            return False
+        header = self._read_at(self._offset, self.LocalHeader.size)
+        if header is None or header[:4] != self.LocalHeaderSignature:
+            if header is None or header[:4] not in self.EndSignatures:
+                self.truncated = True
+            self._ended = True
+            if not self._members and self.truncated:
+                raise zipfile.BadZipFile("No complete member in package")
+            return False
+
+        _, _, flags, method, _, _, crc, csize, usize, name_len, extra_len = \
+            self.LocalHeader.unpack(header)
+        variable = self._read_at(self._offset + len(header),
+                                 name_len + extra_len)
+        if variable is None:
+            self.truncated = self._ended = True
+            return False
+        name = variable[:name_len].decode(
+            'utf-8' if flags & self.FlagUTF8 else 'cp437'
+            )
+        is_zip64 = False
+        extra = variable[name_len:]
+        while len(extra) >= 4:
+            extra_id, extra_size = struct.unpack('<HH', extra[:4])
+            if extra_id == self.Zip64Extra and extra_size >= 16:
+                usize, csize = struct.unpack('<QQ', extra[4:20])
+                is_zip64 = True
+            extra = extra[4 + extra_size:]
+
+        data_offset = self._offset + len(header) + len(variable)
+        if flags & self.FlagDescriptor:
+            # sizes follow the data, only deflated data marks its own end
+            data_end = self._find_data_end(data_offset) \
+                if method == zipfile.ZIP_DEFLATED else None
+            if data_end is None:
+                self.truncated = self._ended = True
+                return False
+            # crc, compressed and uncompressed size, optionally signed
+            crc_offset = 0
+            descriptor_size = 20 if is_zip64 else 12
+            if self._read_at(data_end, 4) == self.DescriptorSignature:
+                crc_offset = 4
+                descriptor_size += 4
+            descriptor = self._read_at(data_end, descriptor_size)
+            if descriptor is None:
+                self.truncated = self._ended = True
+                return False
+            crc = struct.unpack_from('<I', descriptor, crc_offset)[0]
+            csize = data_end - data_offset
+            next_offset = data_end + descriptor_size
+        else:
+            next_offset = data_offset + csize
+            # wait until the whole member has arrived
+            if csize and self._read_at(next_offset - 1, 1) is None:
+                self.truncated = self._ended = True
+                return False
+
+        self._offset = next_offset
+        if not name.endswith('/'):
+            self._members[name] = StreamedMember(
+                name, method, crc, data_offset, csize, usize
+                )
+        return True
+
+    def iter_names(self):
+        """Yield member names as they become available"""
+        index = 0
+        while True:
+            names = list(self._members)
+            for name in names[index:]:
+                yield name
+            index = len(names)
+            if not self._scan_next():
+                return
+
+    def namelist(self):
+        """Member names in archive order"""
+        while self._scan_next():
+            pass
+        return list(self._members)
+
+    def getinfo(self, name):
+        """Member info, waits for it if following"""
+        while name not in self._members and self._scan_next():
+            pass
+        if name not in self._members:
+            raise KeyError("There is no item named %r in the archive" % name)
+        return self._members[name]
+
+    def open(self, name, mode='r'):
+        """Open member for reading, waits for it if following"""
+        member = self.getinfo(name)
+        data = self._read_at(member.data_offset, member.compress_size)
+        if member.method == zipfile.ZIP_DEFLATED:
+            data = zlib.decompress(data, -zlib.MAX_WBITS)
+        elif member.method != zipfile.ZIP_STORED:
+            raise zipfile.BadZipFile(
+                "Unsupported compression method %d for %r"
+                % (member.method, name)
+                )
+        if zlib.crc32(data) != member.crc:
+            raise zipfile.BadZipFile("Bad CRC-32 for file %r" % name)
+        return io.BytesIO(data)
+
+    def close(self):
+        """Close package file"""
+        self._file.close()
+
+
+class StoredArchive:
+    """Read-only zipfile.ZipFile look-alike over a stored package"""
+    def __init__(self, store, manifest):
+        self._store = store
+        self._members = {x['name']: x for x in manifest['members']}
+
+    def namelist(self):
+        """Member names in original order"""
+        return list(self._members)
+
+    def getinfo(self, name):
+        """Member info"""
+        if name not in self._members:
+            raise KeyError("There is no item named %r in the archive" % name)
+        info = zipfile.ZipInfo(
+            name, date_time=tuple(self._members[name]['date_time'])
+            )
+        info.file_size = self._members[name]['size']
+        return info
+
+    def open(self, name, mode='r'):
+        """Open member for reading"""
+        if name not in self._members:
+            raise KeyError("There is no item named %r in the archive" % name)
+        return io.BytesIO(self._store.read_blob(self._members[name]['sha256']))
+
+    def close(self):
+        """Nothing to release"""
+
+
+def text_trigrams(text):
+    """Set of lowercase trigrams in given text"""
+    text = text.lower()
+    return set(text[i:i + 3] for i in range(len(text) - 2))
+
+
+def regex_literals(pattern):
+    """Literal runs every match of given regular expression must contain
+
+    Only top level literals are read, groups and character classes end a
+    run. Patterns with top level alternation (or verbose patterns) have no
+    literals, so their search verifies every document
+    """
+    if re.match(r'\(\?[aiLmsu]*x', pattern):
+        return []
+    literals = []
+    run = ''
+    depth = 0
+    idx = 0
+    while idx < len(pattern):
+        char = pattern[idx]
+        idx += 1
+        if char == '\\':
+            escaped = pattern[idx:idx + 1]
+            idx += 1
+            # \d, \w, \b, \x41, ... are not plain literals
+            if depth or not escaped or escaped.isalnum():
+                literals.append(run)
+                run = ''
+            else:
+                run += escaped
+        elif char == '[':
+            # skip character class, ] right after [ or [^ is a literal
+            if pattern[idx:idx + 1] == '^':
+                idx += 1
+            if pattern[idx:idx + 1] == ']':
+                idx += 1
+            while idx < len(pattern) and pattern[idx] != ']':
+                idx += 2 if pattern[idx] == '\\' else 1
+            idx += 1
+            literals.append(run)
+            run = ''
+        elif char == '(':
+            depth += 1
+            literals.append(run)
+            run = ''
+        elif char == ')':
+            depth -= 1
+        elif depth:
+            continue
+        elif char == '|':
+            return []
+        elif char in '*?{':
+            # last character might not be there at all
+            if char == '{':
+                repeat = re.match(r'\d*,?\d*\}', pattern[idx:])
+                idx += repeat.end() if repeat else 0
+            literals.append(run[:-1])
+            run = ''
+        elif char == '+':
+            # last character is there at least once
+            literals.append(run)
+            run = ''
+        elif char in '.^$':
+            literals.append(run)
+            run = ''
+        else:
+            run += char
+    literals.append(run)
+    return [x for x in literals if len(x) >= 3]
+
+
+class SearchIndex:
+    """On-disk trigram index over text members of debug packages
+
+    Documents are appended to docs.jsonl. Each update writes a segment of
+    trigram postings (sorted doc ids) with a sorted lexicon of fixed-size
+    records, so queries binary search the lexicon and only read postings of
+    their own trigrams. index.json is the checkpoint: it is replaced last
+    and records how much of docs.jsonl belongs to the index, so documents
+    of an interrupted update are dropped. Segments are merged once there
+    are more than MAX_INDEX_SEGMENTS.
+    """
+    # utf-8 trigram padded with a byte utf-8 never uses, offset, count
+    LEXICON_RECORD = struct.Struct('<12sII')
+    LEXICON_PADDING = b'\xff'
+
+    def __init__(self, index_dir):
+        self.index_dir = index_dir
+        if not op.isdir(index_dir):
+            os.makedirs(index_dir)
+        self.docs_file = op.join(index_dir, 'docs.jsonl')
+        self.state_file = op.join(index_dir, 'index.json')
+        self.state = {
+            'format': SEARCH_INDEX_FORMAT,
+            'segments': [],
+            'next_segment': 0,
+            'docs_size': 0,
+        }
+        if op.isfile(self.state_file):
+            with open(self.state_file, 'r') as sf:
+                state = json.load(sf)
+            # indexes of older formats are rebuilt from scratch
+            if state.get('format') == SEARCH_INDEX_FORMAT:
+                self.state = state
+        self.docs = []
+        if op.isfile(self.docs_file):
+            with open(self.docs_file, 'rb') as df:
+                docs_data = df.read(self.state['docs_size'])
+            self.docs = [
+                json.loads(x) for x in docs_data.decode('utf-8').split('\n')
+                if x.strip()
+                ]
+        self.packages = set(x['package'] for x in self.docs)
+        self._lexicons = {}
+        self._postings_maps = {}
+        self._postings_cache = OrderedDict()
+        self._texts = OrderedDict()
+        self._texts_size = 0
+        self._pending = defaultdict(list)
+        self._pending_docs = []
+
+    def _segment_path(self, segment, ext):
+        return op.join(self.index_dir, '{}.{}'.format(segment, ext))
+
+    def _map_segment(self, segment, ext):
+        with open(self._segment_path(segment, ext), 'rb') as sf:
+            return mmap.mmap(sf.fileno(), 0, access=mmap.ACCESS_READ) \
+                if os.fstat(sf.fileno()).st_size else b''
+
+    def _lexicon(self, segment):
+        if segment not in self._lexicons:
+            self._lexicons[segment] = self._map_segment(segment, 'lex')
+        return self._lexicons[segment]
+
+    def _postings_map(self, segment):
+        if segment not in self._postings_maps:
+            self._postings_maps[segment] = self._map_segment(segment, 'post')
+        return self._postings_maps[segment]
+
+    def _close_segment(self, segment):
+        for maps in [self._lexicons, self._postings_maps]:
+            segment_map = maps.pop(segment, None)
+            if isinstance(segment_map, mmap.mmap):
+                segment_map.close()
+
+    def _lookup(self, segment, trigram):
+        """(offset, count) of trigram postings in segment, or None"""
+        lexicon = self._lexicon(segment)
+        record = SearchIndex.LEXICON_RECORD
+        key = trigram.encode('utf-8').ljust(
+            record.size - 8, SearchIndex.LEXICON_PADDING
+            )
+        low, high = 0, len(lexicon) // record.size
+        while low < high:
+            middle = (low + high) // 2
+            start = middle * record.size
+            middle_key = lexicon[start:start + record.size - 8]
+            if middle_key < key:
+                low = middle + 1
+            elif middle_key > key:
+                high = middle
+            else:
+                return record.unpack_from(lexicon, start)[1:]
+        return None
+
+    def _trigrams(self, segment):
+        """Trigrams of segment in sorted order"""
+        lexicon = self._lexicon(segment)
+        record = SearchIndex.LEXICON_RECORD
+        for start in range(0, len(lexicon), record.size):
+            yield record.unpack_from(lexicon, start)[0] \
+                .rstrip(SearchIndex.LEXICON_PADDING).decode('utf-8')
+
+    def _postings(self, segment, trigram):
+        cache_key = (segment, trigram)
+        if cache_key in self._postings_cache:
+            self._postings_cache.move_to_end(cache_key)
+            return self._postings_cache[cache_key]
+        entry = self._lookup(segment, trigram)
+        postings = array('I')
+        if entry:
+            start = entry[0] * postings.itemsize
+            postings.frombytes(self._postings_map(segment)[
+                start:start + entry[1] * postings.itemsize
+                ])
+        self._postings_cache[cache_key] = postings
+        if len(self._postings_cache) > MAX_CACHED_POSTINGS:
+            self._postings_cache.popitem(last=False)
+        return postings
+
+    def _read_text(self, dfile, doc):
+        """Text of document, decompressed again only if not cached"""
+        cache_key = (doc['package'], doc['member'])
+        if cache_key in self._texts:
+            self._texts.move_to_end(cache_key)
+            return self._texts[cache_key]
+        text = dfile.read_txt(doc['member'])
+        self._texts[cache_key] = text
+        self._texts_size += len(text)
+        while self._texts_size > SEARCH_TEXT_CACHE_SIZE and self._texts:
+            self._texts_size -= len(self._texts.popitem(last=False)[1])
+        return text
+
+    def add_document(self, package, member, text):
+        """Queue a document for the next segment"""
+        doc_id = len(self.docs) + len(self._pending_docs)
+        self._pending_docs.append({'package': package, 'member': member})
+        for trigram in text_trigrams(text):
+            self._pending[trigram].append(doc_id)
+
+    def add_package(self, dfile, package_path):
+        """Queue searchable text members of given debug package"""
+        for member in searchable_members(dfile):
+            self.add_document(package_path, member, dfile.read_txt(member))
+        self.packages.add(package_path)
+
+    def _write_segment(self, segment, postings_iter):
+        record = SearchIndex.LEXICON_RECORD
+        offset = 0
+        with open(self._segment_path(segment, 'post'), 'wb') as pf, \
+                open(self._segment_path(segment, 'lex'), 'wb') as lf:
+            for trigram, postings in postings_iter:
+                postings.tofile(pf)
+                lf.write(record.pack(
+                    trigram.encode('utf-8').ljust(
+                        record.size - 8, SearchIndex.LEXICON_PADDING
+                        ),
+                    offset,
+                    len(postings)
+                    ))
+                offset += len(postings)
+
+    def _new_segment(self):
+        segment = 'seg{:06d}'.format(self.state['next_segment'])
+        self.state['next_segment'] += 1
+        return segment
+
+    def flush(self):
+        """Write queued documents as a new segment"""
+        if not self._pending_docs:
+            return
+        segment = self._new_segment()
+        self._write_segment(
+            segment,
+            ((k, array('I', self._pending[k])) for k in sorted(self._pending))
+            )
+        # drop documents of an interrupted update past the last checkpoint
+        with open(self.docs_file, 'r+b' if op.isfile(self.docs_file)
+                  else 'wb') as df:
+            df.seek(self.state['docs_size'])
+            df.truncate()
+            for doc in self._pending_docs:
+                df.write((json.dumps(doc) + '\n').encode('utf-8'))
+            self.state['docs_size'] = df.tell()
+        self.docs.extend(self._pending_docs)
+        self.state['segments'].append(segment)
+        self._pending.clear()
+        self._pending_docs = []
+        if len(self.state['segments']) > MAX_INDEX_SEGMENTS:
+            self.compact()
+        else:
+            self._save_state()
+
+    def compact(self):
+        """Merge all segments into one"""
+        segments = self.state['segments']
+        merged = self._new_segment()
+        # segments hold increasing doc ids, concatenation keeps order
+        all_trigrams = heapq.merge(*[self._trigrams(x) for x in segments])
+
+        def merged_postings():
+            last = None
+            for trigram in all_trigrams:
+                if trigram == last:
+                    continue
+                last = trigram
+                postings = array('I')
+                for segment in segments:
+                    postings.extend(self._postings(segment, trigram))
+                yield trigram, postings
+
+        self._write_segment(merged, merged_postings())
+        self.state['segments'] = [merged]
+        self._save_state()
+        self._postings_cache.clear()
+        for segment in segments:
+            self._close_segment(segment)
+            for ext in ['lex', 'post']:
+                os.remove(self._segment_path(segment, ext))
+
+    def _save_state(self):
+        temp_file = self.state_file + '.tmp'
+        with open(temp_file, 'w') as sf:
+            json.dump(self.state, sf)
+        os.replace(temp_file, self.state_file)
+
+    def candidates(self, trigrams):
+        """Doc ids containing all given trigrams (None means all docs)"""
+        if not trigrams:
+            return None
+        result = set()
+        for segment in self.state['segments']:
+            entries = {x: self._lookup(segment, x) for x in trigrams}
+            if not all(entries.values()):
+                continue
+            seg_docs = None
+            # rarest trigrams first narrow the set fastest
+            for trigram in sorted(trigrams, key=lambda x: entries[x][1]):
+                postings = self._postings(segment, trigram)
+                seg_docs = set(postings) if seg_docs is None \
+                    else seg_docs.intersection(postings)
+                if not seg_docs:
+                    break
+            result.update(seg_docs or [])
+        return result
+
+    def search(self, query, regex=False, ignore_case=False):
+        """Find lines matching query, yields (doc, line number, line)"""
+        flags = re.IGNORECASE if ignore_case else 0
+        if regex:
+            matcher = re.compile(query, flags=flags)
+            trigrams = set()
+            for literal in regex_literals(query):
+                trigrams.update(text_trigrams(literal))
+        else:
+            matcher = re.compile(re.escape(query), flags=flags)
+            trigrams = text_trigrams(query)
+        doc_ids = self.candidates(trigrams)
+        if doc_ids is None:
+            doc_ids = range(len(self.docs))
+        # verify candidates, one package open at a time and only if any of
+        # its documents is not cached already
+        by_package = defaultdict(list)
+        for doc_id in sorted(doc_ids):
+            by_package[self.docs[doc_id]['package']].append(self.docs[doc_id])
+        for package, docs in by_package.items():
+            cached = all((package, x['member']) in self._texts for x in docs)
+            with nullcontext() if cached \
+                    else open_debug_file(package) as dfile:
+                for doc in docs:
+                    text = self._read_text(dfile, doc)
+                    if not matcher.search(text):
+                        continue
+                    for line_no, tline in enumerate(text.split('\n')):
+                        if matcher.search(tline):
+                            yield doc, line_no + 1, tline
+
+
+class JournalIndex:
+    """Journal cached decompressed on disk with a sidecar line index
+
+    The index keeps the byte offset of every JOURNAL_CHECKPOINT_LINES-th
+    line and of every Jrn.* command. It is built while the journal is
+    decompressed the first time, and later queries read only the lines they
+    need from the memory-mapped cache. Least recently used journals are
+    evicted once the cache grows over MAX_JOURNALS_CACHE_SIZE
+    """
+    def __init__(self, text_file):
+        self.text_file = text_file
+        self.index_file = text_file + '.idx'
+        self.line_count = 0
+        self.checkpoints = []
+        # (line number, offset, command name) of Jrn.* lines
+        self.commands = []
+        self._file = None
+        self._map = None
+
+    @staticmethod
+    def cache_key(dfile, journal_file):
+        """Cache file name of journal in given package"""
+        info = dfile.getinfo(journal_file)
+        return hashlib.sha1('{}|{}|{}|{}'.format(
+            dfile.timestamp,
+            journal_file,
+            info.file_size,
+            getattr(info, 'CRC', None) or getattr(info, 'crc', None),
+            ).encode('utf-8')).hexdigest() + '.txt'
+
+    @staticmethod
+    def cache_path(dfile, journal_file):
+        """Path of cached journal of given package"""
+        journals_dir = op.join(ensure_cache_dir(), DEFAULT_JOURNALS_DIR)
+        if not op.isdir(journals_dir):
+            os.makedirs(journals_dir, exist_ok=True)
+        return op.join(
+            journals_dir, JournalIndex.cache_key(dfile, journal_file)
+            )
+
+    @staticmethod
+    def is_cached(dfile, journal_file):
+        """Check if journal of given package is cached and indexed"""
+        try:
+            return op.isfile(
+                JournalIndex.cache_path(dfile, journal_file) + '.idx'
+                )
+        except Exception:
+            return False
+
+    @staticmethod
+    def open(dfile, journal_file):
+        """Open index of journal, caching and indexing it on first use"""
+        jindex = JournalIndex(JournalIndex.cache_path(dfile, journal_file))
+        if jindex.load():
+            # index modification time marks the last use for eviction
+            os.utime(jindex.index_file)
+        else:
+            with dfile.open(journal_file) as stream:
+                jindex.build(stream)
+            JournalIndex.evict(op.dirname(jindex.text_file), jindex.text_file)
+        jindex.map()
+        return jindex
+
+    @staticmethod
+    def evict(journals_dir, keep, max_size=MAX_JOURNALS_CACHE_SIZE):
+        """Remove least recently used journals over max cache size"""
+        cached = []
+        total = 0
+        for entry in os.scandir(journals_dir):
+            if not entry.name.endswith('.txt.idx'):
+                continue
+            text_file = entry.path[:-len('.idx')]
+            try:
+                size = entry.stat().st_size + os.stat(text_file).st_size
+            except OSError:
+                continue
+            cached.append((entry.stat().st_mtime, text_file, size))
+            total += size
+        for _, text_file, size in sorted(cached):
+            if total <= max_size:
+                break
+            if text_file == keep:
+                continue
+            try:
+                # index first, an unindexed journal is not used
+                os.remove(text_file + '.idx')
+                os.remove(text_file)
+            except OSError as evict_ex:
+                # still mapped by another process on windows
+                sys.stderr.write("[WARN] %s\n" % str(evict_ex))
+                continue
+            total -= size
+
+    def load(self):
+        """Read sidecar index, if it matches the cached journal"""
+        try:
+            with open(self.index_file, 'r') as xf:
+                index = json.load(xf)
+            if index['size'] != os.stat(self.text_file).st_size \
+                    or index['step'] != JOURNAL_CHECKPOINT_LINES:
+                return False
+        except (OSError, ValueError, KeyError):
+            return False
+        self.line_count = index['lines']
+        self.checkpoints = index['checkpoints']
+        self.commands = [tuple(x) for x in index['commands']]
+        return True
+
+    def build(self, stream):
+        """Cache decompressed journal and index its lines"""
+        self.checkpoints = []
+        self.commands = []
+        offset = line_no = 0
+        journals_dir = op.dirname(self.text_file)
+        fd, temp_text = tempfile.mkstemp(dir=journals_dir)
+        try:
+            with os.fdopen(fd, 'wb') as tf:
+                for jline in iter(stream.readline, b''):
+                    if line_no % JOURNAL_CHECKPOINT_LINES == 0:
+                        self.checkpoints.append(offset)
+                    command = jline.lstrip()
+                    if command.startswith(b'Jrn.'):
+                        self.commands.append((
+                            line_no,
+                            offset,
+                            command.split(None, 1)[0].decode(
+                                'utf-8', errors='ignore'
+                                )
+                            ))
+                    tf.write(jline)
+                    offset += len(jline)
+                    line_no += 1
+            self.line_count = line_no
+            os.replace(temp_text, self.text_file)
+        except Exception:
+            if op.isfile(temp_text):
+                os.remove(temp_text)
+            raise
+        # index is written last, marking the cached journal complete
+        fd, temp_index = tempfile.mkstemp(dir=journals_dir)
+        with os.fdopen(fd, 'w') as xf:
+            json.dump({
+                'size': offset,
+                'step': JOURNAL_CHECKPOINT_LINES,
+                'lines': self.line_count,
+                'checkpoints': self.checkpoints,
+                'commands': self.commands,
+                }, xf)
+        os.replace(temp_index, self.index_file)
+
+    def map(self):
+        """Memory-map cached journal"""
+        self._file = open(self.text_file, 'rb')
+        if os.fstat(self._file.fileno()).st_size:
+            self._map = mmap.mmap(
+                self._file.fileno(), 0, access=mmap.ACCESS_READ
+                )
+
+    def close(self):
+        """Release cached journal"""
+        if self._map:
+            self._map.close()
+        if self._file:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception, exception_value, traceback):
+        self.close()
+
+    def read_lines(self, offset, count=None):
+        """Lines starting at given byte offset"""
+        if not self._map:
+            return []
+        end = offset
+        while end < len(self._map) and (count is None or count > 0):
+            next_eol = self._map.find(EOL, end)
+            end = len(self._map) if next_eol == -1 else next_eol + 1
+            if count is not None:
+                count -= 1
+        return self._map[offset:end]\
+            .replace(WIN_EOL, EOL)\
+            .decode('utf-8', errors='ignore')\
+            .rstrip('\n')\
+            .split('\n')
+
+    def lines(self, start, count=None):
+        """Lines starting at given line number"""
+        if not self._map or start >= self.line_count:
+            return []
+        checkpoint = start // JOURNAL_CHECKPOINT_LINES
+        offset = self.checkpoints[checkpoint]
+        # skip lines after checkpoint
+        for _ in range(start - checkpoint * JOURNAL_CHECKPOINT_LINES):
+            offset = self._map.find(EOL, offset) + 1
+        return self.read_lines(offset, count)
+
+    def iter_lines(self):
+        """Yield all lines of journal"""
+        if self._map:
+            self._map.seek(0)
+            for jline in iter(self._map.readline, b''):
+                yield jline.replace(WIN_EOL, EOL)\
+                    .decode('utf-8', errors='ignore').rstrip('\n')
+
+    def find_commands(self, text=None):
+        """Line number, offset and line of Jrn.* commands containing text"""
+        for line_no, offset, _ in self.commands:
+            jline = self.read_lines(offset, 1)[0]
+            if text is None or text in jline:
+                yield line_no, offset, jline
+
+
+def searchable_members(dfile):
+    """Text members of a debug package worth searching"""
+    members = [DebugFileParts.Report, DebugFileParts.ConsoleLog]
+    try:
+        members.append(process_report(dfile).journal_file)
+    except Exception:
+        pass
+    members.append(DebugFileParts.AppsCSV.format(name=dfile.timestamp))
+    existing = set(dfile.list_files(''))
+    return [x for x in members if x in existing]
+
+
+def report_members(dfile):
+    """Members of a debug package read when composing its report"""
+    members = [
+        DebugFileParts.Report,
+        DebugFileParts.AppsCSV.format(name=dfile.timestamp),
+        DebugFileParts.ConsoleLog,
+        ]
+    try:
+        journal_file = process_report(dfile).journal_file
+        # cached journals are read from disk instead
+        if journal_file \
+                and not JournalIndex.is_cached(dfile, journal_file):
+            members.append(journal_file)
+    except Exception:
+        pass
+    members.extend(dfile.list_files(DebugFileParts.SystemAddinsDir))
+    members.extend(dfile.list_files(DebugFileParts.InstalledAddinsDir))
+    existing = set(dfile.list_files(''))
+    return [x for x in members if x in existing]
+
+
+def open_debug_file(zip_file, follow=False):
+    """Open debug package from disk or from the blob store
+
+    Packages without central directory (truncated, or still being written
+    when following) are read member by member from their local headers
+    """
+    if not op.isfile(zip_file):
+        store = BlobStore(op.join(ensure_cache_dir(), DEFAULT_STORE_DIR))
+        if store.has_package(zip_file):
+            return DebugFile(zip_file, opener=store.open_archive)
+    if follow:
+        return DebugFile(
+            zip_file,
+            opener=lambda path, mode: StreamingArchive(path, mode, follow=True)
+            )
+    if op.isfile(zip_file) and not zipfile.is_zipfile(zip_file):
+        return DebugFile(zip_file, opener=StreamingArchive)
+    return DebugFile(zip_file)
+
+
+class PollingWatcher:
+    """Wakes up periodically to rescan a directory"""
+    def __init__(self, directory):
+        self.directory = directory
+
+    def wait(self, timeout):
+        """Wait for changes or timeout"""
+        time.sleep(timeout)
+
+    def close(self):
+        """Release resources"""
+
+
+class InotifyWatcher(PollingWatcher):
+    """Wakes up as soon as files are written or moved into a directory"""
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_NONBLOCK = os.O_NONBLOCK
+
+    def __init__(self, directory):
+        super().__init__(directory)
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._fd = libc.inotify_init1(self.IN_NONBLOCK)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(
+                self._fd,
+                os.fsencode(directory),
+                self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE) < 0:
+            os.close(self._fd)
+            raise OSError(ctypes.get_errno(), "inotify_add_watch failed")
+
+    def wait(self, timeout):
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if readable:
+            # only used as a wake up, directory is rescanned anyway
+            try:
+                while os.read(self._fd, 4096):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def close(self):
+        os.close(self._fd)
+
+
+def make_watcher(directory):
+    """Create inotify watcher where available, polling otherwise"""
+    if sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(directory)
+        except (OSError, AttributeError) as watch_ex:
+            sys.stderr.write("[WARN] inotify unavailable: %s\n" % watch_ex)
+    return PollingWatcher(directory)
+
+
+class InboxWatch:
+    """Processes each new debug package arriving in an inbox exactly once
+
+    Files are processed once their size and modification time stayed the
+    same for the settle time. Processed files are checkpointed to a state
+    file so restarts do not reprocess them.
+    """
+    def __init__(self, inbox_dir, process, state_file, settle):
+        self.inbox_dir = inbox_dir
+        self.process = process
+        self.state_file = state_file
+        self.settle = settle
+        self.processed = {}
+        if op.isfile(state_file):
+            with open(state_file, 'r') as sf:
+                self.processed = json.load(sf)
+        # file name -> ((size, mtime), first seen, unchanged since)
+        self.pending = {}
+        self.metrics = {
+            'started': time.time(),
+            'processed': 0,
+            'failed': 0,
+            'pending': 0,
+            'last_lag': 0.0,
+            'max_lag': 0.0,
+            'throughput_per_min': 0.0,
+        }
+
+    @staticmethod
+    def file_key(stat):
+        """Identity of a file version"""
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def scan(self):
+        """Update pending files and return the ones ready to process"""
+        now = time.time()
+        ready = []
+        seen = set()
+        for entry in os.listdir(self.inbox_dir):
+            if not re.match(DebugFileParts.NamingFormat, entry):
+                continue
+            try:
+                stat = os.stat(op.join(self.inbox_dir, entry))
+            except OSError:
+                continue
+            key = InboxWatch.file_key(stat)
+            if self.processed.get(entry, {}).get('key') == key:
+                continue
+            seen.add(entry)
+            if entry not in self.pending or self.pending[entry][0] != key:
+                first_seen = self.pending[entry][1] \
+                    if entry in self.pending else now
+                self.pending[entry] = (key, first_seen, now)
+            elif now - self.pending[entry][2] >= self.settle:
+                ready.append(entry)
+        for entry in set(self.pending).difference(seen):
+            del self.pending[entry]
+        self.metrics['pending'] = len(self.pending) - len(ready)
+        return sorted(ready)
+
+    def process_ready(self, ready):
+        """Process ready files and checkpoint each"""
+        for entry in ready:
+            key, first_seen, _ = self.pending.pop(entry)
+            zip_file = op.join(self.inbox_dir, entry)
+            try:
+                # settled but no central directory means truncated package
+                # complete members are processed and it is retried if the
+                # file changes again
+                self.process(zip_file)
+                self.metrics['processed'] += 1
+                result = 'ok'
+            except Exception as proc_ex:
+                sys.stderr.write("[ERROR] %s: %s\n" % (entry, str(proc_ex)))
+                self.metrics['failed'] += 1
+                result = str(proc_ex)
+            lag = time.time() - first_seen
+            self.metrics['last_lag'] = lag
+            self.metrics['max_lag'] = max(lag, self.metrics['max_lag'])
+            self.processed[entry] = {
+                'key': key,
+                'processed': time.time(),
+                'lag': lag,
+                'result': result,
+            }
+            self.checkpoint()
+
+    def checkpoint(self):
+        """Save processed files atomically"""
+        temp_file = self.state_file + '.tmp'
+        with open(temp_file, 'w') as sf:
+            json.dump(self.processed, sf)
+        os.replace(temp_file, self.state_file)
+
+    def write_metrics(self, metrics_file):
+        """Save throughput and lag metrics"""
+        elapsed = max(time.time() - self.metrics['started'], 1e-6)
+        self.metrics['throughput_per_min'] = \
+            60.0 * self.metrics['processed'] / elapsed
+        with open(metrics_file, 'w') as mf:
+            json.dump(self.metrics, mf, indent=2)
+
+
+class ReleaseHealth:
+    """Load and runtime error counts per release over time
+
+    Packages are counted once (by report timestamp, wherever the package
+    file is) into hourly periods of their report timestamp by Rhino.Inside,
+    Rhino and Revit versions, as load or runtime errors like their reports
+    are titled (see report_type). Only the counts and the typed host fields
+    of counted packages are kept in the state file, so new packages are
+    added without reading the earlier ones again
+    """
+    def __init__(self, state_file):
+        self.state_file = state_file
+        self.packages = {}
+        # hour -> release -> [load errors, runtime errors]
+        self.counts = defaultdict(dict)
+        if op.isfile(state_file):
+            with open(state_file, 'r') as sf:
+                state = json.load(sf)
+            # earlier states are keyed by package path
+            self.packages = {
+                ReleaseHealth.package_key(k): v
+                for k, v in state['packages'].items()
+                }
+            self.counts.update(state['counts'])
+
+    @staticmethod
+    def package_key(package_path):
+        """Report timestamp of package file, e.g. 20220501T100000Z"""
+        name = op.basename(package_path)
+        match = re.search(r'\d{8}T\d{6}Z', name)
+        return match.group() if match else name
+
+    @staticmethod
+    def release(host):
+        """Release key of host versions, e.g. 1.5|7.16|2022"""
+        return '|'.join([
+            '.'.join(str(x) for x in host.rir[:2]) or '?',
+            '.'.join(str(x) for x in host.rhino[:2]) or '?',
+            str(host.revit or '?'),
+            ])
+
+    def add_package(self, dfile):
+        """Count given package, unless counted before"""
+        if dfile.timestamp in self.packages:
+            return False
+        reported = datetime.strptime(dfile.timestamp, '%Y%m%dT%H%M%SZ')
+        host = parse_host_info(process_report(dfile).host_info)
+        runtime = report_type(dfile) == 'Runtime Error'
+        hour = reported.strftime('%Y-%m-%dT%H')
+        release = ReleaseHealth.release(host)
+        counts = self.counts[hour].setdefault(release, [0, 0])
+        counts[1 if runtime else 0] += 1
+        self.packages[dfile.timestamp] = dict(
+            host._asdict(),
+            reported=reported.isoformat(),
+            kind='runtime' if runtime else 'load',
+            )
+        return True
+
+    def flush(self):
+        """Save state atomically"""
+        temp_file = self.state_file + '.tmp'
+        with open(temp_file, 'w') as sf:
+            json.dump({'packages': self.packages, 'counts': self.counts}, sf)
+        os.replace(temp_file, self.state_file)
+
+    def series(self, bucket_hours):
+        """Per period and release error counts, rates and spikes
+
+        A release spikes when its runtime errors in a period reach
+        HEALTH_SPIKE_FACTOR times its average over earlier periods
+        """
+        periods = defaultdict(lambda: defaultdict(lambda: [0, 0]))
+        for hour, releases in self.counts.items():
+            start = datetime.strptime(hour, '%Y-%m-%dT%H')
+            start -= timedelta(
+                hours=(start - datetime(1970, 1, 1)).total_seconds()
+                // 3600 % bucket_hours
+                )
+            for release, (load, runtime) in releases.items():
+                periods[start][release][0] += load
+                periods[start][release][1] += runtime
+
+        history = defaultdict(list)
+        rows = []
+        for start in sorted(periods):
+            total = sum(sum(x) for x in periods[start].values())
+            for release, (load, runtime) in sorted(periods[start].items()):
+                earlier = history[release]
+                baseline = sum(earlier) / len(earlier) if earlier else 0.0
+                rows.append({
+                    'period': start.strftime('%Y-%m-%dT%H'),
+                    'release': release,
+                    'load': load,
+                    'runtime': runtime,
+                    'runtime_rate': runtime / (load + runtime),
+                    'share': (load + runtime) / total,
+                    'spike': runtime >= HEALTH_SPIKE_MIN
+                             and runtime >= HEALTH_SPIKE_FACTOR * baseline,
+                    })
+                earlier.append(runtime)
+        return rows
+
+
 def ensure_cache_dir():
     """Ensure debug cache directory exists"""
     pwd = op.dirname(__file__)
@@ -178,8 +1888,9 @@ def ensure_cache_dir():
 def process_report(dfile):
     """Extract interesting parts from report file"""
     report = dfile.read_txt(DebugFileParts.Report)
-    report_parts = []
+    report_parts = {}
     # grab information from known sections of the report
+    # attachments section is only written when there are attachments
     for part_name in [DebugFileParts.ReportHostSection,
                       DebugFileParts.ReportAttachmentSection]:
         match = re.search(
@@ -187,104 +1898,948 @@ def process_report(dfile):
             report,
             flags=re.MULTILINE
             )
-        if match:
-            report_parts.append(match.groups()[0])
+        report_parts[part_name] = match.groups()[0] if match else ''
+    # grab journal file from report section
+    # first line is expected to be the journal file
+    # .dmp file might be listed after
+    journal_link = re.search(
+        r'\((.+)\)', report_parts[DebugFileParts.ReportAttachmentSection]
+        )
     return ReportInfo(
         # return host info verbatim
-        host_info=report_parts[0],
-        # grab journal file from report section
-        # first line is expected to be the journal file
-        # .dmp file might be listed after
-        journal_file=re.search(r'\((.+)\)', report_parts[1]).groups()[0]
+        host_info=report_parts[DebugFileParts.ReportHostSection],
+        journal_file=journal_link.groups()[0] if journal_link else None
     )
 
 
+def parse_host_info(host_info):
+    """Parse versions from host section of the report into typed fields"""
+    def field(pattern):
+        match = re.search(pattern, host_info, flags=re.MULTILINE)
+        return match.groups()[0].strip() if match else ''
+    revit = field(r'Autodesk Revit (\d{4})')
+    return HostInfo(
+        rir=parse_version(field(r'Rhino\.Inside Revit:\s*(\S+)')),
+        rhino=parse_version(field(r'^\s*-\s*Rhino:\s*(\S+)')),
+        revit=int(revit) if revit else None,
+        revit_build=parse_version(field(r'VersionBuild:\s*(\S+)')),
+        language=field(r'Language:\s*(\S+)'),
+        )
+
+
 def process_journal(dfile, journal_file):
     """Extract interesting parts from journal file"""
-    record_lines = -1
-    extracted = []
     # find where rir is executed in journal and
     # grab MAX_JRN_LINES lines after that
-    for jline in dfile.read_txt(journal_file).split('\n'):
-        if DebugFileParts.RIRJournalRibbonEvent in jline:
-            record_lines = 0
-        if record_lines != -1:
-            if record_lines >= MAX_JRN_LINES:
-                break
-            else:
-                extracted.append(jline)
-                record_lines += 1
-    return '\n'.join(extracted)
+    if not journal_file:
+        return 'No journal attached to the report'
+    try:
+        jindex = JournalIndex.open(dfile, journal_file)
+    except Exception as jrn_ex:
+        sys.stderr.write("[WARN] %s\n" % str(jrn_ex))
+        return ''
+    with jindex:
+        for _, offset, _ in jindex.find_commands(
+                DebugFileParts.RIRJournalRibbonEvent):
+            return '\n'.join(jindex.read_lines(offset, MAX_JRN_LINES))
+    return ''
 
 
-def process_console(dfile):
-    """Extract info from console log file"""
-    # grab all of the console log data
-    return dfile.read_txt(DebugFileParts.ConsoleLog)
+def console_template(logline, masks):
+    """Console log line with its variable parts masked"""
+    for pattern, placeholder in masks:
+        logline = pattern.sub(placeholder, logline)
+    return logline
 
 
-def process_addons(dfile):
-    """Extract interesting parts from loaded addons info file"""
-    # read addon data from csv file
-    addons = ""
-    csv_data = dfile.read_csv(
-        DebugFileParts.AppsCSV.format(name=dfile.timestamp),
-        headers=True
-        )
-    # report anything that is third-party
-    # mark the know conflicts with a exclamation mark
-    if csv_data:
-        addons += ADDONS_TABLE_HEADER
-        for csvline in csv_data:
-            if all(x not in csvline[0] for x in [ADSK_ADDON, MCNEEL_ADDON]):
-                if any(x.name in csvline[0] for x in KNOWN_CONFLICTS):
-                    csvline[0] = '⚠️' + csvline[0]
-                addons += ' | '.join(csvline) + '\n'
-    else:
-        addons += "Addon data not collected"
-    return addons
+def compact_log(loglines, gap=CONSOLE_REPEAT_GAP,
+                window=CONSOLE_REPEAT_WINDOW):
+    """Collapse repeating console log lines, keeping log order
 
+    A run of lines sharing a template is reported where it starts, with its
+    count and first and last samples. Up to gap lines of other templates
+    may interrupt the run; they are held back (at most window of them) and
+    reported after it, so no line is reported before lines preceding it
+    """
+    masks = [(re.compile(x), y) for x, y in CONSOLE_TOKEN_MASKS]
+    # [template, count, first line, last line] of current run
+    run = None
+    # (template, line) interrupting current run, lines since its last one
+    held = []
+    idle = 0
+    queue = deque()
 
-def sanitize_report(report):
-    """Cleanup user info from report"""
-    # remove home dir refs, replace with env vars
-    report = re.sub(r"C:\\users\\(.+?)\\appdata\\roaming\\",
-                    r"%APPDATA%\\",
-                    report, flags=re.IGNORECASE)
-    report = re.sub(r"C:\\users\\(.+?)\\appdata\\local\\",
-                    r"%LOCALAPPDATA%\\",
-                    report, flags=re.IGNORECASE)
-    return report
+    def report(template, count, first, last):
+        if count == 1:
+            return [first]
+        return [
+            '{} \u00d7{}'.format(template, count),
+            '  first: ' + first,
+            '  last: ' + last,
+        ]
 
+    def drain():
+        nonlocal run, held, idle
+        output = []
+        while queue:
+            template, logline = queue.popleft()
+            if run is None:
+                run = [template, 1, logline, logline]
+                idle = 0
+            elif template == run[0]:
+                run[1] += 1
+                run[3] = logline
+                idle = 0
+            else:
+                held.append((template, logline))
+                idle += 1
+                if idle > gap or len(held) > window:
+                    # run is over, held lines may start the next one
+                    output.extend(report(*run))
+                    run = None
+                    queue.extendleft(reversed(held))
+                    held = []
+                    idle = 0
+        return output
 
-def extract_sb_ticket_id(ticket_url):
-    """Extracts the supportbee ticket id from url"""
-    match = re.search(r'\/(\d+)', ticket_url)
+    for logline in loglines:
+        logline = logline.rstrip()
+        queue.append((console_template(logline, masks), logline))
+        yield from drain()
+
+    while run:
+        yield from report(*run)
+        run = None
+        queue.extend(held)
+        held = []
+        yield from drain()
+
+
+def process_console(dfile):
+    """Extract info from console log file, collapsing repeated lines"""
+    try:
+        console_stream = dfile.open(DebugFileParts.ConsoleLog)
+    except Exception as con_ex:
+        sys.stderr.write("[WARN] %s\n" % str(con_ex))
+        return ""
+    with console_stream:
+        loglines = io.TextIOWrapper(
+            console_stream, encoding='utf-8', errors='ignore', newline=None
+            )
+        return ''.join(x + '\n' for x in compact_log(loglines))
+
+
+def monotonic_events(events):
+    """Clamp out-of-order event times, keeping events sorted for merging
+
+    Clamped events keep their original time as logged
+    """
+    last = None
+    for event in events:
+        if last is not None and event.time < last:
+            event = event._replace(time=last, logged=event.time)
+        last = event.time
+        yield event
+
+
+def iter_member_lines(dfile, filename):
+    """Lazily yield decoded lines of given package member"""
+    try:
+        stream = dfile.open(filename)
+    except Exception as mem_ex:
+        sys.stderr.write("[WARN] %s\n" % str(mem_ex))
+        return
+    with stream:
+        for line in io.TextIOWrapper(
+                stream, encoding='utf-8', errors='ignore', newline=None):
+            yield line.rstrip()
+
+
+def journal_events(dfile, journal_file):
+    """Journal commands and messages stamped with the last journal time"""
+    stamp = re.compile(JOURNAL_TIMESTAMP)
+    last_time = None
+    try:
+        jindex = JournalIndex.open(dfile, journal_file)
+    except Exception as jrn_ex:
+        sys.stderr.write("[WARN] %s\n" % str(jrn_ex))
+        return
+    with jindex:
+        for jline in jindex.iter_lines():
+            match = stamp.match(jline)
+            if match:
+                try:
+                    last_time = datetime.strptime(
+                        match.group(1), '%d-%b-%Y %H:%M:%S.%f'
+                        if '.' in match.group(1) else '%d-%b-%Y %H:%M:%S'
+                        )
+                except ValueError:
+                    continue
+                if match.group(2).strip() not in JOURNAL_IDLE_TEXT:
+                    yield TimelineEvent(last_time, 'journal', match.group(2))
+            elif last_time and jline.startswith('Jrn.'):
+                yield TimelineEvent(last_time, 'journal', jline)
+
+
+def log_events(lines, source):
+    """Log lines with a time of day, on the last date seen in the log
+
+    Lines without their own time inherit the last time, and lines before
+    the first time are skipped
+    """
+    date_finder = re.compile(LOG_DATE)
+    time_finder = re.compile(LOG_TIME)
+    last_date = last_time = None
+    for logline in lines:
+        logline = logline.strip()
+        if not logline:
+            continue
+        date_match = date_finder.search(logline)
+        if date_match:
+            last_date = tuple(int(x) for x in date_match.groups())
+        time_match = time_finder.search(logline)
+        if time_match and last_date:
+            hours, minutes, seconds, fraction = time_match.groups()
+            try:
+                last_time = datetime(
+                    *last_date, int(hours), int(minutes), int(seconds),
+                    int((fraction or '0').ljust(6, '0'))
+                    )
+            except ValueError:
+                pass
+        if last_time:
+            yield TimelineEvent(last_time, source, logline)
+
+
+def report_log_lines(dfile):
+    """Lines of the log section of the report file"""
+    # log is the last section, and may contain blank lines
+    match = re.search(
+        r"^{}\n+(.*)".format(DebugFileParts.ReportLogSection),
+        dfile.read_txt(DebugFileParts.Report),
+        flags=re.MULTILINE | re.DOTALL
+        )
+    return match.groups()[0].rstrip('\n').split('\n') if match else []
+
+
+def package_events(dfile, utc_offset):
+    """Report creation and crash dump times, dump time converted from UTC"""
+    try:
+        # package name is local time, formatted from DateTime.Now with a
+        # literal Z
+        created = datetime.strptime(dfile.timestamp, '%Y%m%dT%H%M%SZ')
+        yield TimelineEvent(created, 'package', 'report created')
+    except ValueError:
+        pass
+    for entry in dfile.list_files(DebugFileParts.AttachmentsDir):
+        if not entry.endswith('.dmp'):
+            continue
+        with dfile.open(entry) as dump:
+            header = dump.read(32)
+        # minidump header stores its creation time as unix timestamp
+        if len(header) >= 24 and header[:4] == MINIDUMP_SIGNATURE:
+            created = datetime.fromtimestamp(
+                struct.unpack_from('<I', header, 20)[0], timezone.utc
+                ).replace(tzinfo=None)
+            yield TimelineEvent(
+                created + utc_offset, 'dump', 'crash dump ' + op.basename(entry)
+                )
+
+
+def build_timeline(dfile, utc_offset=0):
+    """Merge timestamped events of all package sources in time order
+
+    Each source is read lazily as a sorted event stream, so only one
+    pending event per source is held in memory while merging. Crash dump
+    times are UTC and moved by utc_offset hours, the others (including the
+    report creation time, despite the Z of the package name) are local
+    """
+    try:
+        journal_file = process_report(dfile).journal_file
+    except Exception:
+        journal_file = None
+    offset = timedelta(hours=utc_offset)
+    sources = [
+        log_events(report_log_lines(dfile), 'log'),
+        log_events(
+            iter_member_lines(dfile, DebugFileParts.ConsoleLog), 'console'
+            ),
+        # few events only, small enough to sort
+        iter(sorted(package_events(dfile, offset), key=lambda x: x.time)),
+        ]
+    if journal_file:
+        sources.append(journal_events(dfile, journal_file))
+    return heapq.merge(
+        *[monotonic_events(x) for x in sources],
+        key=lambda x: x.time
+        )
+
+
+def tail_events(events, minutes):
+    """Events within given minutes before the crash dump, or the last event"""
+    window = timedelta(minutes=minutes)
+    tail = deque()
+    for event in events:
+        tail.append(event)
+        while tail[0].time < event.time - window:
+            tail.popleft()
+        if event.source == 'dump':
+            break
+    return tail
+
+
+def format_event(event):
+    """Format timeline event as a single line
+
+    Events logged out of order show their logged time, marked as such
+    """
+    text = event.text
+    if len(text) > MAX_TIMELINE_TEXT:
+        text = text[:MAX_TIMELINE_TEXT] + '...'
+    return '{} [{}{}] {}'.format(
+        (event.logged or event.time).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3],
+        event.source,
+        ', out of order' if event.logged else '',
+        text
+        )
+
+
+def parse_startup_log(log_text):
+    """Parse rhino startup log into StartupRecord entries"""
+    compiled = [
+        (x.kind, re.compile(x.pattern, flags=re.IGNORECASE))
+        for x in STARTUP_LOG_PATTERNS
+        ]
+    records = []
+    for logline in log_text.split('\n'):
+        logline = logline.strip()
+        if not logline:
+            continue
+        for kind, pattern in compiled:
+            match = pattern.search(logline)
+            if match:
+                fields = match.groupdict()
+                duration = None
+                if fields.get('duration'):
+                    duration = float(fields['duration']) \
+                        * DURATION_UNITS[fields['unit'].lower()]
+                records.append(
+                    StartupRecord(
+                        kind=kind,
+                        name=(fields.get('name') or '').strip(),
+                        duration=duration,
+                        message=(fields.get('message') or '').strip()
+                        )
+                    )
+                break
+    return records
+
+
+def process_startup(dfile):
+    """Summarize rhino startup phases, plug-in loads and failures"""
+    records = parse_startup_log(dfile.read_txt(DebugFileParts.ConsoleLog))
+    if not records:
+        return "Startup log not collected\n"
+    summary = ""
+    timed = sorted(
+        [x for x in records if x.duration is not None],
+        key=lambda x: x.duration,
+        reverse=True
+        )
+    if timed:
+        summary += STARTUP_TABLE_HEADER
+        for record in timed[:MAX_STARTUP_ENTRIES]:
+            summary += '{} | {} | {:.3f}\n'.format(
+                record.kind, record.name, record.duration
+                )
+        summary += '\n'
+    for record in [x for x in records if x.kind == 'failure']:
+        summary += '- ⚠️ {}\n'.format(
+            ': '.join(x for x in [record.name, record.message] if x)
+            )
+    return summary
+
+
+def aggregate_startup(records_per_package):
+    """Build per plug-in load-time distributions across packages"""
+    durations = defaultdict(list)
+    failures = defaultdict(int)
+    for records in records_per_package:
+        for record in records:
+            if record.kind == 'failure' and record.name:
+                failures[record.name] += 1
+            elif record.kind == 'plugin' and record.duration is not None:
+                durations[record.name].append(record.duration)
+    stats = {}
+    for name in set(durations).union(failures):
+        values = sorted(durations.get(name, []))
+        stats[name] = {
+            'loads': len(values),
+            'failures': failures.get(name, 0),
+            'min': values[0] if values else None,
+            'median': statistics.median(values) if values else None,
+            'p90': values[int(0.9 * (len(values) - 1))] if values else None,
+            'max': values[-1] if values else None,
+            }
+    return stats
+
+
+def parse_addin_manifest(stream, package='', source='', manifest=''):
+    """Stream-parse a Revit .addin manifest into AddinManifestEntry items"""
+    parser = ET.XMLPullParser(events=('end',))
+    while True:
+        chunk = stream.read(XML_CHUNK_SIZE)
+        if chunk:
+            parser.feed(chunk)
+        else:
+            parser.close()
+        for _, element in parser.read_events():
+            if element.tag != 'AddIn':
+                continue
+            yield AddinManifestEntry(
+                package=package,
+                source=source,
+                manifest=manifest,
+                addin_type=element.get('Type', ''),
+                addin_id=(element.findtext('AddInId') or
+                          element.findtext('ClientId') or '').strip().upper(),
+                name=(element.findtext('Name') or '').strip(),
+                assembly=(element.findtext('Assembly') or '').strip(),
+                full_class_name=(element.findtext('FullClassName') or '')
+                .strip()
+                )
+            element.clear()
+        if not chunk:
+            break
+
+
+class AddinIndex:
+    """Index of add-in manifests by AddInId, assembly and class name"""
+    def __init__(self):
+        self.by_id = defaultdict(list)
+        self.by_assembly_name = defaultdict(list)
+        # loaded application type name -> assembly locations
+        self.loaded = defaultdict(set)
+        self.packages = set()
+
+    def add(self, entry):
+        """Add manifest entry to index"""
+        self.packages.add(entry.package)
+        self.by_id[entry.addin_id].append(entry)
+        self.by_assembly_name[
+            (entry.package, ntpath.basename(entry.assembly).lower())
+            ].append(entry)
+
+    def add_loaded(self, package, type_name, location):
+        """Add a loaded application reported in add-ins csv"""
+        self.loaded[(package, type_name)].add(ntpath.normcase(location))
+
+    def merge(self, other):
+        """Merge another index into this one"""
+        for addin_id, entries in other.by_id.items():
+            self.by_id[addin_id].extend(entries)
+        for assembly_name, entries in other.by_assembly_name.items():
+            self.by_assembly_name[assembly_name].extend(entries)
+        for key, locations in other.loaded.items():
+            self.loaded[key].update(locations)
+        self.packages.update(other.packages)
+
+    def duplicates(self):
+        """Entries sharing an AddInId within the same package"""
+        for entries in self.by_id.values():
+            per_package = defaultdict(list)
+            for entry in entries:
+                per_package[entry.package].append(entry)
+            for pentries in per_package.values():
+                if len(pentries) > 1:
+                    yield from pentries
+
+    def not_loaded(self):
+        """Applications installed but not reported as loaded
+
+        Packages do not list the files on disk, so applications whose
+        assembly is missing are only found here, along with those failing
+        to load for other reasons
+        """
+        for entries in self.by_id.values():
+            for entry in entries:
+                if entry.addin_type in ADDIN_APPLICATION_TYPES \
+                        and (entry.package, entry.full_class_name) \
+                        not in self.loaded:
+                    yield entry
+
+    def shadowed(self):
+        """Entries whose assembly is loaded from elsewhere
+
+        Either the application type was loaded from another location, or
+        manifests in the same package point to different copies of an
+        assembly with the same file name.
+        """
+        for entries in self.by_assembly_name.values():
+            # copies of the same assembly name in one package
+            copies = set(ntpath.normcase(x.assembly) for x in entries)
+            for entry in entries:
+                loaded_from = self.loaded.get(
+                    (entry.package, entry.full_class_name)
+                    )
+                if len(copies) > 1 or (loaded_from and not any(
+                        AddinIndex.same_assembly(entry.assembly, x)
+                        for x in loaded_from)):
+                    yield entry
+
+    @staticmethod
+    def same_assembly(manifest_assembly, location):
+        """Check if manifest assembly path refers to given location
+
+        Manifest paths might be relative to the manifest directory
+        """
+        manifest_assembly = ntpath.normcase(manifest_assembly)
+        location = ntpath.normcase(location)
+        if manifest_assembly == location:
+            return True
+        return not ntpath.isabs(manifest_assembly) \
+            and location.endswith('\\' + manifest_assembly)
+
+    def issues(self):
+        """All (issue, entry) pairs"""
+        for entry in self.duplicates():
+            yield 'duplicate id', entry
+        for entry in self.shadowed():
+            yield 'shadowed', entry
+        for entry in self.not_loaded():
+            yield 'not loaded', entry
+
+
+def index_addins(dfile, index=None):
+    """Index system and installed add-in manifests of given package"""
+    index = index or AddinIndex()
+    for source in [DebugFileParts.SystemAddinsDir,
+                   DebugFileParts.InstalledAddinsDir]:
+        for manifest in dfile.list_files(source):
+            try:
+                with dfile.open(manifest) as mstream:
+                    for entry in parse_addin_manifest(
+                            mstream,
+                            package=dfile.timestamp,
+                            source=op.basename(source),
+                            manifest=op.basename(manifest)):
+                        index.add(entry)
+            except ET.ParseError as xml_ex:
+                sys.stderr.write(
+                    "[WARN] %s: %s\n" % (manifest, str(xml_ex))
+                    )
+    for csvline in dfile.read_csv(
+            DebugFileParts.AppsCSV.format(name=dfile.timestamp),
+            headers=True):
+        if len(csvline) >= 6:
+            index.add_loaded(dfile.timestamp, csvline[3], csvline[5])
+    return index
+
+
+def format_addin_issues(index):
+    """Format add-in manifest issues as a markdown table"""
+    issues = list(index.issues())
+    if not issues:
+        return "No add-in manifest issues found\n"
+    table = ADDIN_ISSUES_TABLE_HEADER
+    for issue, entry in issues:
+        table += '{} | {} | {} | {}/{} | {}\n'.format(
+            issue,
+            entry.addin_id,
+            entry.name or entry.full_class_name,
+            entry.source,
+            entry.manifest,
+            entry.assembly
+            )
+    return table
+
+
+def process_manifests(dfile):
+    """Report issues found in add-in manifests"""
+    index = index_addins(dfile)
+    if not index.by_id:
+        return "Add-in manifests not collected\n"
+    return format_addin_issues(index)
+
+
+def compile_path_signatures(signatures):
+    """Compile path signatures into a single matcher
+
+    Returns a function mapping a directory to its signature or None
+    """
+    combined = re.compile(
+        '|'.join(
+            '(?P<sig{}>{})'.format(idx, x.pattern)
+            for idx, x in enumerate(signatures)
+            ),
+        flags=re.IGNORECASE
+        )
+
+    def match_signature(directory):
+        match = combined.match(directory)
+        if match:
+            return signatures[int(match.lastgroup[3:])]
+        return None
+    return match_signature
+
+
+match_path_signature = compile_path_signatures(PATH_SIGNATURES)
+
+
+def parse_path_entries(report):
+    """Extract ordered PATH entries from the environment table of report"""
+    entries = []
+    in_table = False
+    for rline in report.split('\n'):
+        rline = rline.strip()
+        if rline.startswith(DebugFileParts.ReportEnvironmentSection):
+            in_table = True
+        elif in_table:
+            if rline.startswith('|'):
+                entry = rline.strip('|').strip()
+                if entry not in ['PATH', ':---']:
+                    entries.append(entry)
+            elif entries:
+                break
+    return entries
+
+
+def analyze_path(package, path_entries, rhino_version):
+    """Find PATH entries shadowing Rhino dlls
+
+    Only the version of the loaded Rhino is reported by the host section,
+    so its System directory is the PATH entry of that Rhino major version.
+    Known vendor directories listed before it are reported. Nothing is
+    reported when it is not on PATH since the order is unknown then
+
+    Args:
+        package (str): package timestamp
+        path_entries (list[str]): PATH entries in order
+        rhino_version (tuple[int]): version of loaded Rhino from host section
+    """
+    if not rhino_version:
+        return []
+    rhino_dir = re.compile(
+        r'.*\\Rhino {}\\System\\?$'.format(rhino_version[0]),
+        flags=re.IGNORECASE
+        )
+    findings = []
+    for position, directory in enumerate(path_entries):
+        if rhino_dir.match(directory):
+            return findings
+        signature = match_path_signature(directory)
+        if signature:
+            findings.append(
+                PathFinding(
+                    package=package,
+                    position=position,
+                    directory=directory,
+                    vendor=signature.vendor,
+                    reason='before Rhino on PATH, ships '
+                           + ', '.join(signature.dlls)
+                    )
+                )
+    return []
+
+
+def find_path_shadowing(dfile):
+    """Analyze PATH of given package"""
+    host = parse_host_info(process_report(dfile).host_info)
+    return analyze_path(
+        dfile.timestamp,
+        parse_path_entries(dfile.read_txt(DebugFileParts.Report)),
+        host.rhino
+        )
+
+
+def process_path(dfile):
+    """Report probable dll shadowing caused by PATH"""
+    findings = find_path_shadowing(dfile)
+    if not findings:
+        return "No PATH shadowing found\n"
+    table = PATH_FINDINGS_TABLE_HEADER
+    for finding in findings:
+        table += '{} | {} | {} | {}\n'.format(
+            finding.position if finding.position >= 0 else '-',
+            finding.directory,
+            finding.vendor,
+            finding.reason
+            )
+    return table
+
+
+def parse_version(version):
+    """Version string as a comparable tuple of numbers"""
+    return tuple(int(x) for x in re.findall(r'\d+', version or ''))
+
+
+def compile_version_range(spec):
+    """Version range like '>=2.0,<2.11' as (operator, version) constraints"""
+    constraints = []
+    for part in (spec or '*').split(','):
+        part = part.strip()
+        if part in ('', '*'):
+            continue
+        match = re.match(r'(>=|<=|!=|==|>|<|=)?\s*(\d.*)$', part)
+        if not match:
+            raise Exception("Invalid version constraint: %s" % part)
+        constraints.append(
+            (VERSION_OPERATORS[match.group(1) or '=='],
+             parse_version(match.group(2)))
+            )
+    return constraints
+
+
+def version_in_range(version, constraints):
+    """Check if version tuple satisfies all constraints"""
+    if not constraints:
+        return True
+    # constraints can not be checked against an unknown version
+    if not version:
+        return False
+    for compare, bound in constraints:
+        size = max(len(version), len(bound))
+        if not compare(version + (0,) * (size - len(version)),
+                       bound + (0,) * (size - len(bound))):
+            return False
+    return True
+
+
+def glob_pattern(pattern):
+    """Case-insensitive wildcard pattern (* and ?) as regular expression"""
+    return re.escape(pattern).replace(r'\*', '[^\t]*').replace(r'\?', '[^\t]')
+
+
+class ConflictMatcher:
+    """Flags loaded add-ins matching conflict rules
+
+    Company and product patterns of all rules are combined into one
+    expression, so most add-in rows are rejected with a single match. Rows
+    it matches are checked against the patterns of each rule group, since
+    patterns may overlap, and only the version constraints of the rules
+    sharing the matched patterns are checked
+    """
+    def __init__(self, rules):
+        self.rules = rules
+        by_patterns = OrderedDict()
+        for rule in rules:
+            if rule.severity not in CONFLICT_SEVERITIES:
+                raise Exception("Invalid conflict severity: %s" % rule.severity)
+            by_patterns.setdefault((rule.company, rule.product), []).append(
+                (rule,
+                 compile_version_range(rule.version),
+                 compile_version_range(rule.revit),
+                 compile_version_range(rule.rir))
+                )
+        self._groups = [
+            (re.compile(
+                '{}\t{}'.format(glob_pattern(company), glob_pattern(product)),
+                flags=re.IGNORECASE
+                ), group_rules)
+            for (company, product), group_rules in by_patterns.items()
+            ]
+        self._finder = re.compile(
+            '|'.join('(?:{})'.format(x.pattern) for x, _ in self._groups),
+            flags=re.IGNORECASE
+            ) if by_patterns else None
+
+    def match(self, company, product, version, revit=None, rir=None):
+        """Rules matching given add-in, Revit and Rhino.Inside versions"""
+        if not self._finder:
+            return []
+        addin = company + '\t' + product
+        if not self._finder.fullmatch(addin):
+            return []
+        version = parse_version(version)
+        return [
+            rule
+            for finder, group_rules in self._groups
+            if finder.fullmatch(addin)
+            for rule, version_range, revit_range, rir_range in group_rules
+            if version_in_range(version, version_range)
+            and version_in_range(revit, revit_range)
+            and version_in_range(rir, rir_range)
+            ]
+
+
+CONFLICT_MATCHERS = {}
+
+
+def conflict_rules_file():
+    """Default conflict rules file next to this script"""
+    return op.join(op.dirname(op.abspath(__file__)), DEFAULT_CONFLICTS_FILE)
+
+
+def load_conflict_matcher(rules_file=None):
+    """Compile conflict rules file, again only if it changed"""
+    rules_file = rules_file or conflict_rules_file()
+    try:
+        mtime = os.stat(rules_file).st_mtime_ns
+    except OSError:
+        sys.stderr.write("[WARN] Missing conflict rules %s\n" % rules_file)
+        return ConflictMatcher([])
+    cached = CONFLICT_MATCHERS.get(rules_file)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(rules_file, 'r', encoding='utf-8') as rf:
+        rules = [
+            ConflictRule(
+                company=x.get('company', '*'),
+                product=x.get('product', '*'),
+                version=x.get('version', '*'),
+                revit=x.get('revit', '*'),
+                rir=x.get('rir', '*'),
+                severity=x.get('severity', 'warning'),
+                note=x.get('note', ''),
+                )
+            for x in json.load(rf)['rules']
+            ]
+    matcher = ConflictMatcher(rules)
+    CONFLICT_MATCHERS[rules_file] = (mtime, matcher)
+    return matcher
+
+
+def find_host_versions(host, csv_data):
+    """Revit year and Rhino.Inside.Revit version of package
+
+    Versions are taken from the host section of the report, which every
+    package has, and from the loaded add-ins if missing there
+    """
+    revit = (host.revit,) if host.revit else None
+    rir = host.rir
+    for csvline in csv_data:
+        if len(csvline) < 3:
+            continue
+        if not revit and csvline[0].startswith(REVIT_ADDON[0]) \
+                and csvline[1] == REVIT_ADDON[1]:
+            revit = parse_version(csvline[2])
+            # e.g. 22.0 is Revit 2022
+            if revit and revit[0] < 2000:
+                revit = (revit[0] + 2000,) + revit[1:]
+        elif not rir and csvline[0].startswith(RIR_ADDON[0]) \
+                and csvline[1].startswith(RIR_ADDON[1]):
+            rir = parse_version(csvline[2])
+    return revit, rir
+
+
+def process_addons(dfile):
+    """Extract interesting parts from loaded addons info file"""
+    # read addon data from csv file
+    addons = ""
+    csv_data = dfile.read_csv(
+        DebugFileParts.AppsCSV.format(name=dfile.timestamp),
+        headers=True
+        )
+    # report anything that is third-party
+    # mark the known conflicts with their severity
+    if csv_data:
+        matcher = load_conflict_matcher()
+        revit, rir = find_host_versions(
+            parse_host_info(process_report(dfile).host_info), csv_data
+            )
+        notes = []
+        addons += ADDONS_TABLE_HEADER
+        for csvline in csv_data:
+            if all(x not in csvline[0] for x in [ADSK_ADDON, MCNEEL_ADDON]):
+                rules = matcher.match(
+                    csvline[0],
+                    csvline[1] if len(csvline) > 1 else '',
+                    csvline[2] if len(csvline) > 2 else '',
+                    revit=revit,
+                    rir=rir
+                    )
+                if rules:
+                    severity = max(
+                        (x.severity for x in rules),
+                        key=list(CONFLICT_SEVERITIES).index
+                        )
+                    csvline[0] = CONFLICT_SEVERITIES[severity] + csvline[0]
+                    notes.extend(
+                        '- {}{} {}: {}'.format(
+                            CONFLICT_SEVERITIES[x.severity],
+                            csvline[1], csvline[2], x.note
+                            )
+                        for x in rules if x.note
+                        )
+                addons += ' | '.join(csvline) + '\n'
+        if notes:
+            addons += '\n' + '\n'.join(notes) + '\n'
+    else:
+        addons += "Addon data not collected"
+    return addons
+
+
+def sanitize_report(report):
+    """Cleanup user info from report"""
+    # remove home dir refs, replace with env vars
+    report = re.sub(r"C:\\users\\(.+?)\\appdata\\roaming\\",
+                    r"%APPDATA%\\",
+                    report, flags=re.IGNORECASE)
+    report = re.sub(r"C:\\users\\(.+?)\\appdata\\local\\",
+                    r"%LOCALAPPDATA%\\",
+                    report, flags=re.IGNORECASE)
+    return report
+
+
+def extract_sb_ticket_id(ticket_url):
+    """Extracts the supportbee ticket id from url"""
+    match = re.search(r'/tickets/(\d+)', ticket_url)
     return match.group(1) if match else None
 
 
-def process_dbpkg(zip_file, ticket_url=None):
+def process_dbpkg(zip_file, ticket_url=None, follow=False):
     """Process given debug zip file"""
+    # write report
+    print(create_report(zip_file, ticket_url=ticket_url, follow=follow))
+
+
+REPORT_CACHE = OrderedDict()
+
+
+def report_cache_key(zip_file, ticket_url):
+    """Identity of a report, changing with the package and conflict rules"""
+    try:
+        stat = os.stat(zip_file)
+        rules_stat = os.stat(conflict_rules_file())
+    except OSError:
+        return None
+    return (op.abspath(zip_file), stat.st_size, stat.st_mtime_ns,
+            ticket_url, rules_stat.st_mtime_ns)
+
+
+def create_report(zip_file, ticket_url=None, follow=False):
+    """Create sanitized report for given debug zip file
+
+    Reports of complete packages are kept in memory, so a resident server
+    answers repeated requests without reading the package again
+    """
+    cache_key = None if follow else report_cache_key(zip_file, ticket_url)
+    if cache_key in REPORT_CACHE:
+        REPORT_CACHE.move_to_end(cache_key)
+        return REPORT_CACHE[cache_key]
+    report = compose_report(zip_file, ticket_url=ticket_url, follow=follow)
+    with PROFILER.stage('sanitize_report'):
+        report = sanitize_report(report)
+    if cache_key:
+        REPORT_CACHE[cache_key] = report
+        if len(REPORT_CACHE) > MAX_CACHED_REPORTS:
+            REPORT_CACHE.popitem(last=False)
+    return report
+
+
+def compose_report(zip_file, ticket_url=None, follow=False):
+    """Compose report for given debug zip file"""
     # open zip file
-    new_report = '\n'
-    with DebugFile(zip_file) as dfile:
-        # determine report type
-        report_type = 'Runtime Error' if dfile.has_dump else 'Load Error'
-        if ticket_url:
-            # make a title
-            ticket_id = extract_sb_ticket_id(ticket_url)
-            if ticket_id:
-                # create a title for the report
-                new_report += '%s (SB %s)\n\n' % (report_type, ticket_id)
-            else:
-                new_report += '%s\n\n' % report_type
-            # add ticket link
-            new_report += '# Ticket Info\n'
-            new_report += "[Support Ticket]({})\n\n".format(ticket_url)
+    new_report = ''
+    with open_debug_file(zip_file, follow=follow) as dfile:
+        # inflate members concurrently, unless waiting for them to arrive
+        if not follow:
+            dfile.prefetch(report_members(dfile))
 
         # read Report.md
         new_report += '# Host Info\n'
-        rinfo = process_report(dfile)
+        with PROFILER.stage('process_report'):
+            rinfo = process_report(dfile)
         new_report += rinfo.host_info
         new_report += '\n\n'
 
@@ -294,42 +2849,94 @@ def process_dbpkg(zip_file, ticket_url=None):
             'Section of journal after loading Rhino.Inside.Revit '\
             '({} lines)\n'.format(MAX_JRN_LINES)
         new_report += '```\n'
-        new_report += process_journal(dfile, rinfo.journal_file)
+        with PROFILER.stage('process_journal'):
+            new_report += process_journal(dfile, rinfo.journal_file)
         new_report += '\n```\n\n'
 
+        # summarize console log
+        new_report += '# Startup Summary\n'
+        new_report += 'Slowest Rhino startup phases and plug-in loads\n'
+        with PROFILER.stage('process_startup'):
+            new_report += process_startup(dfile)
+        new_report += '\n'
+
         # read console log
         new_report += '# Console Log\n'
         new_report += '```\n'
-        new_report += process_console(dfile)
+        with PROFILER.stage('process_console'):
+            new_report += process_console(dfile)
         new_report += '```\n\n'
 
         # extract interesting addons
         new_report += '# Third-party Addons\n'
-        new_report += '⚠️ shows addons with known conflicts\n'
-        new_report += process_addons(dfile)
+        new_report += 'ℹ️ ⚠️ ⛔ show addons with known conflicts\n'
+        with PROFILER.stage('process_addons'):
+            new_report += process_addons(dfile)
         new_report += '\n\n'
 
-    # write report
-    print(sanitize_report(new_report))
+        # check PATH for dll shadowing
+        new_report += '# PATH Shadowing\n'
+        with PROFILER.stage('process_path'):
+            new_report += process_path(dfile)
+        new_report += '\n'
+
+        # check installed addon manifests
+        new_report += '# Add-in Manifests\n'
+        with PROFILER.stage('process_manifests'):
+            new_report += process_manifests(dfile)
+        new_report += '\n'
+
+        # determine report type last, crash dumps are the last members
+        # to arrive when following a package
+        title = '\n'
+        if ticket_url:
+            # make a title
+            ticket_id = extract_sb_ticket_id(ticket_url)
+            if ticket_id:
+                # create a title for the report
+                title += '%s (SB %s)\n\n' % (report_type(dfile), ticket_id)
+            else:
+                title += '%s\n\n' % report_type(dfile)
+            # add ticket link
+            title += '# Ticket Info\n'
+            title += "[Support Ticket]({})\n\n".format(ticket_url)
+
+    return title + new_report
+
+
+def report_type(dfile):
+    """Kind of error reported by package
+
+    Rhino.Inside only attaches a crash dump for unhandled exceptions
+    (Diagnostics.DumpException), so packages without one are taken as load
+    errors
+    """
+    return 'Runtime Error' if dfile.has_dump else 'Load Error'
 
 
 def download_file(zip_url, api_token, filename, download_dir):
     """Download zip file from supportbee"""
     local_filename = op.join(download_dir, filename)
-    with requests.get(
-            zip_url,
-            params={"auth_token": api_token},
-            stream=True) as r:
-        r.raise_for_status()
-        with open(local_filename, 'wb') as f:
+    # download next to target and move into place when complete
+    fd, partial_filename = tempfile.mkstemp(dir=download_dir, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as f, requests.get(
+                zip_url,
+                params={"auth_token": api_token},
+                stream=True) as r:
+            r.raise_for_status()
             for chunk in r.iter_content(chunk_size=8192):
                 f.write(chunk)
+        os.replace(partial_filename, local_filename)
+    except BaseException:
+        if op.isfile(partial_filename):
+            os.remove(partial_filename)
+        raise
     return local_filename
 
 
-def process_sb_ticket(ticket_url, api_token):
-    """Process given supportbee ticket and download the debug file"""
-    download_dir = ensure_cache_dir()
+def fetch_sb_attachment(ticket_url, api_token):
+    """Get the debug file attachment info of given supportbee ticket"""
     # get ticket info
     r = requests.get(
         ticket_url,
@@ -338,26 +2945,1067 @@ def process_sb_ticket(ticket_url, api_token):
             "Content-Type": "application/json",
             "Accept": "application/json"
             })
-    if r.status_code == 200:
-        # download debug file from ticket
-        ticket_data = json.loads(r.text)
-        for att in ticket_data["ticket"]["content"]["attachments"]:
-            if att["filename"].endswith(".zip"):
-                return download_file(
-                    zip_url=att["url"]["original"],
-                    api_token=api_token,
-                    filename=att["filename"],
-                    download_dir=download_dir
+    r.raise_for_status()
+    ticket_data = json.loads(r.text)
+    for att in ticket_data["ticket"]["content"]["attachments"]:
+        if att["filename"].endswith(".zip"):
+            return att
+    return None
+
+
+def process_sb_ticket(ticket_url, api_token):
+    """Process given supportbee ticket and download the debug file"""
+    download_dir = ensure_cache_dir()
+    # download debug file from ticket
+    att = fetch_sb_attachment(ticket_url, api_token)
+    if att:
+        return download_file(
+            zip_url=att["url"]["original"],
+            api_token=api_token,
+            filename=att["filename"],
+            download_dir=download_dir
+            )
+
+
+class PipelineStage:
+    """A pipeline stage running a blocking function on worker threads"""
+    def __init__(self, name, func, limit):
+        self.name = name
+        self.func = func
+        self.limit = limit
+        self.processed = 0
+        self.failed = 0
+        self.busy = 0.0
+
+
+async def run_pipeline(items, stages, queue_size):
+    """Push items through stages connected by bounded queues
+
+    Each stage runs up to its limit of items at once. Bounded queues make
+    fast stages wait for slow ones, so throughput follows the slowest
+    stage. Functions returning None drop the item.
+    """
+    queues = [asyncio.Queue(maxsize=queue_size) for _ in stages]
+
+    async def worker(stage, in_queue, out_queue):
+        while True:
+            item = await in_queue.get()
+            start = time.time()
+            try:
+                result = await asyncio.to_thread(stage.func, item)
+                stage.processed += 1
+                if result is not None and out_queue is not None:
+                    await out_queue.put(result)
+            except Exception as stage_ex:
+                stage.failed += 1
+                sys.stderr.write(
+                    "[ERROR] {}: {}\n".format(stage.name, str(stage_ex))
+                    )
+            finally:
+                stage.busy += time.time() - start
+                in_queue.task_done()
+
+    workers = []
+    for idx, stage in enumerate(stages):
+        out_queue = queues[idx + 1] if idx + 1 < len(queues) else None
+        workers.append([
+            asyncio.create_task(worker(stage, queues[idx], out_queue))
+            for _ in range(stage.limit)
+            ])
+
+    for item in items:
+        await queues[0].put(item)
+    # drain stages in order, upstream is done once its queue is joined
+    for idx, stage_workers in enumerate(workers):
+        await queues[idx].join()
+        for task in stage_workers:
+            task.cancel()
+    await asyncio.gather(*[x for y in workers for x in y],
+                         return_exceptions=True)
+
+
+def process_sb_tickets(ticket_urls, api_token, output_dir, limits,
+                       queue_size=PIPELINE_QUEUE_SIZE, download_dir=None):
+    """Download and process debug packages of many supportbee tickets
+
+    Returns the pipeline stages, with their processed and failed counts
+    """
+    download_dir = download_dir or ensure_cache_dir()
+
+    def fetch(ticket_url):
+        att = fetch_sb_attachment(ticket_url, api_token)
+        if not att:
+            sys.stderr.write("[WARN] No Zip file in %s\n" % ticket_url)
+            return None
+        return ticket_url, att
+
+    def download(ticket_att):
+        ticket_url, att = ticket_att
+        return ticket_url, download_file(
+            zip_url=att["url"]["original"],
+            api_token=api_token,
+            filename=att["filename"],
+            download_dir=download_dir
+            )
+
+    def parse(ticket_zip):
+        ticket_url, zip_file = ticket_zip
+        return ticket_url, compose_report(zip_file, ticket_url=ticket_url)
+
+    def render(ticket_report):
+        ticket_url, report = ticket_report
+        with PROFILER.stage('sanitize_report'):
+            return ticket_url, sanitize_report(report)
+
+    def write(ticket_report):
+        ticket_url, report = ticket_report
+        report_name = extract_sb_ticket_id(ticket_url) or 'report'
+        report_file = op.join(output_dir, 'SB-{}.md'.format(report_name))
+        with open(report_file, 'w', encoding='utf-8') as rf:
+            rf.write(report)
+        print('processed: {}'.format(report_file))
+        return report_file
+
+    stages = [
+        PipelineStage(name, func, limit)
+        for name, func, limit in zip(
+            PIPELINE_STAGES, [fetch, download, parse, render, write], limits
+            )
+        ]
+    start = time.time()
+    asyncio.run(run_pipeline(ticket_urls, stages, queue_size))
+    elapsed = time.time() - start
+    sys.stderr.write("{} tickets in {:.2f}s\n".format(
+        len(ticket_urls), elapsed
+        ))
+    for stage in stages:
+        sys.stderr.write(
+            "  {}: {} done, {} failed, {:.2f}s busy, {} workers\n".format(
+                stage.name, stage.processed, stage.failed, stage.busy,
+                stage.limit
+                ))
+    return stages
+
+
+def parse_sb_time(timestamp):
+    """Parse supportbee ISO 8601 timestamp"""
+    return datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+
+
+class TicketSync:
+    """Mirrors debug packages of supportbee tickets incrementally
+
+    Tickets are listed from a cursor of the last activity time synced, so
+    each sync only pages through tickets with new activity. Debug package
+    attachments of these tickets and their replies are queued and
+    downloaded, and every step is appended to a ledger. Cursor and download
+    queue are checkpointed to a state file once all pages are listed
+    """
+    def __init__(self, sb_url, api_token, state_file, ledger_file,
+                 since=None):
+        self.sb_url = sb_url.rstrip('/')
+        self.api_token = api_token
+        self.state_file = state_file
+        self.ledger_file = ledger_file
+        self.state = {'since': since, 'ids': [], 'pending': []}
+        if op.isfile(state_file):
+            with open(state_file, 'r') as sf:
+                self.state = json.load(sf)
+
+    def record(self, event, **fields):
+        """Append an entry to the ledger"""
+        with open(self.ledger_file, 'a', encoding='utf-8') as lf:
+            lf.write(json.dumps(dict(time=time.time(), event=event, **fields)))
+            lf.write('\n')
+
+    def checkpoint(self):
+        """Save cursor and download queue atomically"""
+        temp_file = self.state_file + '.tmp'
+        with open(temp_file, 'w') as sf:
+            json.dump(self.state, sf)
+        os.replace(temp_file, self.state_file)
+
+    def list_changed(self, since):
+        """Yield tickets active since given time, page by page"""
+        page = 1
+        while True:
+            params = {
+                "auth_token": self.api_token,
+                "per_page": SB_PAGE_SIZE,
+                "page": page,
+                }
+            if since:
+                params["since"] = since
+            r = requests.get(
+                self.sb_url + '/tickets',
+                params=params,
+                headers={
+                    "Content-Type": "application/json",
+                    "Accept": "application/json"
+                    })
+            r.raise_for_status()
+            listing = r.json()
+            yield from listing.get("tickets", [])
+            if page >= listing.get("total_pages", page) \
+                    or not listing.get("tickets"):
+                break
+            page += 1
+
+    def list_replies(self, ticket_id):
+        """Replies of given ticket"""
+        r = requests.get(
+            '{}/tickets/{}/replies'.format(self.sb_url, ticket_id),
+            params={"auth_token": self.api_token},
+            headers={
+                "Content-Type": "application/json",
+                "Accept": "application/json"
+                })
+        r.raise_for_status()
+        return r.json().get("replies", [])
+
+    def queue(self, ticket):
+        """Queue debug package attachments of given ticket and its replies"""
+        queued = 0
+        ticket_url = '{}/tickets/{}'.format(self.sb_url, ticket["id"])
+        attachments = list(ticket.get("content", {}).get("attachments", []))
+        # users often send the package in a reply to the first email
+        for reply in self.list_replies(ticket["id"]):
+            attachments.extend(
+                (reply.get("content") or {}).get("attachments", [])
+                )
+        for att in attachments:
+            if not re.match(DebugFileParts.NamingFormat, att["filename"]):
+                continue
+            entry = {
+                'ticket': ticket_url,
+                'filename': att["filename"],
+                'url': att["url"]["original"],
+                }
+            if entry not in self.state['pending']:
+                self.state['pending'].append(entry)
+                self.record('queued', **entry)
+                queued += 1
+        return queued
+
+    def sync(self):
+        """List tickets with new activity and queue their attachments"""
+        since = parse_sb_time(self.state['since']) \
+            if self.state['since'] else None
+        latest, latest_ids = since, set(self.state['ids'])
+        changed = queued = 0
+        for ticket in self.list_changed(self.state['since']):
+            activity = ticket.get("last_activity_at") \
+                or ticket.get("updated_at") or ticket.get("created_at")
+            active = parse_sb_time(activity)
+            # tickets at the cursor time were synced, unless new
+            if since and (active < since or (
+                    active == since and ticket["id"] in self.state['ids'])):
+                continue
+            changed += 1
+            self.record('changed', ticket=ticket["id"], activity=activity)
+            queued += self.queue(ticket)
+            if latest is None or active > latest:
+                latest, latest_ids = active, set()
+                self.state['since'] = activity
+            if active == latest:
+                latest_ids.add(ticket["id"])
+        self.state['ids'] = sorted(latest_ids)
+        self.checkpoint()
+        return changed, queued
+
+    def download_pending(self, output_dir):
+        """Download queued attachments into output directory"""
+        downloaded = 0
+        for entry in list(self.state['pending']):
+            try:
+                if op.isfile(op.join(output_dir, entry['filename'])):
+                    self.record('present', **entry)
+                else:
+                    download_file(
+                        zip_url=entry['url'],
+                        api_token=self.api_token,
+                        filename=entry['filename'],
+                        download_dir=output_dir
+                        )
+                    downloaded += 1
+                    self.record('downloaded', **entry)
+            except Exception as dl_ex:
+                sys.stderr.write("[ERROR] %s: %s\n" % (entry['filename'],
+                                                        str(dl_ex)))
+                self.record('failed', error=str(dl_ex), **entry)
+                continue
+            self.state['pending'].remove(entry)
+            self.checkpoint()
+        return downloaded
+
+
+def sync_sb_tickets(sb_url, api_token, output_dir, since=None):
+    """Mirror debug packages of supportbee tickets with new activity"""
+    cache_dir = ensure_cache_dir()
+    tsync = TicketSync(
+        sb_url,
+        api_token,
+        op.join(cache_dir, DEFAULT_SYNC_STATE),
+        op.join(cache_dir, DEFAULT_SYNC_LEDGER),
+        since=since
+        )
+    with PROFILER.stage('sync_tickets'):
+        changed, queued = tsync.sync()
+    with PROFILER.stage('download_packages'):
+        downloaded = tsync.download_pending(output_dir)
+    print('{} tickets changed, {} packages queued, {} downloaded, '
+          '{} pending'.format(changed, queued, downloaded,
+                              len(tsync.state['pending'])))
+
+
+def find_packages(package_paths):
+    """Expand given zip files and directories into debug package paths"""
+    packages = []
+    for package_path in package_paths:
+        if op.isdir(package_path):
+            packages.extend(
+                sorted(
+                    op.join(package_path, x)
+                    for x in os.listdir(package_path)
+                    if re.match(DebugFileParts.NamingFormat, x)
                     )
+                )
+        else:
+            packages.append(package_path)
+    return packages
+
+
+def format_seconds(value):
+    """Format optional seconds value for report tables"""
+    return '-' if value is None else '{:.3f}'.format(value)
+
+
+def process_startup_batch(packages, as_json=False):
+    """Analyze rhino startup logs across given debug packages"""
+    records_per_package = {}
+    for zip_file in packages:
+        try:
+            with open_debug_file(zip_file) as dfile, \
+                    PROFILER.stage('parse_startup_log'):
+                records_per_package[dfile.timestamp] = parse_startup_log(
+                    dfile.read_txt(DebugFileParts.ConsoleLog)
+                    )
+        except Exception as startup_ex:
+            sys.stderr.write("[WARN] %s: %s\n" % (zip_file, str(startup_ex)))
+    stats = aggregate_startup(records_per_package.values())
+    if as_json:
+        print(json.dumps(
+            {
+                'packages': {
+                    k: [x._asdict() for x in v]
+                    for k, v in records_per_package.items()
+                    },
+                'plugins': stats,
+            },
+            indent=2
+            ))
+        return
+
+    report = '# Rhino Plug-in Load Times\n'
+    report += '{} packages\n'.format(len(records_per_package))
+    report += STARTUP_STATS_TABLE_HEADER
+    for name, pstats in sorted(
+            stats.items(),
+            key=lambda x: (x[1]['median'] or 0, x[1]['failures']),
+            reverse=True):
+        report += '{} | {} | {} | {} | {} | {} | {}\n'.format(
+            name,
+            pstats['loads'],
+            pstats['failures'],
+            format_seconds(pstats['min']),
+            format_seconds(pstats['median']),
+            format_seconds(pstats['p90']),
+            format_seconds(pstats['max']),
+            )
+    print(sanitize_report(report))
+
+
+def process_addins_batch(packages, as_json=False):
+    """Index add-in manifests across given debug packages"""
+    index = AddinIndex()
+    indexed = 0
+    for zip_file in packages:
+        try:
+            with open_debug_file(zip_file) as dfile, \
+                    PROFILER.stage('index_addins'):
+                index.merge(index_addins(dfile))
+            indexed += 1
+        except Exception as addins_ex:
+            sys.stderr.write("[WARN] %s: %s\n" % (zip_file, str(addins_ex)))
+
+    issue_counts = defaultdict(lambda: defaultdict(set))
+    for issue, entry in index.issues():
+        issue_counts[entry.addin_id][issue].add(entry.package)
+
+    if as_json:
+        print(json.dumps(
+            {
+                addin_id: {
+                    'entries': [x._asdict() for x in entries],
+                    'issues': {
+                        k: sorted(v)
+                        for k, v in issue_counts[addin_id].items()
+                        },
+                }
+                for addin_id, entries in index.by_id.items()
+            },
+            indent=2
+            ))
+        return
+
+    report = '# Add-in Manifests\n'
+    report += '{} packages\n'.format(indexed)
+    report += ADDIN_STATS_TABLE_HEADER
+    for addin_id, entries in sorted(
+            index.by_id.items(),
+            key=lambda x: len(set(y.package for y in x[1])),
+            reverse=True):
+        counts = issue_counts[addin_id]
+        report += '{} | {} | {} | {} | {} | {}\n'.format(
+            addin_id,
+            entries[0].name or entries[0].full_class_name,
+            len(set(x.package for x in entries)),
+            len(counts['not loaded']),
+            len(counts['shadowed']),
+            len(counts['duplicate id']),
+            )
+    print(sanitize_report(report))
+
+
+def process_paths_batch(packages, as_json=False):
+    """Rank directories most commonly shadowing Rhino across packages"""
+    offenders = defaultdict(set)
+    vendors = {}
+    all_findings = []
+    checked = 0
+    for zip_file in packages:
+        try:
+            with open_debug_file(zip_file) as dfile, \
+                    PROFILER.stage('find_path_shadowing'):
+                findings = find_path_shadowing(dfile)
+            checked += 1
+        except Exception as paths_ex:
+            sys.stderr.write("[WARN] %s: %s\n" % (zip_file, str(paths_ex)))
+            continue
+        for finding in findings:
+            all_findings.append(finding)
+            if finding.directory:
+                # group user specific paths together
+                directory = sanitize_report(finding.directory).lower()
+                offenders[directory].add(finding.package)
+                vendors[directory] = finding.vendor
+
+    if as_json:
+        print(json.dumps([x._asdict() for x in all_findings], indent=2))
+        return
+
+    report = '# PATH Shadowing\n'
+    report += '{} packages\n'.format(checked)
+    report += PATH_STATS_TABLE_HEADER
+    for directory, dpackages in sorted(
+            offenders.items(),
+            key=lambda x: len(x[1]),
+            reverse=True)[:MAX_PATH_ENTRIES]:
+        report += '{} | {} | {}\n'.format(
+            directory, vendors[directory], len(dpackages)
+            )
+    print(sanitize_report(report))
+
+
+def machine_key(dfile):
+    """Identity of the machine that created given package"""
+    report = dfile.read_txt(DebugFileParts.Report)
+    user = re.search(r'C:\\Users\\([^\\]+)\\', report, flags=re.IGNORECASE)
+    os_version = re.search(r'Environment\.OSVersion:\s*(.+)', report)
+    if not user and not os_version:
+        return dfile.timestamp
+    return '|'.join(
+        x.group(1).strip().lower() if x else '' for x in [user, os_version]
+        )
+
+
+def sketch_startup(dfile, sketches):
+    """Add plug-in loads and failures of package to sketches"""
+    masks = [(re.compile(x), y) for x, y in CONSOLE_TOKEN_MASKS]
+    for record in parse_startup_log(dfile.read_txt(DebugFileParts.ConsoleLog)):
+        if record.kind == 'plugin':
+            sketches.add('plugins', record.name)
+        elif record.kind == 'failure':
+            # group failures differing only by paths, numbers, ...
+            sketches.add('failures', console_template(
+                ': '.join(x for x in [record.name, record.message] if x),
+                masks
+                ))
+
+
+def sketch_addins(dfile, sketches):
+    """Add add-ins and their issues in package to sketches"""
+    index = index_addins(dfile)
+    for addin_id, entries in index.by_id.items():
+        sketches.add('addins', '{} {}'.format(
+            addin_id, entries[0].name or entries[0].full_class_name
+            ))
+    for issue, addin_id in set((x, y.addin_id) for x, y in index.issues()):
+        sketches.add('issues', '{} {}'.format(issue, addin_id))
+
+
+def sketch_paths(dfile, sketches):
+    """Add PATH entries and shadowing directories of package to sketches"""
+    report = dfile.read_txt(DebugFileParts.Report)
+    for entry in set(parse_path_entries(report)):
+        sketches.add('path_entries', sanitize_report(entry).lower())
+    for finding in find_path_shadowing(dfile):
+        if finding.directory:
+            sketches.add(
+                'directories', sanitize_report(finding.directory).lower()
+                )
+
+
+APPROX_SKETCHERS = {
+    'startup': sketch_startup,
+    'addins': sketch_addins,
+    'paths': sketch_paths,
+}
+
+
+def sketch_packages(command, packages):
+    """Approximate counts of given packages for given batch command"""
+    sketches = SketchSet()
+    for zip_file in packages:
+        # values of a failing package are dropped along with it
+        package_values = SketchLog()
+        try:
+            with open_debug_file(zip_file) as dfile:
+                package_values.add('machines', machine_key(dfile))
+                APPROX_SKETCHERS[command](dfile, package_values)
+        except Exception as sketch_ex:
+            sys.stderr.write("[WARN] %s: %s\n" % (zip_file, str(sketch_ex)))
+            continue
+        sketches.update_from(package_values)
+        sketches.packages.add(op.basename(zip_file))
+    return sketches
+
+
+def process_approx_batch(command, packages, workers, sketch_file=None,
+                         as_json=False):
+    """Approximate counts of a batch command in fixed memory
+
+    Each worker process sketches a share of the packages and the sketches
+    are merged, along with the ones saved in sketch file by earlier runs.
+    Packages counted by earlier runs (by file name) are skipped
+    """
+    sketches = SketchSet()
+    if sketch_file and op.isfile(sketch_file):
+        sketches = SketchSet.load(sketch_file)
+    known = len(sketches.packages)
+    packages = [
+        x for x in packages if op.basename(x) not in sketches.packages
+        ]
+    shares = [x for x in (packages[i::workers] for i in range(workers)) if x]
+    with PROFILER.stage('sketch_packages'):
+        if len(shares) > 1:
+            with ProcessPoolExecutor(max_workers=len(shares)) as pool:
+                for share_sketches in pool.map(
+                        sketch_packages, [command] * len(shares), shares):
+                    sketches.merge(share_sketches)
+        elif shares:
+            sketches.merge(sketch_packages(command, shares[0]))
+    if sketch_file:
+        sketches.save(sketch_file)
+
+    if as_json:
+        print(json.dumps(
+            {
+                name: {
+                    'distinct': sketch.distinct.count(),
+                    'total': sketch.counts.total,
+                    'top': sketch.most_common(),
+                }
+                for name, sketch in sketches.items()
+            },
+            indent=2
+            ))
+        return
+
+    report = '# Approximate {} statistics\n'.format(command)
+    report += '{} packages ({} new)\n'.format(
+        len(sketches.packages), len(sketches.packages) - known
+        )
+    for name, sketch in sorted(sketches.items()):
+        report += '\n## {}\n'.format(APPROX_SKETCH_LABELS.get(name, name))
+        report += '~{} distinct, {} total\n'.format(
+            sketch.distinct.count(), sketch.counts.total
+            )
+        if name == 'machines':
+            continue
+        report += APPROX_TABLE_HEADER
+        for value, count in sketch.most_common(MAX_PATH_ENTRIES):
+            report += '{} | {}\n'.format(value, count)
+    print(sanitize_report(report))
+
+
+def ingest_packages(packages):
+    """Store given debug packages in blob store"""
+    store = BlobStore(op.join(ensure_cache_dir(), DEFAULT_STORE_DIR))
+    total_bytes = stored_bytes = 0
+    for zip_file in packages:
+        try:
+            members, new_blobs, new_bytes = store.ingest(zip_file)
+        except Exception as ingest_ex:
+            sys.stderr.write("[WARN] %s: %s\n" % (zip_file, str(ingest_ex)))
+            continue
+        total_bytes += op.getsize(zip_file)
+        stored_bytes += new_bytes
+        print('{}: {} members, {} new'.format(
+            op.basename(zip_file), members, new_blobs
+            ))
+    print('{} packages, {} bytes zipped, {} new unique bytes'.format(
+        len(packages), total_bytes, stored_bytes
+        ))
+
+
+def rebuild_packages(package_names, output_dir):
+    """Rebuild given debug packages from blob store"""
+    store = BlobStore(op.join(ensure_cache_dir(), DEFAULT_STORE_DIR))
+    for package_name in package_names:
+        print(store.rebuild(package_name, output_dir))
+
+
+def index_packages(packages):
+    """Add given debug packages to search index"""
+    index = SearchIndex(op.join(ensure_cache_dir(), DEFAULT_INDEX_DIR))
+    added = 0
+    for zip_file in packages:
+        package_path = op.abspath(zip_file) if op.isfile(zip_file) \
+            else op.basename(zip_file)
+        if package_path in index.packages:
+            continue
+        try:
+            with open_debug_file(zip_file) as dfile:
+                index.add_package(dfile, package_path)
+        except Exception as index_ex:
+            sys.stderr.write("[WARN] %s: %s\n" % (zip_file, str(index_ex)))
+            continue
+        added += 1
+    index.flush()
+    print('{} packages added, {} documents indexed'.format(
+        added, len(index.docs)
+        ))
+
+
+SEARCH_INDEXES = {}
+
+
+def load_search_index(index_dir):
+    """Open search index for queries, again only if it changed"""
+    try:
+        stamp = tuple(
+            os.stat(op.join(index_dir, x)).st_mtime_ns
+            for x in ['index.json', 'docs.jsonl']
+            )
+    except OSError:
+        stamp = None
+    cached = SEARCH_INDEXES.get(index_dir)
+    if cached and stamp and cached[0] == stamp:
+        return cached[1]
+    index = SearchIndex(index_dir)
+    SEARCH_INDEXES[index_dir] = (stamp, index)
+    return index
+
+
+def search_packages(query, regex=False, ignore_case=False):
+    """Search indexed debug packages"""
+    index = load_search_index(op.join(ensure_cache_dir(), DEFAULT_INDEX_DIR))
+    for count, (doc, line_no, sline) in enumerate(
+            index.search(query, regex=regex, ignore_case=ignore_case)):
+        if count >= MAX_SEARCH_RESULTS:
+            print('...')
+            break
+        print('{}:{}:{}: {}'.format(
+            op.basename(doc['package']), doc['member'], line_no, sline
+            ))
+
+
+def release_health(packages, bucket_hours, as_json=False):
+    """Add given debug packages to release health and print its series"""
+    health = ReleaseHealth(op.join(ensure_cache_dir(), DEFAULT_HEALTH_STATE))
+    added = 0
+    for zip_file in packages:
+        try:
+            with open_debug_file(zip_file) as dfile, \
+                    PROFILER.stage('release_health'):
+                added += health.add_package(dfile)
+        except Exception as health_ex:
+            sys.stderr.write("[WARN] %s: %s\n" % (zip_file, str(health_ex)))
+    if added:
+        health.flush()
+    rows = health.series(bucket_hours)
+    if as_json:
+        print(json.dumps(rows, indent=2))
+        return
+
+    report = '# Release Health\n'
+    report += '{} packages, {} new, {} hour periods\n'.format(
+        len(health.packages), added, bucket_hours
+        )
+    report += 'packages with a crash dump count as runtime errors, ' \
+              'others as load errors\n'
+    report += HEALTH_TABLE_HEADER
+    for row in rows:
+        rir, rhino, revit = row['release'].split('|')
+        report += '{} | {} | {} | {} | {} | {}{} | {:.0f} | {:.0f}\n'.format(
+            row['period'], rir, rhino, revit,
+            row['load'],
+            '⚠️' if row['spike'] else '',
+            row['runtime'],
+            100 * row['runtime_rate'],
+            100 * row['share'],
+            )
+    print(report)
+
+
+def query_journals(packages, command=None, context=0):
+    """Print journal commands of given packages with following lines"""
+    for zip_file in packages:
+        try:
+            with open_debug_file(zip_file) as dfile, \
+                    PROFILER.stage('query_journal'):
+                journal_file = process_report(dfile).journal_file
+                if not journal_file:
+                    sys.stderr.write(
+                        "[WARN] %s: No journal attached\n" % zip_file
+                        )
+                    continue
+                with JournalIndex.open(dfile, journal_file) as jindex:
+                    print('# Journal {} ({} lines, {} commands)'.format(
+                        dfile.timestamp, jindex.line_count,
+                        len(jindex.commands)
+                        ))
+                    print('```')
+                    try:
+                        for line_no, offset, _ in \
+                                jindex.find_commands(command):
+                            for idx, jline in enumerate(
+                                    jindex.read_lines(offset, context + 1)):
+                                print(sanitize_report(
+                                    '{}: {}'.format(line_no + idx + 1, jline)
+                                    ))
+                    finally:
+                        print('```\n')
+        except Exception as journal_ex:
+            sys.stderr.write("[WARN] %s: %s\n" % (zip_file, str(journal_ex)))
+
+
+def process_timeline_batch(packages, minutes=None, utc_offset=0):
+    """Print merged event timeline of given debug packages"""
+    for zip_file in packages:
+        try:
+            with open_debug_file(zip_file) as dfile, \
+                    PROFILER.stage('build_timeline'):
+                # events are read lazily while printing
+                events = build_timeline(dfile, utc_offset=utc_offset)
+                if minutes is not None:
+                    events = tail_events(events, minutes)
+                print('# Timeline {}'.format(dfile.timestamp))
+                print('```')
+                try:
+                    for event in events:
+                        print(sanitize_report(format_event(event)))
+                finally:
+                    print('```\n')
+        except Exception as timeline_ex:
+            sys.stderr.write("[WARN] %s: %s\n" % (zip_file, str(timeline_ex)))
+
+
+def watch_inbox(inbox_dir, output_dir, interval, settle, once=False):
+    """Process debug packages arriving in inbox until interrupted"""
+    cache_dir = ensure_cache_dir()
+    index = SearchIndex(op.join(cache_dir, DEFAULT_INDEX_DIR))
+    health = ReleaseHealth(op.join(cache_dir, DEFAULT_HEALTH_STATE))
+    metrics_file = op.join(cache_dir, DEFAULT_WATCH_METRICS)
+
+    def process(zip_file):
+        report_file = op.join(
+            output_dir, op.splitext(op.basename(zip_file))[0] + '.md'
+            )
+        with open(report_file, 'w', encoding='utf-8') as rf:
+            rf.write(create_report(zip_file))
+        package_path = op.abspath(zip_file)
+        if package_path not in index.packages:
+            with open_debug_file(zip_file) as dfile:
+                index.add_package(dfile, package_path)
+            index.flush()
+        with open_debug_file(zip_file) as dfile:
+            if health.add_package(dfile):
+                health.flush()
+        print('processed: {}'.format(report_file))
+
+    inbox = InboxWatch(
+        inbox_dir,
+        process,
+        op.join(cache_dir, DEFAULT_WATCH_STATE),
+        settle=settle
+        )
+    watcher = make_watcher(inbox_dir)
+    try:
+        while True:
+            inbox.process_ready(inbox.scan())
+            inbox.write_metrics(metrics_file)
+            if once and not inbox.pending:
+                break
+            watcher.wait(min(interval, settle) if inbox.pending else interval)
+    finally:
+        watcher.close()
+
+
+def run_request(request):
+    """Run a command line sent to the server, capturing its output"""
+    stdout, stderr = io.StringIO(), io.StringIO()
+    status = 0
+    cwd = os.getcwd()
+    with redirect_stdout(stdout), redirect_stderr(stderr):
+        try:
+            # relative paths are relative to the client
+            os.chdir(request.get('cwd', cwd))
+            cfg = CLIArgs(
+                docopt(
+                    __doc__.format(cliname=__binname__),
+                    argv=request['argv'],
+                    version='{} {}'.format(__binname__, __version__)
+                )
+            )
+            if cfg.serve:
+                raise Exception("Server is already running")
+            # would block the server for every other client
+            if cfg.watch or cfg.follow:
+                raise Exception("Long running commands can not run on the "
+                                "server, run them with dbgzip instead")
+            run_command(cfg)
+        except SystemExit as exit_ex:
+            # usage errors and --help
+            if isinstance(exit_ex.code, str):
+                sys.stderr.write(exit_ex.code + '\n')
+                status = 1
+            else:
+                status = exit_ex.code or 0
+        except Exception as run_ex:
+            sys.stderr.write("[ERROR] %s\n" % str(run_ex))
+            status = 1
+        finally:
+            PROFILER.reset()
+            os.chdir(cwd)
+    return {
+        'status': status,
+        'stdout': stdout.getvalue(),
+        'stderr': stderr.getvalue(),
+    }
+
+
+class SocketRequestHandler(socketserver.StreamRequestHandler):
+    """Serves one json request line with one json response line"""
+    def handle(self):
+        request = json.loads(self.rfile.readline())
+        self.wfile.write(json.dumps(run_request(request)).encode('utf-8'))
+        self.wfile.write(EOL)
+
+
+class HTTPRequestHandler(http.server.BaseHTTPRequestHandler):
+    """Serves json requests posted to localhost by dbgclient
+
+    Requests must carry the server token, which dbgclient reads from the
+    token file only the user can read, and must not come from a web page:
+    browsers can post to localhost but can not set the token header, and
+    send their own Origin (or the attacker Host, when rebinding dns)
+    """
+    def is_local(self, url):
+        """Check url or host:port points to this server"""
+        host = re.sub(r'^\w+://', '', url).rstrip('/')
+        return host in ['{}:{}'.format(x, self.server.server_address[1])
+                        for x in SERVER_HOSTS]
+
+    def check_request(self):
+        """Send error and return False if request is not from dbgclient"""
+        origin = self.headers.get('Origin')
+        if not self.is_local(self.headers.get('Host', '')) \
+                or (origin is not None and not self.is_local(origin)):
+            self.send_error(403, "Requests are only accepted from localhost")
+            return False
+        content_type = self.headers.get('Content-Type', '')
+        if content_type.split(';')[0].strip() != 'application/json':
+            self.send_error(415, "Requests must be application/json")
+            return False
+        token = self.headers.get(SERVER_TOKEN_HEADER, '')
+        if not hmac.compare_digest(token.encode('utf-8'),
+                                   self.server.token.encode('utf-8')):
+            self.send_error(403, "Invalid server token")
+            return False
+        return True
+
+    def do_POST(self): #pylint: disable=invalid-name
+        """Run posted request"""
+        if not self.check_request():
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length))
+        body = json.dumps(run_request(request)).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args): #pylint: disable=redefined-builtin
+        pass
+
+
+def write_server_token(port):
+    """Write a new random token for server on port, readable by user only"""
+    token_file = op.join(ensure_cache_dir(),
+                         DEFAULT_SERVER_TOKEN.format(port=port))
+    # recreate, so a file left with other permissions is not reused
+    if op.exists(token_file):
+        os.remove(token_file)
+    token = secrets.token_hex(32)
+    with os.fdopen(os.open(token_file,
+                           os.O_WRONLY | os.O_CREAT | os.O_EXCL,
+                           0o600), 'w') as tf:
+        tf.write(token)
+    return token_file, token
+
+
+def serve(socket_path, port=None):
+    """Answer requests of dbgclient until interrupted
+
+    Requests run one at a time in this process, so imports, compiled
+    patterns, conflict rules, search index and recent reports stay warm
+    between requests. Conflict rules are reloaded when their file changes.
+    Only the user running the server can send it requests
+    """
+    token_file = None
+    if port:
+        server = http.server.HTTPServer(('127.0.0.1', port),
+                                        HTTPRequestHandler)
+        token_file, server.token = write_server_token(port)
+        address = 'http://127.0.0.1:{}'.format(port)
+    else:
+        if not op.isabs(socket_path):
+            socket_path = op.join(op.dirname(op.abspath(__file__)),
+                                  socket_path)
+        if not op.isdir(op.dirname(socket_path)):
+            os.makedirs(op.dirname(socket_path))
+        # remove socket left behind by a previous server
+        if op.exists(socket_path):
+            os.remove(socket_path)
+        # create socket accessible to user only
+        umask = os.umask(0o177)
+        try:
+            server = socketserver.UnixStreamServer(socket_path,
+                                                   SocketRequestHandler)
+        finally:
+            os.umask(umask)
+        os.chmod(socket_path, 0o600)
+        address = socket_path
+    # warm up conflict rules before the first request
+    load_conflict_matcher()
+    sys.stderr.write("serving on {}\n".format(address))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if not port and op.exists(socket_path):
+            os.remove(socket_path)
+        if token_file and op.exists(token_file):
+            os.remove(token_file)
 
 
 def run_command(cfg: CLIArgs):
     """Orchestrate execution based on input args"""
+    if not cfg.profile_dir:
+        dispatch_command(cfg)
+        return
+
+    # profile stages of this run
+    PROFILER.enable(
+        cprofile_dir=op.join(cfg.profile_dir, 'cprofile') \
+            if cfg.cprofile else None
+        )
+    try:
+        dispatch_command(cfg)
+    finally:
+        PROFILER.write(cfg.profile_dir)
+        sys.stderr.write(PROFILER.format_summary())
+
+
+def dispatch_command(cfg: CLIArgs):
+    """Run the command selected by input args"""
     # process data
+    # batch commands
+    if cfg.approx and (cfg.startup or cfg.addins or cfg.paths):
+        process_approx_batch(
+            next(x for x in APPROX_SKETCHERS if getattr(cfg, x)),
+            find_packages(cfg.packages),
+            cfg.workers,
+            sketch_file=cfg.sketch_file,
+            as_json=cfg.json
+            )
+    elif cfg.startup:
+        process_startup_batch(find_packages(cfg.packages), as_json=cfg.json)
+    elif cfg.addins:
+        process_addins_batch(find_packages(cfg.packages), as_json=cfg.json)
+    elif cfg.paths:
+        process_paths_batch(find_packages(cfg.packages), as_json=cfg.json)
+    elif cfg.ingest:
+        ingest_packages(find_packages(cfg.packages))
+    elif cfg.rebuild:
+        rebuild_packages(cfg.package_names, cfg.output_dir)
+    elif cfg.tickets:
+        API_TOKEN = cfg.sb_token or os.environ.get('SBTOKEN', None)
+        if not API_TOKEN:
+            raise Exception("SupportBee API Token is required")
+        if len(cfg.limits) != len(PIPELINE_STAGES):
+            raise Exception("--limits needs {} values".format(
+                len(PIPELINE_STAGES)
+                ))
+        process_sb_tickets(cfg.ticket_urls, API_TOKEN, cfg.output_dir,
+                           cfg.limits)
+    elif cfg.serve:
+        serve(cfg.socket_path, port=cfg.port)
+    elif cfg.sync:
+        API_TOKEN = cfg.sb_token or os.environ.get('SBTOKEN', None)
+        if not API_TOKEN:
+            raise Exception("SupportBee API Token is required")
+        sync_sb_tickets(cfg.sb_url, API_TOKEN, cfg.output_dir,
+                        since=cfg.since)
+    elif cfg.watch:
+        watch_inbox(cfg.inbox_dir, cfg.output_dir, cfg.interval, cfg.settle,
+                    once=cfg.once)
+    elif cfg.index:
+        index_packages(find_packages(cfg.packages))
+    elif cfg.search:
+        search_packages(cfg.query, regex=cfg.regex,
+                        ignore_case=cfg.ignore_case)
+    elif cfg.health:
+        release_health(find_packages(cfg.packages), cfg.bucket,
+                       as_json=cfg.json)
+    elif cfg.journal:
+        query_journals(find_packages(cfg.packages), command=cfg.command,
+                       context=cfg.context)
+    elif cfg.timeline:
+        process_timeline_batch(find_packages(cfg.packages),
+                               minutes=cfg.minutes,
+                               utc_offset=cfg.utc_offset)
     # if zip file is provided
-    if cfg.zip_file:
+    elif cfg.zip_file:
         # process zip file, include ticket url for reporting
-        process_dbpkg(zip_file=cfg.zip_file, ticket_url=cfg.sb_ticket)
+        process_dbpkg(zip_file=cfg.zip_file, ticket_url=cfg.sb_ticket,
+                      follow=cfg.follow)
     # otherwise if supportbee url is available
     elif cfg.sb_ticket:
         # ensure api token
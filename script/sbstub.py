@@ -0,0 +1,363 @@
+#pylint: disable=broad-except,invalid-name
+"""Stand-in SupportBee API server for testing ticket sync locally
+
+Serves tickets (listed in pages filtered by last activity, or one by one),
+ticket replies and attachments from a json file of tickets and a directory of debug packages.
+The tickets file is re-read on every request, so it can be edited while
+the server runs. Any API token is accepted.
+
+Usage:
+    {cliname} serve <packages_dir> <tickets_file> [--port=<port>]
+    {cliname} check <packages_dir>
+
+Options:
+    -h, --help                          Show this help
+    <packages_dir>                      Directory of debug packages to attach
+    <tickets_file>                      Json list of tickets, see below
+    --port=<port>                       Localhost port to serve on [default: 8765]
+
+Each ticket lists the package file names attached to it and its replies:
+    [{{"id": 1, "last_activity_at": "2022-05-01T10:00:00Z",
+      "files": ["RhinoInside-Revit-Report-20220501T100000Z.zip"],
+      "replies": [{{"files": []}}]}}]
+
+`check` runs `dbgzip sync` logic against the stand-in server with two of
+the given packages, one attached to a ticket and one to a reply, and checks
+both are downloaded once, paging works, and a later reply is picked up.
+It then runs the `dbgzip tickets` pipeline on tickets with and without a
+package, and a missing ticket, and checks only the packages are reported.
+"""
+import sys
+import os
+import os.path as op
+import re
+import json
+import shutil
+import tempfile
+import threading
+import http.server
+from urllib.parse import urlparse, parse_qs
+
+from docopt import docopt
+
+import dbgzip
+
+
+__binname__ = op.splitext(op.basename(__file__))[0] # grab script name
+__version__ = '1.0'
+
+
+# cli configs =================================================================
+DEFAULT_PAGE_SIZE = 15
+# =============================================================================
+
+
+class StubServer(http.server.ThreadingHTTPServer):
+    """Localhost http server holding the packages dir and tickets file"""
+    daemon_threads = True
+
+    def __init__(self, port, packages_dir, tickets_file):
+        super().__init__(('127.0.0.1', port), StubRequestHandler)
+        self.packages_dir = packages_dir
+        self.tickets_file = tickets_file
+
+    @property
+    def url(self):
+        """Base url of the server"""
+        return 'http://127.0.0.1:{}'.format(self.server_address[1])
+
+
+class StubRequestHandler(http.server.BaseHTTPRequestHandler):
+    """Answers the supportbee api requests used by ticket sync"""
+    def log_message(self, format, *args): # pylint: disable=redefined-builtin
+        pass
+
+    def attachments(self, files):
+        """Attachment records of given package file names"""
+        return {
+            'attachments': [
+                {
+                    'filename': x,
+                    'url': {
+                        'original': '{}/files/{}'.format(self.server.url, x)
+                        },
+                }
+                for x in files
+                ]
+            }
+
+    def list_tickets(self, query):
+        """Page of tickets active since given time, latest first"""
+        with open(self.server.tickets_file, 'r') as tf:
+            tickets = json.load(tf)
+        if 'since' in query:
+            since = dbgzip.parse_sb_time(query['since'][0])
+            tickets = [
+                x for x in tickets
+                if dbgzip.parse_sb_time(x['last_activity_at']) >= since
+                ]
+        tickets.sort(key=lambda x: x['last_activity_at'], reverse=True)
+        per_page = int(query.get('per_page', [DEFAULT_PAGE_SIZE])[0])
+        page = int(query.get('page', [1])[0])
+        return {
+            'total': len(tickets),
+            'current_page': page,
+            'total_pages': max(1, -(-len(tickets) // per_page)),
+            'tickets': [
+                {
+                    'id': x['id'],
+                    'last_activity_at': x['last_activity_at'],
+                    'content': self.attachments(x.get('files', [])),
+                }
+                for x in tickets[(page - 1) * per_page:page * per_page]
+                ],
+            }
+
+    def load_ticket(self, ticket_id):
+        """Ticket of given id from tickets file, or None"""
+        with open(self.server.tickets_file, 'r') as tf:
+            tickets = {str(x['id']): x for x in json.load(tf)}
+        return tickets.get(ticket_id)
+
+    def get_ticket(self, ticket_id):
+        """Single ticket"""
+        ticket = self.load_ticket(ticket_id)
+        if ticket is None:
+            return None
+        return {
+            'ticket': {
+                'id': ticket['id'],
+                'last_activity_at': ticket['last_activity_at'],
+                'content': self.attachments(ticket.get('files', [])),
+            }
+        }
+
+    def list_replies(self, ticket_id):
+        """Replies of given ticket"""
+        ticket = self.load_ticket(ticket_id)
+        if ticket is None:
+            return None
+        return {
+            'replies': [
+                {'content': self.attachments(x.get('files', []))}
+                for x in ticket.get('replies', [])
+                ]
+            }
+
+    def do_GET(self):
+        """Serve tickets, replies and package files"""
+        url = urlparse(self.path)
+        ticket = re.fullmatch(r'/tickets/(\d+)', url.path)
+        replies = re.fullmatch(r'/tickets/(\d+)/replies', url.path)
+        body = None
+        if url.path == '/tickets':
+            body = json.dumps(self.list_tickets(parse_qs(url.query)))
+        elif ticket:
+            data = self.get_ticket(ticket.group(1))
+            body = json.dumps(data) if data is not None else None
+        elif replies:
+            data = self.list_replies(replies.group(1))
+            body = json.dumps(data) if data is not None else None
+        elif url.path.startswith('/files/'):
+            package = op.join(self.server.packages_dir,
+                              op.basename(url.path[len('/files/'):]))
+            if op.isfile(package):
+                with open(package, 'rb') as pf:
+                    body = pf.read()
+        if body is None:
+            self.send_error(404)
+            return
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(packages_dir, tickets_file, port):
+    """Serve stand-in api until interrupted"""
+    server = StubServer(port, packages_dir, tickets_file)
+    print('serving supportbee stand-in on {}'.format(server.url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def check_ticket_sync(packages_dir):
+    """Sync tickets from a stand-in server and check what was downloaded"""
+    packages = sorted(
+        x for x in os.listdir(packages_dir)
+        if re.match(dbgzip.DebugFileParts.NamingFormat, x)
+        )
+    if len(packages) < 2:
+        raise Exception("Need at least two debug packages in %s"
+                        % packages_dir)
+    work_dir = tempfile.mkdtemp()
+    tickets_file = op.join(work_dir, 'tickets.json')
+    output_dir = op.join(work_dir, 'inbox')
+    os.mkdir(output_dir)
+    tickets = [
+        {'id': 1, 'last_activity_at': '2022-05-01T10:00:00Z',
+         'files': [packages[0]]},
+        # package sent in a reply
+        {'id': 2, 'last_activity_at': '2022-05-02T10:00:00Z',
+         'replies': [{'files': []}, {'files': [packages[1]]}]},
+        {'id': 3, 'last_activity_at': '2022-05-02T10:00:00Z'},
+        ]
+    with open(tickets_file, 'w') as tf:
+        json.dump(tickets, tf)
+
+    server = StubServer(0, packages_dir, tickets_file)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    page_size = dbgzip.SB_PAGE_SIZE
+    # one ticket per page checks paging through the listing
+    dbgzip.SB_PAGE_SIZE = 1
+    failures = []
+    try:
+        def sync():
+            tsync = dbgzip.TicketSync(
+                server.url,
+                'token',
+                op.join(work_dir, 'sync.json'),
+                op.join(work_dir, 'sync-ledger.jsonl')
+                )
+            changed, queued = tsync.sync()
+            return changed, queued, tsync.download_pending(output_dir)
+
+        result = sync()
+        print('first sync: {} changed, {} queued, {} downloaded'.format(
+            *result))
+        if result != (3, 2, 2):
+            failures.append('first sync expected 3 changed, 2 queued, '
+                            '2 downloaded')
+        for package in packages[:2]:
+            with open(op.join(packages_dir, package), 'rb') as pf, \
+                    open(op.join(output_dir, package), 'rb') as df:
+                if pf.read() != df.read():
+                    failures.append('%s downloaded corrupted' % package)
+
+        result = sync()
+        print('second sync: {} changed, {} queued, {} downloaded'.format(
+            *result))
+        if result != (0, 0, 0):
+            failures.append('second sync expected no changes')
+
+        # new reply on the first ticket, with the last package
+        tickets[0]['last_activity_at'] = '2022-05-03T10:00:00Z'
+        tickets[0]['replies'] = [{'files': [packages[-1]]}]
+        with open(tickets_file, 'w') as tf:
+            json.dump(tickets, tf)
+        # the last package may be the one downloaded from a reply already
+        if op.isfile(op.join(output_dir, packages[-1])):
+            os.remove(op.join(output_dir, packages[-1]))
+        result = sync()
+        print('third sync: {} changed, {} queued, {} downloaded'.format(
+            *result))
+        # attachments downloaded before are queued again, and skipped as
+        # present in the output directory
+        if (result[0], result[2]) != (1, 1) \
+                or not op.isfile(op.join(output_dir, packages[-1])):
+            failures.append('third sync expected the new reply package')
+    finally:
+        dbgzip.SB_PAGE_SIZE = page_size
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+    if failures:
+        raise Exception("Ticket sync check failed: " + ", ".join(failures))
+    print('ticket sync ok')
+
+
+def check_ticket_pipeline(packages_dir):
+    """Process tickets of a stand-in server and check the reports written"""
+    packages = sorted(
+        x for x in os.listdir(packages_dir)
+        if re.match(dbgzip.DebugFileParts.NamingFormat, x)
+        )
+    if len(packages) < 2:
+        raise Exception("Need at least two debug packages in %s"
+                        % packages_dir)
+    work_dir = tempfile.mkdtemp()
+    tickets_file = op.join(work_dir, 'tickets.json')
+    download_dir = op.join(work_dir, 'downloads')
+    output_dir = op.join(work_dir, 'reports')
+    os.mkdir(download_dir)
+    os.mkdir(output_dir)
+    with open(tickets_file, 'w') as tf:
+        json.dump([
+            {'id': 1, 'last_activity_at': '2022-05-01T10:00:00Z',
+             'files': [packages[0]]},
+            {'id': 2, 'last_activity_at': '2022-05-02T10:00:00Z',
+             'files': [packages[1]]},
+            # no package attached
+            {'id': 3, 'last_activity_at': '2022-05-02T10:00:00Z'},
+            ], tf)
+
+    server = StubServer(0, packages_dir, tickets_file)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    failures = []
+    try:
+        stages = dbgzip.process_sb_tickets(
+            # ticket 4 does not exist
+            ['{}/tickets/{}'.format(server.url, x) for x in [1, 2, 3, 4]],
+            'token',
+            output_dir,
+            [1] * len(dbgzip.PIPELINE_STAGES),
+            download_dir=download_dir
+            )
+        counts = {x.name: (x.processed, x.failed) for x in stages}
+        print('pipeline: ' + ', '.join(
+            '{} {}/{}'.format(k, *v) for k, v in counts.items()
+            ))
+        if counts['fetch'] != (3, 1) or counts['write'] != (2, 0):
+            failures.append('expected 3 tickets fetched, 1 failed and '
+                            '2 reports written')
+        if sorted(os.listdir(output_dir)) != ['SB-1.md', 'SB-2.md']:
+            failures.append('expected reports of tickets 1 and 2')
+        for package in packages[:2]:
+            with open(op.join(packages_dir, package), 'rb') as pf, \
+                    open(op.join(download_dir, package), 'rb') as df:
+                if pf.read() != df.read():
+                    failures.append('%s downloaded corrupted' % package)
+        for report_name in os.listdir(output_dir):
+            with open(op.join(output_dir, report_name), 'r',
+                      encoding='utf-8') as rf:
+                if '# Host Info' not in rf.read():
+                    failures.append('%s is not a package report'
+                                    % report_name)
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+    if failures:
+        raise Exception("Ticket pipeline check failed: "
+                        + ", ".join(failures))
+    print('ticket pipeline ok')
+
+
+def main(argv):
+    """Serve stand-in api or run checks against it"""
+    try:
+        args = docopt(
+            __doc__.format(cliname=__binname__),
+            argv=argv,
+            version='{} {}'.format(__binname__, __version__)
+        )
+        if args['check']:
+            check_ticket_sync(args['<packages_dir>'])
+            check_ticket_pipeline(args['<packages_dir>'])
+        else:
+            serve(args['<packages_dir>'], args['<tickets_file>'],
+                  int(args['--port']))
+    except Exception as run_ex:
+        sys.stderr.write("[ERROR] %s\n" % str(run_ex))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))